@@ -1,26 +1,136 @@
 from flask import Flask, request, redirect, render_template, flash, session, g, url_for, jsonify, abort
+from flask import before_render_template, template_rendered, stream_template, stream_with_context
 
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert
 
-from models import db, connect_db, User, FavoriteSeiyuu
+from models import db, connect_db, User, FavoriteSeiyuu, SeiyuuSimilarity, Anime, Character, Person, AnimeRole, VoiceRole, CharacterVoice
 from forms import RegisterForm, LoginForm, EditUser
-
+from cache import ResponseCache, LRUCache, FlightTimeout
+from ratelimit import SharedTokenBucket, LowPriorityLimiter
+from client import JikanClient, UpstreamError
+from profiler import Profile, Sampler, check_token
+from jikan_json import DecodeError, decode_response, ijson
+from records import AnimeInfo, CharacterInfo, PersonInfo, RoleInfo
+from suggest import PrefixIndex
+from postings import intersect, to_postings
+from costar import CostarGraph
+from metrics import Registry, RequestStats, COUNT_BUCKETS, current_stats, tracking, get_endpoint_template, render_gauge
+
+import hashlib
+import math
 import os
 import re
-import requests
 import random
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 
 CURR_USER_KEY = "curr_user"
-BASE_URL = "https://api.jikan.moe/v4"
-WAIT_TIME = .5
+# point this at perf/jikan_standin.py to work offline
+BASE_URL = os.environ.get("JIKAN_BASE_URL", "https://api.jikan.moe/v4")
+# jikanapi allows 3 requests a second and 60 a minute
+JIKAN_RATE = float(os.environ.get("JIKAN_RATE", 1))
+JIKAN_BURST = int(os.environ.get("JIKAN_BURST", 3))
+# the rate limit is shared by every worker through this file
+JIKAN_RATE_FILE = os.environ.get(
+    "JIKAN_RATE_FILE", os.path.join(tempfile.gettempdir(), "seiyuulist-jikan-ratelimit.json")
+)
+# longest a request will wait on the rate limit and retries before giving up
+JIKAN_RATE_TIMEOUT = float(os.environ.get("JIKAN_RATE_TIMEOUT", 10))
+JIKAN_CONNECT_TIMEOUT = float(os.environ.get("JIKAN_CONNECT_TIMEOUT", 3.05))
+JIKAN_READ_TIMEOUT = float(os.environ.get("JIKAN_READ_TIMEOUT", 10))
+JIKAN_RETRIES = int(os.environ.get("JIKAN_RETRIES", 3))
+JIKAN_WORKERS = int(os.environ.get("JIKAN_WORKERS", 4))
+# how responses are decoded: "full", "pruned" (only the fields the app reads) or "stream"
+# (pruned as the body is read, needs ijson, uses far less memory on big bodies but more cpu)
+JIKAN_JSON_DECODE = os.environ.get("JIKAN_JSON_DECODE", "pruned")
+# stored anime/characters/people are fetched again once they are this old
+STORE_REFRESH_AFTER = timedelta(days=7)
+# logged in users each worker keeps between requests, and for how many seconds.
+# Profile edits made through another worker show up once it expires
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60 * 5
+# rendered person/anime/character pages and role lists each worker keeps, and for how many seconds
+PAGE_CACHE_SIZE = 256
+FRAGMENT_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 60 * 10
+# pages and role lists bigger than this (in characters) are streamed without being cached
+PAGE_CACHE_MAX_SIZE = 512 * 1024
+FRAGMENT_CACHE_MAX_SIZE = 256 * 1024
+# how much of a streamed page is held back before it's sent, besides at flush placeholders
+STREAM_BUFFER_SIZE = 16 * 1024
+# how many roles a person, anime or character page shows at once (?roles_page=)
+ROLES_PER_PAGE = 100
+# /search answers from the stored anime/characters/people SEARCH_PAGE_SIZE at a time, and asks
+# jikanapi instead when fewer than SEARCH_MIN_RESULTS of them match
+SEARCH_PAGE_SIZE = 25
+SEARCH_MIN_RESULTS = 10
+# most suggestions /search/suggest gives, and how often each worker picks up the
+# names/titles other workers stored (its own are added as they're stored)
+SUGGEST_LIMIT = 10
+SUGGEST_SYNC_INTERVAL = timedelta(minutes=1)
+# rows are picked up if they were stored this long before the last sync too, in case
+# they were committed after it ran
+SUGGEST_SYNC_OVERLAP = timedelta(minutes=1)
+# seiyuu whose anime/character ids each worker keeps for /anime/filter, and for how many
+# seconds. Roles stored from an anime's page show up in a kept seiyuu's ids once it expires
+SEIYUU_INDEX_SIZE = 4096
+SEIYUU_INDEX_TTL = 60 * 60
+# most seiyuu /anime/filter takes at once
+SEIYUU_FILTER_MAX = 10
+# seconds between rebuilding each worker's co-star graph from the stored roles, and how
+# many co-stars /person/<id>/costars lists
+COSTAR_REFRESH_INTERVAL = 60 * 60
+COSTARS_LIMIT = 20
+# seiyuu recommended on a person's page and a user's profile. Only a user's top
+# RECOMMEND_FROM favorites count towards similarities and their own recommendations, so a
+# change to their favorites rewrites at most the similarities between the top RECOMMEND_FROM
+# before it and after it, 2 * RECOMMEND_FROM * (RECOMMEND_FROM - 1), however many they have
+RECOMMENDATIONS_LIMIT = 6
+RECOMMEND_FROM = 50
+# favorites' ranks are spaced this far apart so a seiyuu can be moved between two others by
+# changing only its own rank, they're spread out again once two neighbours are 1 apart
+RANK_GAP = 1024
+# times a favorite/rank change is retried when a concurrent one took the same rank
+RANK_RETRIES = 5
+RANK_RETRY_BACKOFF = .01
+# seconds between rebuilding the homepage's seasonal anime
+SEASONAL_REFRESH_INTERVAL = 60 * 60
+# longest the homepage waits on a worker's first seasonal snapshot (its first page of shows),
+# well within gunicorn's worker timeout. The homepage shows an error instead
+SEASONAL_WAIT = 5
+# background requests (the seasonal snapshot's) only take a rate limit token when this many
+# are left for users' requests, and wait up to BACKGROUND_RATE_TIMEOUT seconds for one
+BACKGROUND_RATE_RESERVE = JIKAN_BURST - 1
+BACKGROUND_RATE_TIMEOUT = 60
+# every worker writes its metrics here, /metrics adds them up
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "seiyuulist-metrics"))
+# seconds between a worker writing out its metrics
+METRICS_FLUSH_INTERVAL = 5
+# profile requests picked at PROFILE_SAMPLE_RATE, to a route in PROFILE_ROUTES (endpoint names)
+# or with a PROFILE_HEADER token from `python profiler.py`, only when PROFILING is set
+PROFILING = bool(os.environ.get("PROFILING"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_ROUTES = set(filter(None, os.environ.get("PROFILE_ROUTES", "").split(",")))
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "seiyuulist-profiles"))
+# seconds between stack samples
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", .005))
 
 app = Flask(__name__)
 
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ECHO"] = True
+app.config["SQLALCHEMY_ECHO"] = bool(os.environ.get("SQLALCHEMY_ECHO"))
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "qwerty")
 
 #Set up psql connection on heroku
@@ -31,6 +141,78 @@ app.config['SQLALCHEMY_DATABASE_URI'] = uri
 
 connect_db(app)
 
+if JIKAN_JSON_DECODE == "stream" and ijson is None:
+    app.logger.warning("JIKAN_JSON_DECODE=stream needs ijson, decoding pruned responses instead")
+
+jikan_cache = ResponseCache()
+user_cache = LRUCache(USER_CACHE_SIZE)
+page_cache = LRUCache(PAGE_CACHE_SIZE)
+seiyuu_index = LRUCache(SEIYUU_INDEX_SIZE)
+fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE)
+jikan_limiter = SharedTokenBucket(JIKAN_RATE_FILE, JIKAN_RATE, JIKAN_BURST)
+jikan_pool = ThreadPoolExecutor(max_workers=JIKAN_WORKERS)
+jikan_client = JikanClient(
+    BASE_URL,
+    jikan_limiter,
+    pool_size=JIKAN_WORKERS * 2,
+    connect_timeout=JIKAN_CONNECT_TIMEOUT,
+    read_timeout=JIKAN_READ_TIMEOUT,
+    retries=JIKAN_RETRIES,
+    stream=JIKAN_JSON_DECODE == "stream",
+)
+# background requests are made one at a time from their own thread
+background_client = JikanClient(
+    BASE_URL,
+    LowPriorityLimiter(jikan_limiter, BACKGROUND_RATE_RESERVE),
+    pool_size=1,
+    connect_timeout=JIKAN_CONNECT_TIMEOUT,
+    read_timeout=JIKAN_READ_TIMEOUT,
+    retries=JIKAN_RETRIES,
+    stream=JIKAN_JSON_DECODE == "stream",
+)
+
+profile_sampler = Sampler(PROFILE_INTERVAL)
+
+metrics_registry = Registry(METRICS_DIR)
+request_latency = metrics_registry.histogram(
+    "seiyuulist_request_duration_seconds", "Time spent handling a request", ["route", "status"]
+)
+request_sql_queries = metrics_registry.histogram(
+    "seiyuulist_request_sql_queries", "SQL queries run per request", ["route"], COUNT_BUCKETS
+)
+request_sql_latency = metrics_registry.histogram(
+    "seiyuulist_request_sql_duration_seconds", "Time spent running SQL per request", ["route"]
+)
+request_upstream_requests = metrics_registry.histogram(
+    "seiyuulist_request_jikan_upstream_requests", "Requests sent to jikanapi per request", ["route"], COUNT_BUCKETS
+)
+render_latency = metrics_registry.histogram(
+    "seiyuulist_template_render_duration_seconds", "Time spent rendering a template", ["template"]
+)
+jikan_latency = metrics_registry.histogram(
+    "seiyuulist_jikan_request_duration_seconds", "Time to get a jikanapi response, cached or not", ["endpoint"]
+)
+upstream_latency = metrics_registry.histogram(
+    "seiyuulist_jikan_upstream_duration_seconds",
+    "Time jikanapi took to respond, including rate limit waits and retries",
+    ["endpoint", "status"],
+)
+upstream_requests = metrics_registry.counter(
+    "seiyuulist_jikan_upstream_requests_total", "Requests sent to jikanapi", ["route", "endpoint"]
+)
+cache_lookups = metrics_registry.counter(
+    "seiyuulist_jikan_cache_lookups_total", "Jikan response cache lookups by result", ["result"]
+)
+search_lookups = metrics_registry.counter(
+    "seiyuulist_search_lookups_total", "Searches by type and where they were answered from", ["type", "source"]
+)
+page_cache_lookups = metrics_registry.counter(
+    "seiyuulist_page_cache_lookups_total", "Rendered page cache lookups by page and result", ["page", "result"]
+)
+client_events = metrics_registry.counter(
+    "seiyuulist_jikan_client_events_total", "Jikan client requests, retries, failures and connections", ["event"]
+)
+
 #
 ### PROCESSING JIKANAPI DATA
 #
@@ -41,15 +223,16 @@ def get_info_from_anime_data(anime_data):
     if anime_data.get('genres'):
         for genre in anime_data.get("genres"):
             genres.append(genre.get("name"))
-    return {
-        "id": anime_data.get("mal_id"),
-        "image_url": anime_data.get("images").get("jpg").get("image_url"),
-        "title": anime_data.get("title"),
-        "synopsis": anime_data.get("synopsis"),
-        "rating": anime_data.get("rating"),
-        "genres": genres,
-        "type": anime_data.get("type"),
-    }
+    return AnimeInfo(
+        id=anime_data.get("mal_id"),
+        image_url=anime_data.get("images").get("jpg").get("image_url"),
+        title=anime_data.get("title"),
+        synopsis=anime_data.get("synopsis"),
+        rating=anime_data.get("rating"),
+        genres=genres,
+        type=anime_data.get("type"),
+        favorites=anime_data.get("favorites"),
+    )
 
 
 def get_info_by_role(data, type, role=None):
@@ -60,15 +243,17 @@ def get_info_by_role(data, type, role=None):
     Either 'character' or 'anime' information.
     """
     info = []
-    if type.lower() == "character":
+    type = type.lower()
+    role = role.lower() if role is not None else None
+    if type == "character":
         for character in data:
-            if role == None or character.get("role").lower() == role.lower():
+            if role == None or character.get("role").lower() == role:
                 character_info = get_info_from_character_data(character)
                 info.append(character_info)
 
-    elif type.lower() == "anime":
+    elif type == "anime":
         for anime in data:
-            if role == None or anime.get("role").lower() == role.lower():
+            if role == None or anime.get("role").lower() == role:
                 anime_info = get_info_from_anime_data(anime.get('anime'))
                 info.append(anime_info)
     return info
@@ -90,16 +275,16 @@ def get_info_from_character_data(character_data):
         curr_character = character_data
         voice_actor = "voices"
 
-    character_info = {
-        "character_id": curr_character.get("mal_id"),
-        "character_name": curr_character.get("name"),
-        "character_image_url": curr_character
+    character_info = CharacterInfo(
+        character_id=curr_character.get("mal_id"),
+        character_name=curr_character.get("name"),
+        character_image_url=curr_character
         .get("images")
         .get("jpg")
         .get("image_url"),
-        "role": character_data.get("role"),
-        'about': character_data.get('about')
-    }
+        role=character_data.get("role"),
+        about=character_data.get('about')
+    )
 
     # some characters have no voice actors
     if character_data.get(voice_actor) is not None and character_data.get(voice_actor):
@@ -109,13 +294,13 @@ def get_info_from_character_data(character_data):
                 voice_actor_index = i
                 break
         voice_actor = character_data.get(voice_actor)[voice_actor_index]
-        character_info["seiyuu_id"] = (
+        character_info.seiyuu_id = (
             voice_actor.get("person").get("mal_id")
         )
-        character_info["seiyuu_name"] = (
+        character_info.seiyuu_name = (
             voice_actor.get("person").get("name")
         )
-        character_info["seiyuu_image_url"] = (
+        character_info.seiyuu_image_url = (
             voice_actor
             .get("person")
             .get("images")
@@ -125,8 +310,8 @@ def get_info_from_character_data(character_data):
 
     # check if it is from /characters if it is we need every anime instead of 1 so we dont need this
     if character_data.get("anime") is not None and not isinstance(character_data.get("anime"), list):
-        character_info["title"] = character_data.get("anime").get("title")
-        character_info["anime_id"] = character_data.get("anime").get("mal_id")
+        character_info.title = character_data.get("anime").get("title")
+        character_info.anime_id = character_data.get("anime").get("mal_id")
     return character_info
 
 def get_info_from_person_data(person_data):
@@ -140,29 +325,1054 @@ def get_info_from_person_data(person_data):
     if person_data.get("given_name") is not None:
         jp_name += person_data.get("given_name")
     jp_name = jp_name.strip()
-    return {
-        "id": person_data.get("mal_id"),
-        "name": person_data.get("name"),
-        "jp_name": jp_name,
-        "image_url": person_data.get("images").get("jpg").get("image_url"),
-        "about": person_data.get("about"),
-        "birthday": person_data.get("birthday"),
-        "website_url": person_data.get("website_url"),
-    }
+    return PersonInfo(
+        id=person_data.get("mal_id"),
+        name=person_data.get("name"),
+        jp_name=jp_name,
+        image_url=person_data.get("images").get("jpg").get("image_url"),
+        about=person_data.get("about"),
+        birthday=person_data.get("birthday"),
+        website_url=person_data.get("website_url"),
+        favorites=person_data.get("favorites"),
+    )
 
 class ApiError(Exception):
     """Custom exception to show an API error"""
     pass
 
-def get_jikan_request(url, params=None):
-    """Function to handle jikan requests"""
+def get_jikan_request(url, params=None, background=False):
+    """
+    Function to handle jikan requests, cached responses are used when available.
+    Identical requests in flight at the same time share one call to the api
+    """
+    start = time.perf_counter()
+    try:
+        return jikan_cache.get_or_fetch(url, params, lambda: fetch_jikan_request(url, params, background))
+    except FlightTimeout:
+        app.logger.warning("Jikan request shared with another thread timed out", exc_info=True)
+        raise ApiError
+    finally:
+        jikan_latency.observe(time.perf_counter() - start, endpoint=get_endpoint_template(url))
+
+def fetch_jikan_request(url, params=None, background=False):
+    """Request a url from jikanapi, skipping the cache. Background requests wait behind users' for the rate limit"""
+    endpoint = get_endpoint_template(url)
+    stats = current_stats.get()
+    upstream_requests.inc(route=stats.route if stats else "none", endpoint=endpoint)
+    if stats:
+        stats.add_upstream_request()
+
+    start = time.perf_counter()
+    try:
+        if background:
+            response = background_client.get(url, params, timeout=BACKGROUND_RATE_TIMEOUT)
+        else:
+            response = jikan_client.get(url, params, timeout=JIKAN_RATE_TIMEOUT)
+    except UpstreamError:
+        upstream_latency.observe(time.perf_counter() - start, endpoint=endpoint, status="error")
+        app.logger.warning("Jikan request failed", exc_info=True)
+        raise ApiError
+    upstream_latency.observe(time.perf_counter() - start, endpoint=endpoint, status=response.status_code)
 
-    request = requests.get(f"{BASE_URL}{url}", params).json()
+    try:
+        request = decode_response(response, JIKAN_JSON_DECODE)
+    except DecodeError:
+        app.logger.warning("Jikan response couldn't be read", exc_info=True)
+        raise ApiError
     if 'error' in request:
         # This means there isn't the correct data in the api request
         raise ApiError
     return request
 
+def get_jikan_requests(*requests):
+    """
+    Make independent jikan requests concurrently, each one a url or a (url, params) pair.
+    Returns the responses in the same order, raising ApiError if any of them failed.
+    Calls still go through the rate limit. Don't call this from a jikan_pool thread
+    """
+    stats = current_stats.get()
+
+    def get_request(request):
+        url, params = (request, None) if isinstance(request, str) else request
+        with app.app_context(), tracking(stats):
+            return get_jikan_request(url, params)
+
+    return list(jikan_pool.map(get_request, requests))
+
+def get_people_info(person_ids):
+    """
+    Get basic information on every person in person_ids, in the same order as person_ids.
+    Stored people are read from the database, the rest are requested concurrently and stored
+    """
+    people = load_people(person_ids)
+    missing = [person_id for person_id in person_ids if person_id not in people]
+    if missing:
+        people_reqs = get_jikan_requests(*[f"/people/{person_id}" for person_id in missing])
+        fetched = [person_req.get("data") for person_req in people_reqs]
+        save_people(fetched)
+        for person_data in fetched:
+            people[person_data.get("mal_id")] = get_info_from_person_data(person_data)
+    return [people[person_id] for person_id in person_ids]
+
+#
+### LOCAL ENTITY STORE
+#
+
+def is_fresh(updated_at):
+    """Check if something stored at updated_at is recent enough to use"""
+    return updated_at is not None and datetime.utcnow() - updated_at < STORE_REFRESH_AFTER
+
+def upsert(model, rows, update=None):
+    """
+    Insert rows (dicts of column values) into a model's table.
+    Rows that already exist get the columns in `update` overwritten, by default every column given.
+    Rows with the same primary key are merged with the last one winning
+    """
+    if not rows:
+        return
+    primary_key = [column.name for column in model.__table__.primary_key]
+    unique_rows = {tuple(row[key] for key in primary_key): row for row in rows}
+    if update is None:
+        update = [key for key in rows[0] if key not in primary_key]
+
+    stage_suggestions(model, unique_rows.values())
+
+    stmt = insert(model).values(list(unique_rows.values()))
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=primary_key,
+            set_={key: stmt.excluded[key] for key in update},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=primary_key)
+    db.session.execute(stmt)
+
+def get_basic_row(data, name_key, updated_at):
+    """The id, name/title and image of an anime/character/person nested in a jikanapi response"""
+    return {
+        "id": data.get("mal_id"),
+        name_key: data.get(name_key),
+        "image_url": data.get("images").get("jpg").get("image_url"),
+        "updated_at": updated_at,
+    }
+
+def save_anime(anime_data, characters_data):
+    """Store an anime's full information along with its characters and their voice actors"""
+    now = datetime.utcnow()
+    info = get_info_from_anime_data(anime_data)
+    anime_id = info["id"]
+    upsert(Anime, [{**info, "updated_at": now, "full_updated_at": now, "described_at": now}])
+
+    characters, people, anime_roles, voice_roles = [], [], [], []
+    for position, character_data in enumerate(characters_data):
+        character = get_basic_row(character_data.get("character"), "name", now)
+        character["favorites"] = character_data.get("favorites")
+        characters.append(character)
+        anime_roles.append({
+            "anime_id": anime_id,
+            "character_id": character["id"],
+            "role": character_data.get("role"),
+            "position": position,
+        })
+        for voice_actor in character_data.get("voice_actors") or []:
+            person = get_basic_row(voice_actor.get("person"), "name", now)
+            people.append(person)
+            voice_roles.append({
+                "anime_id": anime_id,
+                "character_id": character["id"],
+                "person_id": person["id"],
+                "language": voice_actor.get("language"),
+            })
+
+    # the anime's character list replaces whatever was stored before
+    AnimeRole.query.filter_by(anime_id=anime_id).delete()
+    VoiceRole.query.filter_by(anime_id=anime_id).delete()
+    upsert(Character, characters)
+    upsert(Person, people)
+    upsert(AnimeRole, anime_roles)
+    upsert(VoiceRole, voice_roles)
+    db.session.commit()
+
+def get_character_row(character_data, updated_at):
+    """A row for the characters table out of a jikanapi character from /characters/"""
+    return {
+        **get_basic_row(character_data, "name", updated_at),
+        "about": character_data.get("about"),
+        "favorites": character_data.get("favorites"),
+        "described_at": updated_at,
+    }
+
+def save_character(character_data):
+    """Store a character's full information along with their voice actors and anime"""
+    now = datetime.utcnow()
+    character = get_character_row(character_data, now)
+    upsert(Character, [{**character, "full_updated_at": now}])
+
+    people, voices = [], []
+    for voice_actor in character_data.get("voices") or []:
+        person = get_basic_row(voice_actor.get("person"), "name", now)
+        people.append(person)
+        voices.append({
+            "character_id": character["id"],
+            "person_id": person["id"],
+            "language": voice_actor.get("language"),
+        })
+
+    anime, anime_roles = [], []
+    for anime_data in character_data.get("anime") or []:
+        anime.append(get_basic_row(anime_data.get("anime"), "title", now))
+        anime_roles.append({
+            "anime_id": anime[-1]["id"],
+            "character_id": character["id"],
+            "role": anime_data.get("role"),
+        })
+
+    # the character's voice actor list replaces whatever was stored before
+    CharacterVoice.query.filter_by(character_id=character["id"]).delete()
+    upsert(Person, people)
+    upsert(CharacterVoice, voices)
+    upsert(Anime, anime)
+    upsert(AnimeRole, anime_roles)
+    db.session.commit()
+
+def get_person_row(person_data, updated_at):
+    """A row for the people table out of a jikanapi person"""
+    info = get_info_from_person_data(person_data)
+    return {**info, "updated_at": updated_at, "described_at": updated_at}
+
+def save_person(person_data):
+    """Store a person's full information along with the characters they voiced"""
+    now = datetime.utcnow()
+    person = get_person_row(person_data, now)
+    upsert(Person, [{**person, "full_updated_at": now}])
+
+    # the language is only known from the anime's side so keep what's stored
+    languages = {
+        (anime_id, character_id): language
+        for anime_id, character_id, language in (db.session
+            .query(VoiceRole.anime_id, VoiceRole.character_id, VoiceRole.language)
+            .filter(VoiceRole.person_id == person["id"]))
+    }
+    anime, characters, anime_roles, voice_roles = [], [], [], []
+    for voice in person_data.get("voices") or []:
+        anime.append(get_basic_row(voice.get("anime"), "title", now))
+        characters.append(get_basic_row(voice.get("character"), "name", now))
+        anime_roles.append({
+            "anime_id": anime[-1]["id"],
+            "character_id": characters[-1]["id"],
+            "role": voice.get("role"),
+        })
+        voice_roles.append({
+            "anime_id": anime[-1]["id"],
+            "character_id": characters[-1]["id"],
+            "person_id": person["id"],
+            "language": languages.get((anime[-1]["id"], characters[-1]["id"])),
+        })
+
+    # the person's role list replaces whatever was stored before
+    VoiceRole.query.filter_by(person_id=person["id"]).delete()
+    upsert(Anime, anime)
+    upsert(Character, characters)
+    upsert(AnimeRole, anime_roles)
+    upsert(VoiceRole, voice_roles)
+    db.session.commit()
+
+def save_people(people_data):
+    """Store information about people without their voice roles"""
+    now = datetime.utcnow()
+    upsert(Person, [get_person_row(person_data, now) for person_data in people_data])
+    db.session.commit()
+
+def get_info_from_anime_row(anime, role=None):
+    """The same information as get_info_from_anime_data, from a stored anime. role is set when it's given"""
+    info = AnimeInfo(
+        id=anime.id,
+        image_url=anime.image_url,
+        title=anime.title,
+        synopsis=anime.synopsis,
+        rating=anime.rating,
+        genres=anime.genres or [],
+        type=anime.type,
+        favorites=anime.favorites,
+    )
+    if role is not None:
+        info.role = role
+    return info
+
+def get_info_from_person_row(person):
+    """The same information as get_info_from_person_data, from a stored person"""
+    return PersonInfo(
+        id=person.id,
+        name=person.name,
+        jp_name=person.jp_name,
+        image_url=person.image_url,
+        about=person.about,
+        birthday=person.birthday,
+        website_url=person.website_url,
+        favorites=person.favorites,
+    )
+
+def get_info_from_character_row(character, role=None):
+    """The information get_info_from_character_data has without the voice actor, from a stored character"""
+    return CharacterInfo(
+        character_id=character.id,
+        character_name=character.name,
+        character_image_url=character.image_url,
+        role=role,
+        about=character.about,
+    )
+
+def get_voice_actors(anime_id, character_ids):
+    """
+    Map each character id to the person voicing them in an anime.
+    Like get_info_from_character_data the Japanese voice actor is picked if there is one
+    """
+    voices = (db.session
+                .query(VoiceRole.character_id, Person)
+                .join(Person, Person.id == VoiceRole.person_id)
+                .filter(VoiceRole.anime_id == anime_id)
+                .filter(VoiceRole.character_id.in_(character_ids))
+                .order_by(
+                    VoiceRole.character_id,
+                    (VoiceRole.language == 'Japanese').desc().nullslast(),
+                    VoiceRole.person_id,
+                )
+                .all())
+    voice_actors = {}
+    for character_id, person in voices:
+        voice_actors.setdefault(character_id, person)
+    return voice_actors
+
+def get_character_voice_actor(character_id):
+    """The person voicing a character as their page lists them, the Japanese one if there is one"""
+    return (db.session
+                .query(Person)
+                .join(CharacterVoice, CharacterVoice.person_id == Person.id)
+                .filter(CharacterVoice.character_id == character_id)
+                .order_by((CharacterVoice.language == 'Japanese').desc().nullslast(), Person.id)
+                .first())
+
+def add_voice_actor(character_info, person):
+    """Add the voice actor keys get_info_from_character_data sets"""
+    if person is not None:
+        character_info.seiyuu_id = person.id
+        character_info.seiyuu_name = person.name
+        character_info.seiyuu_image_url = person.image_url
+    return character_info
+
+def partition_by_role(infos):
+    """
+    Group infos by their 'role' in one pass, {'main': [...], 'supporting': [...], other role: [...]}.
+    Roles are lowercased, 'main' and 'supporting' are always there
+    """
+    roles = {"main": [], "supporting": []}
+    for info in infos:
+        role = (info.get("role") or "").lower()
+        bucket = roles.get(role)
+        if bucket is None:
+            bucket = roles[role] = []
+        bucket.append(info)
+    return roles
+
+def get_roles_page(query, roles_page):
+    """
+    One page of a query for roles, main roles first, along with how many pages there are.
+    The query's last column has to be the count of every row (count(*) over ())
+    """
+    rows = (query
+                .filter(db.func.lower(AnimeRole.role).in_(["main", "supporting"]))
+                .offset((roles_page - 1) * ROLES_PER_PAGE)
+                .limit(ROLES_PER_PAGE)
+                .all())
+    total = rows[0][-1] if rows else 0
+    return [row[:-1] for row in rows], max(1, -(-total // ROLES_PER_PAGE))
+
+def main_roles_first():
+    return (db.func.lower(AnimeRole.role) == "main").desc()
+
+def load_anime(anime_id, roles_page=1):
+    """
+    Get a stored anime as (info, characters by role, roles_pages), with one page of its characters.
+    Returns None when the anime hasn't been stored or is stale
+    """
+    anime = Anime.query.get(anime_id)
+    if anime is None or not is_fresh(anime.full_updated_at):
+        return None
+
+    roles, roles_pages = get_roles_page(
+        (db.session
+            .query(AnimeRole.role, Character, db.func.count().over())
+            .join(Character, Character.id == AnimeRole.character_id)
+            .filter(AnimeRole.anime_id == anime_id)
+            .order_by(main_roles_first(), AnimeRole.position.asc().nullslast(), Character.id)),
+        roles_page
+    )
+    voice_actors = get_voice_actors(anime_id, [character.id for _, character in roles])
+    characters = []
+    for role, character in roles:
+        character_info = get_info_from_character_row(character, role)
+        characters.append(add_voice_actor(character_info, voice_actors.get(character.id)))
+    return get_info_from_anime_row(anime), partition_by_role(characters), roles_pages
+
+def load_character(character_id, roles_page=1):
+    """
+    Get a stored character as (character_info, anime by role, roles_pages), with one page of their anime.
+    Returns None when the character hasn't been stored or is stale
+    """
+    character = Character.query.get(character_id)
+    if character is None or not is_fresh(character.full_updated_at):
+        return None
+
+    character_info = get_info_from_character_row(character)
+    add_voice_actor(character_info, get_character_voice_actor(character_id))
+
+    roles, roles_pages = get_roles_page(
+        (db.session
+            .query(AnimeRole.role, Anime, db.func.count().over())
+            .join(Anime, Anime.id == AnimeRole.anime_id)
+            .filter(AnimeRole.character_id == character_id)
+            .order_by(main_roles_first(), Anime.id)),
+        roles_page
+    )
+    anime = [get_info_from_anime_row(anime, role) for role, anime in roles]
+    return character_info, partition_by_role(anime), roles_pages
+
+def load_person(person_id, roles_page=1):
+    """
+    Get a stored person as (info, roles by role, roles_pages), with one page of their roles.
+    Returns None when the person's roles haven't been stored or are stale
+    """
+    person = Person.query.get(person_id)
+    if person is None or not is_fresh(person.full_updated_at):
+        return None
+
+    roles, roles_pages = get_roles_page(
+        (db.session
+            .query(AnimeRole.role, Anime.id, Anime.title, Character, db.func.count().over())
+            .join(VoiceRole, db.and_(
+                VoiceRole.anime_id == AnimeRole.anime_id,
+                VoiceRole.character_id == AnimeRole.character_id,
+            ))
+            .join(Anime, Anime.id == AnimeRole.anime_id)
+            .join(Character, Character.id == AnimeRole.character_id)
+            .filter(VoiceRole.person_id == person_id)
+            .order_by(main_roles_first(), Anime.title, Character.name)),
+        roles_page
+    )
+    characters = [
+        RoleInfo(
+            character_id=character.id,
+            character_name=character.name,
+            character_image_url=character.image_url,
+            role=role,
+            title=title,
+            anime_id=anime_id,
+        )
+        for role, anime_id, title, character in roles
+    ]
+    return get_info_from_person_row(person), partition_by_role(characters), roles_pages
+
+def load_people(person_ids):
+    """Map each stored, fresh person in person_ids to their info"""
+    people = Person.query.filter(Person.id.in_(person_ids)).all()
+    return {
+        person.id: get_info_from_person_row(person)
+        for person in people
+        if is_fresh(person.updated_at)
+    }
+
+#
+### LOCAL SEARCH
+#
+
+# search type -> (model, row to info)
+SEARCH_TYPES = {
+    "anime": (Anime, get_info_from_anime_row),
+    "characters": (Character, get_info_from_character_row),
+    "people": (Person, get_info_from_person_row),
+}
+
+def get_search_query(q):
+    """
+    A full-text query matching names/titles with a word starting with each word of q,
+    'fate zer' -> 'fate:* & zer:*'. None when q has no words
+    """
+    words = re.findall(r"\w+", (q or "").lower())
+    return " & ".join(f"{word}:*" for word in words) or None
+
+def search_local(type, q, page):
+    """
+    One page of the stored entities of a search type matching q, most favorited first,
+    along with how many match. Uses the table's search_vector GIN index.
+    Entities only stored nested in another response are left out, they have no synopsis/about to show
+    """
+    model, get_info = SEARCH_TYPES[type]
+    rows = (db.session
+                .query(model, db.func.count().over())
+                .filter(model.search_vector.op("@@")(db.func.to_tsquery("simple", get_search_query(q))))
+                .filter(model.described_at.isnot(None))
+                .order_by(model.favorites.desc().nullslast(), model.id)
+                .offset((page - 1) * SEARCH_PAGE_SIZE)
+                .limit(SEARCH_PAGE_SIZE)
+                .all())
+    total = rows[0][-1] if rows else 0
+    return [get_info(row) for row, _ in rows], total
+
+def save_search_results(type, data):
+    """Store the anime/characters/people in a jikanapi search response so later searches find them"""
+    now = datetime.utcnow()
+    if type == "anime":
+        upsert(Anime, [
+            {**get_info_from_anime_data(anime_data), "updated_at": now, "described_at": now}
+            for anime_data in data
+        ])
+    elif type == "characters":
+        upsert(Character, [get_character_row(character_data, now) for character_data in data])
+    elif type == "people":
+        upsert(Person, [get_person_row(person_data, now) for person_data in data])
+    db.session.commit()
+
+#
+### SEARCH SUGGESTIONS
+#
+
+# search type -> (model, the name/title columns suggestions match, where their pages are)
+SUGGEST_TYPES = {
+    "anime": (Anime, ("title",), "/anime/"),
+    "characters": (Character, ("name",), "/character/"),
+    "people": (Person, ("name", "jp_name"), "/person/"),
+}
+suggest_indexes = {type: PrefixIndex(SUGGEST_LIMIT) for type in SUGGEST_TYPES}
+# search type -> when its index last read what's stored, missing until it's first read
+suggest_synced_at = {}
+suggest_lock = threading.Lock()
+
+def sync_suggestions(type):
+    """
+    Add everything stored to a type's index the first time it's used, after that only
+    what's been stored since the last sync (by any worker), once per SUGGEST_SYNC_INTERVAL
+    """
+    synced_at = suggest_synced_at.get(type)
+    if synced_at is not None and datetime.utcnow() - synced_at < SUGGEST_SYNC_INTERVAL:
+        return
+    with suggest_lock:
+        synced_at = suggest_synced_at.get(type)
+        if synced_at is not None and datetime.utcnow() - synced_at < SUGGEST_SYNC_INTERVAL:
+            return
+        model, columns, _ = SUGGEST_TYPES[type]
+        now = datetime.utcnow()
+        query = (db.session
+                    .query(model.id, model.favorites, *[getattr(model, column) for column in columns]))
+        if synced_at is not None:
+            query = query.filter(model.updated_at >= synced_at - SUGGEST_SYNC_OVERLAP)
+        suggest_indexes[type].update((id, names, favorites) for id, favorites, *names in query)
+        suggest_synced_at[type] = now
+
+def add_suggestions(model, rows):
+    """
+    Add rows being stored to the index of their type, once it's been read from the db.
+    Rows without every column the index has (like anime nested in a person's roles) only
+    add ids it doesn't have yet, the next sync reads their whole row
+    """
+    for type, (indexed_model, columns, _) in SUGGEST_TYPES.items():
+        if indexed_model is model and type in suggest_synced_at:
+            break
+    else:
+        return
+    index = suggest_indexes[type]
+    index.update(
+        (row["id"], [row.get(column) for column in columns], row.get("favorites"))
+        for row in rows
+        if row["id"] not in index or "favorites" in row and all(column in row for column in columns)
+    )
+
+def stage_suggestions(model, rows):
+    """Hold on to rows being stored until their transaction commits, then add_suggestions them"""
+    db.session.info.setdefault("staged_suggestions", []).append((model, list(rows)))
+
+@event.listens_for(db.session, "after_commit")
+def add_staged_suggestions(session):
+    for model, rows in session.info.pop("staged_suggestions", []):
+        add_suggestions(model, rows)
+
+@event.listens_for(db.session, "after_rollback")
+def drop_staged_suggestions(session):
+    # the rows were never stored
+    session.info.pop("staged_suggestions", None)
+
+#
+### SEIYUU FILTER
+#
+
+def get_seiyuu_postings(person_ids):
+    """
+    Map each person id to the sorted arrays (anime ids, character ids) of what they voiced.
+    People whose roles aren't stored or are stale are requested concurrently and stored.
+    Arrays are kept in seiyuu_index until the person's roles are stored again. Raises ApiError
+    """
+    stored_at = dict(db.session.query(Person.id, Person.full_updated_at).filter(Person.id.in_(person_ids)))
+    missing = [person_id for person_id in person_ids if not is_fresh(stored_at.get(person_id))]
+    if missing:
+        for person_req in get_jikan_requests(*[f"/people/{person_id}/full" for person_id in missing]):
+            save_person(person_req.get("data"))
+        stored_at.update(db.session.query(Person.id, Person.full_updated_at).filter(Person.id.in_(missing)))
+
+    postings = {}
+    for person_id in person_ids:
+        entry = seiyuu_index.get(person_id)
+        if entry is not None and entry[0] == stored_at.get(person_id):
+            postings[person_id] = entry[1:]
+    unindexed = [person_id for person_id in person_ids if person_id not in postings]
+    if unindexed:
+        roles = (db.session
+                    .query(VoiceRole.person_id, VoiceRole.anime_id, VoiceRole.character_id)
+                    .filter(VoiceRole.person_id.in_(unindexed))
+                    .all())
+        anime_ids = {person_id: [] for person_id in unindexed}
+        character_ids = {person_id: [] for person_id in unindexed}
+        for person_id, anime_id, character_id in roles:
+            anime_ids[person_id].append(anime_id)
+            character_ids[person_id].append(character_id)
+        for person_id in unindexed:
+            postings[person_id] = (to_postings(anime_ids[person_id]), to_postings(character_ids[person_id]))
+            seiyuu_index.set(person_id, (stored_at.get(person_id), *postings[person_id]), time.time() + SEIYUU_INDEX_TTL)
+    return postings
+
+#
+### CO-STAR GRAPH
+#
+
+def get_costar_edges():
+    """
+    (person_id, co-star id, shared anime) for every pair of seiyuu who voiced in the same anime,
+    both ways round, in the order CostarGraph.from_edges takes them.
+    Only Japanese voice roles count (roles stored from a person's page have no language)
+    """
+    cast = (db.session
+                .query(VoiceRole.anime_id, VoiceRole.person_id)
+                .filter(db.func.coalesce(VoiceRole.language, 'Japanese') == 'Japanese')
+                .distinct()
+                .subquery())
+    other = db.aliased(cast)
+    shared_anime = db.func.count()
+    return (db.session
+                .query(cast.c.person_id, other.c.person_id, shared_anime)
+                .join(other, db.and_(other.c.anime_id == cast.c.anime_id, other.c.person_id != cast.c.person_id))
+                .group_by(cast.c.person_id, other.c.person_id)
+                .order_by(cast.c.person_id, shared_anime.desc(), other.c.person_id)
+                .yield_per(10000))
+
+class CostarSnapshot:
+    """
+    The co-star graph of every stored seiyuu, kept in memory.
+    It's built on first use, after that a stale graph is served while a thread rebuilds it
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.graph = None
+        self.built_at = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.graph is None:
+                self.refresh()
+            elif time.time() - self.built_at > self.interval and self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            return self.graph
+
+    def run(self):
+        with app.app_context(), tracking(RequestStats("costar_graph")) as stats:
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Couldn't rebuild the co-star graph")
+            finally:
+                self.thread = None
+                record_request_stats(stats)
+
+    def refresh(self):
+        """Build the graph from the stored roles then swap it in"""
+        built_at = time.time()
+        self.graph = CostarGraph.from_edges(get_costar_edges())
+        self.built_at = built_at
+
+costar_snapshot = CostarSnapshot(COSTAR_REFRESH_INTERVAL)
+
+def get_people_json(person_ids):
+    """{person_id: {id, name, image_url}} for the stored people in person_ids"""
+    people = (db.session
+                .query(Person.id, Person.name, Person.image_url)
+                .filter(Person.id.in_(person_ids))
+                .all())
+    return {id: {'id': id, 'name': name, 'image_url': image_url} for id, name, image_url in people}
+
+#
+### RECOMMENDATIONS
+#
+
+def get_rank_weight(position):
+    """How much a favorite at position (0 for the top) counts towards similarities, 1, .63, .5, .43..."""
+    return 1 / math.log2(position + 2)
+
+def get_ranked_favorites(user_id, limit=None):
+    """A user's favorite seiyuu ids in rank order, the top limit of them if it's given"""
+    favorites = (db.session
+                .query(FavoriteSeiyuu.seiyuu_id)
+                .filter(FavoriteSeiyuu.user_id==user_id)
+                .order_by(FavoriteSeiyuu.rank, FavoriteSeiyuu.seiyuu_id)
+                .limit(limit)
+                .all())
+    return [id for (id,) in favorites]
+
+def get_similarity_changes(before, after):
+    """
+    What a user's top favorites going from before to after (seiyuu ids in rank order, at most
+    RECOMMEND_FROM) changes in the similarities, {(seiyuu_id, other_id): (co_favorites, score)}
+    with each pair both ways round. Pairs within the favorites both lists start with are left
+    out, their weights don't change
+    """
+    unchanged = 0
+    while unchanged < min(len(before), len(after)) and before[unchanged] == after[unchanged]:
+        unchanged += 1
+
+    changes = {}
+    for favorites, sign in ((before, -1), (after, 1)):
+        weights = [get_rank_weight(position) for position in range(len(favorites))]
+        for i, seiyuu_id in enumerate(favorites):
+            for j in range(max(i + 1, unchanged), len(favorites)):
+                score = sign * weights[i] * weights[j]
+                for pair in ((seiyuu_id, favorites[j]), (favorites[j], seiyuu_id)):
+                    co_favorites, total = changes.get(pair, (0, 0))
+                    changes[pair] = (co_favorites + sign, total + score)
+    return {pair: change for pair, change in changes.items() if change != (0, 0)}
+
+def update_similarities(before, after):
+    """Apply a user's favorites going from before to after to the similarities, in one statement"""
+    changes = get_similarity_changes(before, after)
+    if not changes:
+        return
+    # in key order so concurrent updates lock the rows they share in the same order
+    rows = [
+        {"seiyuu_id": seiyuu_id, "other_id": other_id, "co_favorites": co_favorites, "score": score}
+        for (seiyuu_id, other_id), (co_favorites, score) in sorted(changes.items())
+    ]
+    stmt = insert(SeiyuuSimilarity).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["seiyuu_id", "other_id"],
+        set_={
+            "co_favorites": SeiyuuSimilarity.co_favorites + stmt.excluded.co_favorites,
+            "score": SeiyuuSimilarity.score + stmt.excluded.score,
+        },
+    )
+    db.session.execute(stmt)
+
+def updating_similarities(user_id, change):
+    """
+    change, changing a user's favorites, made to also update the similarities.
+    The user's row is locked until the commit so two changes to their favorites apply one after the other
+    """
+    def run():
+        db.session.query(User.id).filter(User.id==user_id).with_for_update().first()
+        before = get_ranked_favorites(user_id, RECOMMEND_FROM)
+        result = change()
+        update_similarities(before, get_ranked_favorites(user_id, RECOMMEND_FROM))
+        return result
+    return run
+
+def rebuild_similarities():
+    """Work every similarity out from the favorites again, for a new seiyuu_similarities table"""
+    positions = (db.select(
+                    FavoriteSeiyuu.user_id,
+                    FavoriteSeiyuu.seiyuu_id,
+                    (db.func.row_number().over(
+                        partition_by=FavoriteSeiyuu.user_id,
+                        order_by=(FavoriteSeiyuu.rank, FavoriteSeiyuu.seiyuu_id),
+                    ) - 1).label("position"))
+                .subquery())
+    # each user's top RECOMMEND_FROM with the same weights as get_rank_weight
+    ranked = (db.select(
+                    positions.c.user_id,
+                    positions.c.seiyuu_id,
+                    (db.func.ln(2.0) / db.func.ln(db.cast(positions.c.position + 2, db.Float))).label("weight"))
+                .where(positions.c.position < RECOMMEND_FROM)
+                .subquery())
+    other = ranked.alias()
+    pairs = (db.select(ranked.c.seiyuu_id, other.c.seiyuu_id, db.func.count(), db.func.sum(ranked.c.weight * other.c.weight))
+                .select_from(ranked)
+                .join(other, db.and_(other.c.user_id == ranked.c.user_id, other.c.seiyuu_id != ranked.c.seiyuu_id))
+                .group_by(ranked.c.seiyuu_id, other.c.seiyuu_id))
+    db.session.execute(db.delete(SeiyuuSimilarity))
+    db.session.execute(
+        insert(SeiyuuSimilarity).from_select(["seiyuu_id", "other_id", "co_favorites", "score"], pairs)
+    )
+    db.session.commit()
+
+def get_similar_seiyuu(person_id, limit=RECOMMENDATIONS_LIMIT):
+    """The seiyuu most similar to one, by the users who favorited both"""
+    similar = (db.session
+                .query(SeiyuuSimilarity.other_id)
+                .filter(SeiyuuSimilarity.seiyuu_id==person_id)
+                .filter(SeiyuuSimilarity.co_favorites > 0)
+                .order_by(SeiyuuSimilarity.score.desc(), SeiyuuSimilarity.other_id)
+                .limit(limit)
+                .all())
+    return [id for (id,) in similar]
+
+def get_user_recommendations(user_id, limit=RECOMMENDATIONS_LIMIT):
+    """
+    Seiyuu a user hasn't favorited that are most similar to their favorites,
+    each favorite counting as much as its rank weight
+    """
+    favorites = get_ranked_favorites(user_id)
+    if not favorites:
+        return []
+    # the same favorites that count towards the similarities
+    weights = {id: get_rank_weight(position) for position, id in enumerate(favorites[:RECOMMEND_FROM])}
+    score = db.func.sum(SeiyuuSimilarity.score * db.case(weights, value=SeiyuuSimilarity.seiyuu_id))
+    recommended = (db.session
+                .query(SeiyuuSimilarity.other_id)
+                .filter(SeiyuuSimilarity.seiyuu_id.in_(weights))
+                .filter(SeiyuuSimilarity.other_id.notin_(favorites))
+                .filter(SeiyuuSimilarity.co_favorites > 0)
+                .group_by(SeiyuuSimilarity.other_id)
+                .order_by(score.desc(), SeiyuuSimilarity.other_id)
+                .limit(limit)
+                .all())
+    return [id for (id,) in recommended]
+
+def get_stored_people(person_ids):
+    """[{id, name, image_url}, ...] of the stored people in person_ids in the same order, the rest are left out"""
+    people = get_people_json(person_ids)
+    return [people[person_id] for person_id in person_ids if person_id in people]
+
+#
+### SEASONAL SNAPSHOT
+#
+
+class SeasonalSnapshot:
+    """
+    Every anime airing this season and the top shows' main characters, kept in memory.
+    A background thread rebuilds it every `interval` seconds so the homepage doesn't wait on the api
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        # (anime_info, main_characters) for the first page of /seasons/now (the top shows)
+        self.top_shows = []
+        self.all_seasonals = []
+        self.ready = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the refreshing thread if it isn't running yet"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with app.app_context(), tracking(RequestStats("seasonal_snapshot")) as stats:
+                try:
+                    self.refresh()
+                except Exception:
+                    app.logger.exception("Couldn't refresh the seasonal snapshot")
+                finally:
+                    self.ready.set()
+                    record_request_stats(stats)
+            time.sleep(self.interval)
+
+    def refresh(self):
+        """
+        Request every page of this season's anime and the top shows' characters, swapping each part in
+        as it's ready. Requests are background ones, made one at a time, so users' requests go first.
+        Only the first page of the first snapshot is requested like a user's, the homepage is waiting on it
+        """
+        first = not self.ready.is_set()
+        seasonals_req = get_jikan_request("/seasons/now", {"page": 1}, background=not first)
+        last_page = seasonals_req.get("pagination").get("last_visible_page") or 1
+        pages = [seasonals_req.get("data")]
+        if first:
+            # the homepage can show the top shows while the other pages load
+            self.set_shows(pages)
+        for page in range(2, last_page + 1):
+            pages.append(get_jikan_request("/seasons/now", {"page": page}, background=True).get("data"))
+
+        shows, top_ids = self.set_shows(pages)
+
+        # only the top shows' characters are ever shown
+        for anime_id in top_ids:
+            try:
+                characters_data = get_jikan_request(f"/anime/{anime_id}/characters", background=True).get("data")
+            except ApiError:
+                continue
+            save_anime(shows[anime_id], characters_data)
+            main_characters = get_info_by_role(characters_data, "character", "main")
+            self.top_shows = [
+                (anime_info, main_characters if anime_info["id"] == anime_id else characters_info)
+                for anime_info, characters_info in self.top_shows
+            ]
+
+    def set_shows(self, pages):
+        """
+        Swap in the shows on pages (lists of jikanapi anime, the top shows first) without their characters.
+        Returns ({anime_id: anime data}, top show ids)
+        """
+        # the same show can be listed on more than one page
+        shows = {}
+        for data in pages:
+            for show in data:
+                shows.setdefault(show.get("mal_id"), show)
+        all_seasonals = [
+            {
+                "id": show.get("mal_id"),
+                "image_url": show.get("images").get("jpg").get("image_url"),
+                "title": show.get("title"),
+            }
+            for show in shows.values()
+        ]
+        # the page is usable before every show's characters are in, the homepage
+        # requests the characters of a show that doesn't have them yet itself
+        top_ids = list(dict.fromkeys(show.get("mal_id") for show in pages[0]))
+        self.top_shows = [(get_info_from_anime_data(shows[id]), None) for id in top_ids]
+        self.all_seasonals = all_seasonals
+        self.ready.set()
+        return shows, top_ids
+
+    def random_show(self):
+        """A random top show as (anime_info, main_characters), main_characters is None if they aren't loaded yet"""
+        self.start()
+        self.ready.wait(SEASONAL_WAIT)
+        if not self.top_shows:
+            return None
+        return random.choice(self.top_shows)
+
+seasonal_snapshot = SeasonalSnapshot(SEASONAL_REFRESH_INTERVAL)
+
+#
+### METRICS
+#
+
+def record_request_stats(stats):
+    request_sql_queries.observe(stats.sql_queries, route=stats.route)
+    request_sql_latency.observe(stats.sql_seconds, route=stats.route)
+    request_upstream_requests.observe(stats.upstream_requests, route=stats.route)
+
+@metrics_registry.collector
+def collect_jikan_stats():
+    """Copy in the counts the jikan cache and client keep themselves"""
+    cache_stats = jikan_cache.stats()
+    for result, name in [("memory_hit", "memory_hits"), ("db_hit", "db_hits"), ("miss", "misses"), ("coalesced", "coalesced")]:
+        cache_lookups.set(cache_stats[name], result=result)
+    client_stats = jikan_client.stats()
+    for event_name in ["requests", "retries", "failures", "connections_opened", "connections_reused"]:
+        client_events.set(client_stats[event_name], event=event_name)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.add_query(time.perf_counter() - started)
+
+@event.listens_for(Engine, "handle_error")
+def drop_query_timer(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    # a stack, templates can be rendered while a streamed one is still going
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    started = g.get("render_started")
+    if started:
+        render_latency.observe(time.perf_counter() - started.pop(), template=template.name)
+
+@app.before_request
+def start_request_stats():
+    """Count the SQL and jikanapi requests this request makes"""
+    g.request_started = time.perf_counter()
+    g.request_stats = RequestStats(request.endpoint or "none")
+    g.request_stats_token = current_stats.set(g.request_stats)
+
+@app.after_request
+def save_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exception=None):
+    stats = g.pop("request_stats", None)
+    if stats is None:
+        return
+    current_stats.reset(g.pop("request_stats_token"))
+    status = g.pop("response_status", 500)
+    request_latency.observe(time.perf_counter() - g.pop("request_started"), route=stats.route, status=status)
+    record_request_stats(stats)
+    metrics_registry.flush(METRICS_FLUSH_INTERVAL)
+
+@app.route("/metrics")
+def show_metrics():
+    """Every worker's metrics in the prometheus text format"""
+    metrics_registry.flush()
+    totals = metrics_registry.aggregate()
+    lookups = {key[0]: value for key, value in totals[cache_lookups.name].items()}
+    hits = lookups.get("memory_hit", 0) + lookups.get("db_hit", 0)
+    total = hits + lookups.get("miss", 0)
+    body = metrics_registry.render(totals) + render_gauge(
+        "seiyuulist_jikan_cache_hit_ratio",
+        "Share of jikan cache lookups answered from memory or the database",
+        hits / total if total else 0,
+    )
+    return app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+#
+### PROFILING
+#
+
+def should_profile():
+    if not PROFILING:
+        return False
+    if request.endpoint in PROFILE_ROUTES:
+        return True
+    if PROFILE_HEADER in request.headers:
+        return check_token(app.config["SECRET_KEY"], request.headers[PROFILE_HEADER])
+    return random.random() < PROFILE_SAMPLE_RATE
+
+@app.before_request
+def start_profile():
+    """Start sampling this request's stack if it was picked for profiling"""
+    if should_profile():
+        g.profile = profile_sampler.start(Profile(request.endpoint or "none"))
+
+@app.after_request
+def add_profile_header(response):
+    """Tell signed requests where their profile will be written"""
+    profile = g.get("profile")
+    if profile is not None and PROFILE_HEADER in request.headers:
+        response.headers["X-Profile-File"] = os.path.basename(profile.get_file_name(PROFILE_DIR))
+    return response
+
+@app.teardown_request
+def write_profile(exception=None):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile_sampler.stop(profile)
+        profile.write(PROFILE_DIR)
+
 #
 ### USER LOGIN/LOGOUT
 #
@@ -179,12 +1389,42 @@ def do_logout():
     if CURR_USER_KEY in session:
         del session[CURR_USER_KEY]
 
+class CachedUser:
+    """A user's columns (besides their password) kept in user_cache after their ORM object is gone"""
+
+    def __init__(self, user):
+        for column in User.__table__.columns:
+            if column.name != "password":
+                setattr(self, column.name, getattr(user, column.name))
+
+    def __repr__(self):
+        return f"<CachedUser #{self.id}: {self.username}, {self.email}>"
+
+def get_user(user_id):
+    """A user from this worker's user_cache or the database, None if they don't exist"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        user = CachedUser(user)
+        user_cache.set(user_id, user, time.time() + USER_CACHE_TTL)
+    return user
+
+def get_curr_user():
+    if "curr_user" not in g:
+        g.curr_user = get_user(session[CURR_USER_KEY])
+    return g.curr_user
+
 @app.before_request
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+    """
+    If we're logged in, add curr user to Flask global.
+    They're only looked up once g.user is used (even just `if g.user`)
+    """
 
     if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
+        g.user = LocalProxy(get_curr_user)
 
     else:
         g.user = None
@@ -196,118 +1436,316 @@ def add_user_to_g():
 @app.route("/")
 def root():
     """Homepage."""
-    try:
-        seasonals_req = get_jikan_request("/seasons/now")
-        anime_info = get_info_from_anime_data(random.choice(seasonals_req.get("data")))
-        all_seasonals = []
-        page = 1
-        while True:
-            # to prevent rate limiting
-            time.sleep(WAIT_TIME)
-            for show in seasonals_req.get("data"):
-                all_seasonals.append(
-                    {
-                        "id": show.get("mal_id"),
-                        "image_url": show.get("images").get("jpg").get("image_url"),
-                        "title": show.get("title"),
-                    }
-                )
-            page += 1
-            seasonals_req = get_jikan_request("/seasons/now", {"page": page})
-            if not seasonals_req.get("pagination").get("has_next_page"):
-                break
+    show = seasonal_snapshot.random_show()
+    if show is None:
+        flash("Something went wrong with the api request!")
+        return render_template("home.html")
 
-        characters_req = get_jikan_request(f"/anime/{anime_info.get('id')}/characters")
-        characters_info = get_info_by_role(characters_req.get("data"), "character", "main")
+    anime_info, characters_info = show
+    try:
+        if characters_info is None:
+            characters_req = get_jikan_request(f"/anime/{anime_info.get('id')}/characters")
+            characters_info = get_info_by_role(characters_req.get("data"), "character", "main")
         return render_template(
             "home.html",
             anime_info=anime_info,
             characters_info=characters_info,
-            all_seasonals=all_seasonals,
+            all_seasonals=seasonal_snapshot.all_seasonals,
         )
 
     except ApiError:
         flash("Something went wrong with the api request!")
         return render_template("home.html")
 
+#
+### PAGE CACHE
+#
+
+# where a per-request part goes in a cached page
+PLACEHOLDER = "<!--seiyuulist:{}-->"
+PLACEHOLDER_PATTERN = re.compile(PLACEHOLDER.format("([a-z-]+)"))
+
+def get_template_version():
+    """A hash of every template so pages cached before a template changed aren't used"""
+    digest = hashlib.blake2b(digest_size=8)
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    for root, dirs, files in sorted(os.walk(template_dir)):
+        for file_name in sorted(files):
+            with open(os.path.join(root, file_name), "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+TEMPLATE_VERSION = get_template_version()
+
+@app.template_global()
+def placeholder(name):
+    return Markup(PLACEHOLDER.format(name))
+
+@app.template_global()
+def cache_fragment(*key, caller):
+    """
+    Render a block once per key and reuse it for PAGE_CACHE_TTL seconds.
+    {% call cache_fragment('nav-user', g.user.id) %}...{% endcall %}
+    Blocks are rendered whole, use stream_fragment for long ones
+    """
+    key = (*key, TEMPLATE_VERSION)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = caller()
+        fragment_cache.set(key, html, time.time() + PAGE_CACHE_TTL)
+    return html
+
+@app.template_global()
+def stream_fragment(template_name, *key, **context):
+    """
+    Stream template_name rendered with context, or its html from fragment_cache.
+    {% for chunk in stream_fragment('person-roles.html', info.id, main_roles=main_roles) %}{{ chunk }}{% endfor %}
+    """
+    key = (template_name, *key, TEMPLATE_VERSION)
+    html = fragment_cache.get(key)
+    if html is not None:
+        yield html
+        return
+
+    chunks, size = [], 0
+    for chunk in app.jinja_env.get_template(template_name).generate(**context):
+        if chunks is not None:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > FRAGMENT_CACHE_MAX_SIZE:
+                chunks = None
+        # already escaped by the fragment's template
+        yield Markup(chunk)
+    if chunks is not None:
+        fragment_cache.set(key, Markup("".join(chunks)), time.time() + PAGE_CACHE_TTL)
+
+def get_cached_page(key):
+    """
+    The page for key from page_cache split on its placeholders (see fill_page), None if it isn't cached
+    """
+    parts = page_cache.get((*key, TEMPLATE_VERSION))
+    page_cache_lookups.inc(page=key[0], result="miss" if parts is None else "hit")
+    return parts
+
+def render_nav_user():
+    user_id = g.user.id if g.user else None
+    return cache_fragment("nav-user", user_id, caller=lambda: render_template("nav-user.html"))
+
+def render_flashes():
+    if "_flashes" not in session:
+        return ""
+    return render_template("flashes.html")
+
+def get_fragments(fragments):
+    """The functions filling in each placeholder, fragments adds or overrides ones for a page"""
+    return {"nav-user": render_nav_user, "flashes": render_flashes, "flush": lambda: "", **fragments}
+
+def fill_page(parts, **fragments):
+    """Fill in a cached page's placeholders, fragments are functions returning the html for each one"""
+    fragments = get_fragments(fragments)
+    # split() puts the placeholder names at the odd indexes
+    return "".join(fragments[part]() if i % 2 else part for i, part in enumerate(parts))
+
+def render_anonymously(chunks):
+    """
+    Step through a template's chunks as if no one's logged in, so nothing about the user
+    ends up in page_cache. The user is put back between steps for the placeholders
+    """
+    chunks = iter(chunks)
+    while True:
+        user = g.get("user")
+        g.user = None
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            g.user = user
+        yield chunk
+
+def stream_page(key, template_name, context, **fragments):
+    """
+    Stream template_name the same for everyone, filling in its placeholders as they go by.
+    Output is sent every STREAM_BUFFER_SIZE characters and at flush placeholders, and the
+    page is saved to page_cache once it's all been sent (unless it's over PAGE_CACHE_MAX_SIZE)
+    """
+    # rendered up front, the session (e.g. flashed messages being used up) is saved before the body is sent
+    fragments = {name: render() for name, render in get_fragments(fragments).items()}
+    chunks = render_anonymously(stream_template(template_name, page_cache=True, **context))
+
+    def generate():
+        # the page's text between placeholders, as lists of chunks, and the placeholders' names
+        texts, names, size = [[]], [], 0
+        buffer, buffered = [], 0
+        for chunk in chunks:
+            for i, piece in enumerate(PLACEHOLDER_PATTERN.split(chunk)):
+                if i % 2:
+                    if texts is not None:
+                        names.append(piece)
+                        texts.append([])
+                    if piece == "flush":
+                        yield "".join(buffer)
+                        buffer, buffered = [], 0
+                        continue
+                    piece = fragments[piece]
+                elif texts is not None:
+                    texts[-1].append(piece)
+                    size += len(piece)
+                    if size > PAGE_CACHE_MAX_SIZE:
+                        texts = None
+                buffer.append(piece)
+                buffered += len(piece)
+            if buffered >= STREAM_BUFFER_SIZE:
+                yield "".join(buffer)
+                buffer, buffered = [], 0
+        yield "".join(buffer)
+
+        if texts is not None:
+            parts = ["".join(texts[0])]
+            for name, text in zip(names, texts[1:]):
+                parts += [name, "".join(text)]
+            page_cache.set((*key, TEMPLATE_VERSION), parts, time.time() + PAGE_CACHE_TTL)
+
+    return app.response_class(stream_with_context(generate()))
+
 #
 ### PARSED INFORMATION ROUTES
 #
 
+def get_roles_page_arg():
+    """The page of roles asked for with ?roles_page=, 404 if it isn't a page number"""
+    roles_page = request.args.get("roles_page", 1, type=int)
+    if roles_page < 1:
+        abort(404)
+    return roles_page
+
+def check_roles_page(roles_page, roles_pages):
+    if roles_page > roles_pages:
+        abort(404)
+
+def render_favorite(person_id):
+    """The favorite checkbox for the logged in user"""
+    if not g.user:
+        return ""
+    is_favorite = (FavoriteSeiyuu
+        .query
+        .filter(FavoriteSeiyuu.user_id == g.user.id)
+        .filter(FavoriteSeiyuu.seiyuu_id == person_id)
+        .first()) is not None
+    return render_template("favorite.html", is_favorite=is_favorite)
+
+def render_recommendations(person_id):
+    """The seiyuu fans of a person also favorited, only from what's stored so the page never waits on jikanapi"""
+    recommendations = get_stored_people(get_similar_seiyuu(person_id))
+    return render_template("recommendations.html", recommendations=recommendations, heading="Fans also favorited:")
+
 @app.route("/person/<int:person_id>")
 def person_info(person_id):
     """View information about a person"""
-    if g.user:
-        is_favorite = (FavoriteSeiyuu
-            .query
-            .filter(FavoriteSeiyuu.user_id == g.user.id)
-            .filter(FavoriteSeiyuu.seiyuu_id == person_id)
-            .first()) is not None
-    else:
-        is_favorite = None
-    
-    try:
-        person_req = get_jikan_request(f"/people/{person_id}/full")
-        info = get_info_from_person_data(person_req.get("data"))
-        main_roles = get_info_by_role(person_req.get("data").get("voices"), "character", "main")
-        sup_roles = get_info_by_role(person_req.get("data").get("voices"), "character", "supporting")
-
-        return render_template(
-            "person.html", info=info, main_roles=main_roles, 
-            sup_roles=sup_roles, is_favorite=is_favorite
+    roles_page = get_roles_page_arg()
+    page = get_cached_page(("person", person_id, roles_page))
+    if page is not None:
+        return fill_page(
+            page, favorite=lambda: render_favorite(person_id), recommendations=lambda: render_recommendations(person_id)
         )
 
+    try:
+        person = load_person(person_id, roles_page)
+        if person is None:
+            person_req = get_jikan_request(f"/people/{person_id}/full")
+            save_person(person_req.get("data"))
+            person = load_person(person_id, roles_page)
+        info, roles, roles_pages = person
+
     except ApiError:
         flash("Something went wrong with the api request!")
         return render_template('errors/404.html'), 404
 
+    check_roles_page(roles_page, roles_pages)
+    return stream_page(
+        ("person", person_id, roles_page), "person.html",
+        dict(info=info, main_roles=roles["main"], sup_roles=roles["supporting"],
+             roles_page=roles_page, roles_pages=roles_pages),
+        favorite=lambda: render_favorite(person_id),
+        recommendations=lambda: render_recommendations(person_id)
+    )
+
 
 @app.route("/anime/<int:anime_id>")
 def anime_info(anime_id):
     """View information about an anime"""
-    try:
-        anime_req = get_jikan_request(f"/anime/{anime_id}/full")
-        info = get_info_from_anime_data(anime_req.get("data"))
+    roles_page = get_roles_page_arg()
+    page = get_cached_page(("anime", anime_id, roles_page))
+    if page is not None:
+        return fill_page(page)
 
-        characters_req = get_jikan_request(f"/anime/{anime_id}/characters")
-        main_characters = get_info_by_role(characters_req.get("data"), "character", "main")
-        sup_characters = get_info_by_role(characters_req.get("data"), "character", "supporting")
-        return render_template(
-            "anime.html", info=info, main_characters=main_characters, sup_characters=sup_characters
-        )
+    try:
+        anime = load_anime(anime_id, roles_page)
+        if anime is None:
+            anime_req, characters_req = get_jikan_requests(
+                f"/anime/{anime_id}/full", f"/anime/{anime_id}/characters"
+            )
+            save_anime(anime_req.get("data"), characters_req.get("data"))
+            anime = load_anime(anime_id, roles_page)
+        info, characters, roles_pages = anime
 
     except ApiError:
         flash("Something went wrong with the api request!")
         return render_template('errors/404.html'), 404
 
+    check_roles_page(roles_page, roles_pages)
+    return stream_page(
+        ("anime", anime_id, roles_page), "anime.html",
+        dict(info=info, main_characters=characters["main"], sup_characters=characters["supporting"],
+             roles_page=roles_page, roles_pages=roles_pages)
+    )
+
 @app.route("/character/<int:character_id>")
 def character_info(character_id):
     """View information about a character"""
-    try:
-        character_req = get_jikan_request(f"/characters/{character_id}/full")
-        character_info = get_info_from_character_data(character_req.get('data'))
-        main_character_anime = get_info_by_role(character_req.get('data').get('anime'), 'anime', 'main')
-        sup_character_anime = get_info_by_role(character_req.get('data').get('anime'), 'anime', 'supporting')
+    roles_page = get_roles_page_arg()
+    page = get_cached_page(("character", character_id, roles_page))
+    if page is not None:
+        return fill_page(page)
 
-        return render_template(
-            "character.html", 
-            character_info=character_info, main_character_anime=main_character_anime, sup_character_anime=sup_character_anime
-            )
+    try:
+        character = load_character(character_id, roles_page)
+        if character is None:
+            character_req = get_jikan_request(f"/characters/{character_id}/full")
+            save_character(character_req.get('data'))
+            character = load_character(character_id, roles_page)
+        character_info, anime, roles_pages = character
 
     except ApiError:
         flash("Something went wrong with the api request!")
         return render_template('errors/404.html'), 404
 
+    check_roles_page(roles_page, roles_pages)
+    return stream_page(
+        ("character", character_id, roles_page), "character.html",
+        dict(character_info=character_info, main_character_anime=anime["main"], sup_character_anime=anime["supporting"],
+             roles_page=roles_page, roles_pages=roles_pages)
+    )
+
 @app.route("/search/")
 def search():
-    """Handle Searching"""
+    """Handle Searching, from the local index when enough stored entities match"""
     try:
         type = request.args.get('type')
         query = request.args.get('q')
-        page = request.args.get('p')
+        page = max(1, request.args.get('p', 1, type=int))
+        if type in SEARCH_TYPES and get_search_query(query) is not None:
+            results, total = search_local(type, query, page)
+            if total >= SEARCH_MIN_RESULTS:
+                search_lookups.inc(type=type, source="local")
+                return render_template("search.html", results=results, pages=-(-total // SEARCH_PAGE_SIZE))
+
+        search_lookups.inc(type=type if type in SEARCH_TYPES else "other", source="jikan")
         search_req = get_jikan_request(f"/{type}/", {'q': query, 'page': page, 'sort': 'desc', 'order_by': 'favorites'})
         pages = search_req.get('pagination').get('last_visible_page')
         results = []
+        if type in SEARCH_TYPES:
+            save_search_results(type, search_req.get('data'))
 
         if type == 'anime':
             for anime in search_req.get('data'):
@@ -324,6 +1762,75 @@ def search():
         flash("Something went wrong with the api request!")
         return render_template('errors/404.html'), 404
 
+@app.route("/search/suggest")
+def search_suggest():
+    """Names/titles starting with ?q= of a ?type= (anime by default), the most favorited first"""
+    type = request.args.get('type', 'anime')
+    if type not in SUGGEST_TYPES:
+        return jsonify({'message': 'unknown type'}), 400
+    limit = max(0, request.args.get('limit', SUGGEST_LIMIT, type=int))
+
+    sync_suggestions(type)
+    _, _, path = SUGGEST_TYPES[type]
+    suggestions = suggest_indexes[type].search(request.args.get('q', ''), limit)
+    return jsonify({'suggestions': [
+        {'id': id, 'names': names, 'url': f"{path}{id}"}
+        for id, names in suggestions
+    ]})
+
+@app.route("/anime/filter")
+def filter_anime():
+    """The anime and characters every ?seiyuu= (1 to SEIYUU_FILTER_MAX of them) voiced in"""
+    person_ids = list(dict.fromkeys(request.args.getlist('seiyuu', type=int)))
+    if not person_ids or len(person_ids) > SEIYUU_FILTER_MAX:
+        abort(400)
+
+    try:
+        postings = get_seiyuu_postings(person_ids).values()
+    except ApiError:
+        return jsonify({
+            'error': 'Something went wrong with the api request!'
+    }), 502
+    anime_ids = intersect([anime_ids for anime_ids, _ in postings])
+    character_ids = intersect([character_ids for _, character_ids in postings])
+
+    anime = (db.session
+                .query(Anime.id, Anime.title, Anime.image_url)
+                .filter(Anime.id.in_(list(anime_ids)))
+                .order_by(Anime.favorites.desc().nullslast(), Anime.id)
+                .all())
+    characters = (db.session
+                    .query(Character.id, Character.name, Character.image_url)
+                    .filter(Character.id.in_(list(character_ids)))
+                    .order_by(Character.favorites.desc().nullslast(), Character.id)
+                    .all())
+    return jsonify({
+        'anime': [{'id': id, 'title': title, 'image_url': image_url} for id, title, image_url in anime],
+        'characters': [{'id': id, 'name': name, 'image_url': image_url} for id, name, image_url in characters],
+    })
+
+@app.route("/person/<int:person_id>/costars")
+def person_costars(person_id):
+    """Who a seiyuu shares the most anime with, among the stored roles"""
+    limit = min(max(0, request.args.get('limit', COSTARS_LIMIT, type=int)), COSTARS_LIMIT)
+    costars = costar_snapshot.get().top_costars(person_id, limit)
+    people = get_people_json([costar_id for costar_id, _ in costars])
+    return jsonify({'costars': [
+        {**people.get(costar_id, {'id': costar_id}), 'shared_anime': shared_anime}
+        for costar_id, shared_anime in costars
+    ]})
+
+@app.route("/person/<int:person_id>/path/<int:other_id>")
+def costar_path(person_id, other_id):
+    """The shortest chain of co-stars from one seiyuu to another, among the stored roles"""
+    path = costar_snapshot.get().path(person_id, other_id)
+    if path is None:
+        return jsonify({
+            'error': 'No path between them'
+    }), 404
+    people = get_people_json(path)
+    return jsonify({'path': [people.get(id, {'id': id}) for id in path]})
+
 #
 ### USER REGISTRATION/LOGIN/LOGOUT ROUTES
 #
@@ -412,18 +1919,14 @@ def show_user(user_id):
                 .limit(20)
                 .all())
     try:
-        favorites = []
-        for (id,) in favorites_query:
-            time.sleep(WAIT_TIME)
-            person_req = get_jikan_request(f"/people/{id}")
-            person_data = get_info_from_person_data(person_req.get("data"))
-            favorites.append(person_data)
-            
+        favorites = get_people_info([id for (id,) in favorites_query])
+
     except ApiError:
         flash("Something went wrong with the api request!")
         return redirect(url_for('root'))        
 
-    return render_template('users/user-information.html', user=user, favorites=favorites)
+    recommendations = get_stored_people(get_user_recommendations(user_id))
+    return render_template('users/user-information.html', user=user, favorites=favorites, recommendations=recommendations)
 
 @app.route("/users/edit/", methods=["GET", "POST"])
 def edit_user():
@@ -445,6 +1948,7 @@ def edit_user():
             user.bio = form.bio.data
 
             db.session.commit()
+            user_cache.delete(user.id)
 
             flash(f"Edited Profile", "success")
             return redirect(f"/users/{g.user.id}")
@@ -464,13 +1968,8 @@ def show_user_ranking(user_id):
                 .order_by(FavoriteSeiyuu.rank.asc())
                 .all())
     try:
-        favorites = []
-        for (id,) in favorites_query:
-            time.sleep(WAIT_TIME)
-            person_req = get_jikan_request(f"/people/{id}")
-            person_data = get_info_from_person_data(person_req.get("data"))
-            favorites.append(person_data)
-            
+        favorites = get_people_info([id for (id,) in favorites_query])
+
     except ApiError:
         flash("Something went wrong with the api request!")
         return redirect(url_for('root'))        
@@ -481,45 +1980,57 @@ def show_user_ranking(user_id):
 ### FAVORITING/RANKING EDITING ROUTES
 #
 
+def toggle_favorite(user_id, seiyuu_id):
+    """
+    Unfavorite a seiyuu if they're a favorite or add them below the last favorite, in one statement.
+    Returns the new favorite's rank or None if they were unfavorited
+    """
+    deleted = (db.delete(FavoriteSeiyuu)
+                .where(FavoriteSeiyuu.user_id==user_id)
+                .where(FavoriteSeiyuu.seiyuu_id==seiyuu_id)
+                .returning(FavoriteSeiyuu.seiyuu_id)
+                .cte("deleted"))
+    # the insert only happens if nothing was deleted
+    new_favorite = (db.select(
+                    db.literal(seiyuu_id),
+                    db.literal(user_id),
+                    db.func.coalesce(db.func.max(FavoriteSeiyuu.rank), 0) + RANK_GAP)
+                .where(FavoriteSeiyuu.user_id==user_id)
+                .having(~db.exists(db.select(deleted.c.seiyuu_id))))
+    stmt = (insert(FavoriteSeiyuu)
+                .from_select(['seiyuu_id', 'user_id', 'rank'], new_favorite)
+                .on_conflict_do_nothing(index_elements=['seiyuu_id', 'user_id'])
+                .returning(FavoriteSeiyuu.rank)
+                .add_cte(deleted))
+    return db.session.execute(stmt).scalar()
+
+def commit_rank_change(change, retries=RANK_RETRIES):
+    """
+    Run change() and commit it, starting over when a concurrent request took the rank it
+    picked (the unique (user_id, rank) constraint fails). Returns what change() returned
+    """
+    for attempt in range(retries + 1):
+        try:
+            result = change()
+            db.session.commit()
+            return result
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == retries:
+                raise
+            # so the requests that collided don't collide again
+            time.sleep(random.uniform(0, RANK_RETRY_BACKOFF * 2 ** attempt))
+
 @app.route("/favorite/seiyuu", methods=["POST"])
 def toggle_favorite_seiyuu():
     """Handle AJAX requests to toggle favorites """
     if g.user:
-        seiyuu_id = request.json['seiyuu_id']
-        check_favorite_query = (db.session
-                    .query(FavoriteSeiyuu)
-                    .filter(FavoriteSeiyuu.user_id==g.user.id)
-                    .filter(FavoriteSeiyuu.seiyuu_id==seiyuu_id)
-                    .first())
-        # delete favorite since it exists
-        if check_favorite_query:
-            # when removing a favorite we need to update the ranks of all the people below
-            lower_ranked_query = (db.session
-                        .query(FavoriteSeiyuu)
-                        .filter(FavoriteSeiyuu.user_id==g.user.id)
-                        .filter(FavoriteSeiyuu.rank > check_favorite_query.rank)
-                        .all())
-            if len(lower_ranked_query) > 0:
-                update_ranks = (db.session
-                            .query(FavoriteSeiyuu)
-                            .filter(FavoriteSeiyuu.user_id==g.user.id)
-                            .filter(FavoriteSeiyuu.rank > check_favorite_query.rank)
-                            .update({'rank': FavoriteSeiyuu.rank - 1}))
-            db.session.delete(check_favorite_query)
-            db.session.commit()
-
-        else:
-            lowest_rank = (db.session
-                    .query(FavoriteSeiyuu.rank)
-                    .filter(FavoriteSeiyuu.user_id==g.user.id)
-                    .order_by(FavoriteSeiyuu.rank.desc())
-                    .first())
-            if lowest_rank is None:
-                lowest_rank = 0
-            else:
-                lowest_rank = lowest_rank[0]
-            db.session.add(FavoriteSeiyuu(seiyuu_id=seiyuu_id, user_id=g.user.id, rank=lowest_rank+1))
-            db.session.commit()
+        try:
+            seiyuu_id = int(request.json['seiyuu_id'])
+        except (KeyError, TypeError, ValueError):
+            abort(400)
+        # ranks are sparse so the favorites below an unfavorited one don't have to move up
+        commit_rank_change(updating_similarities(g.user.id, lambda: toggle_favorite(g.user.id, seiyuu_id)))
         return jsonify({
             'message': 'success'
     })
@@ -530,15 +2041,137 @@ def toggle_favorite_seiyuu():
 
 @app.route("/rank/seiyuu", methods=["POST"])
 def edit_seiyuu_rank():
-    """Handle AJAX requests to edit rank """
+    """Handle AJAX requests to set the rank of every seiyuu in a {seiyuu_id: rank} map"""
     if g.user:
-        for seiyuu_id in request.json:
-            seiyuu_query = FavoriteSeiyuu.query.get_or_404((seiyuu_id, g.user.id))
-            seiyuu_query.rank = request.json[seiyuu_id]
+        try:
+            ranks = {int(seiyuu_id): int(rank) for seiyuu_id, rank in request.json.items()}
+        except (AttributeError, TypeError, ValueError):
+            abort(400)
+        if ranks:
+            def change():
+                # one UPDATE for the whole map instead of loading and saving each favorite
+                try:
+                    updated = (db.session
+                                .query(FavoriteSeiyuu)
+                                .filter(FavoriteSeiyuu.user_id==g.user.id)
+                                .filter(FavoriteSeiyuu.seiyuu_id.in_(ranks))
+                                .update(
+                                    {'rank': db.case(ranks, value=FavoriteSeiyuu.seiyuu_id)},
+                                    synchronize_session=False
+                                ))
+                except IntegrityError:
+                    # two favorites would have the same rank
+                    db.session.rollback()
+                    abort(400)
+                if updated != len(ranks):
+                    db.session.rollback()
+                    abort(404)
+
+            updating_similarities(g.user.id, change)()
         db.session.commit()
         return jsonify({
             'message': 'success'
     })
+    else:
+        return jsonify({
+            'error': 'Unauthorized User'
+    }), 401
+
+def get_neighbour_ranks(user_id, seiyuu_id, before=None, after=None):
+    """
+    The ranks a favorite has to go between to be right before `before` or right after `after`,
+    (lower, upper) with None for the end of the list. Returns None if either isn't a favorite
+    """
+    user_favorites = (FavoriteSeiyuu.user_id == user_id, FavoriteSeiyuu.seiyuu_id != seiyuu_id)
+    target_rank = (db.select(FavoriteSeiyuu.rank)
+                .filter(FavoriteSeiyuu.user_id==user_id)
+                .filter(FavoriteSeiyuu.seiyuu_id==(before if before is not None else after))
+                .scalar_subquery())
+    if before is not None:
+        neighbour_rank = (db.select(db.func.max(FavoriteSeiyuu.rank))
+                    .filter(*user_favorites)
+                    .filter(FavoriteSeiyuu.rank < target_rank)
+                    .scalar_subquery())
+    else:
+        neighbour_rank = (db.select(db.func.min(FavoriteSeiyuu.rank))
+                    .filter(*user_favorites)
+                    .filter(FavoriteSeiyuu.rank > target_rank)
+                    .scalar_subquery())
+    moved_rank = (db.select(FavoriteSeiyuu.rank)
+                .filter(FavoriteSeiyuu.user_id==user_id)
+                .filter(FavoriteSeiyuu.seiyuu_id==seiyuu_id)
+                .scalar_subquery())
+
+    target, neighbour, moved = db.session.execute(db.select(target_rank, neighbour_rank, moved_rank)).one()
+    if target is None or moved is None:
+        return None
+    return (neighbour, target) if before is not None else (target, neighbour)
+
+def rebalance_ranks(user_id):
+    """Space a user's favorites RANK_GAP apart again, keeping their order, in one statement"""
+    ordered = (db.select(
+                    FavoriteSeiyuu.seiyuu_id,
+                    db.func.row_number().over(order_by=(FavoriteSeiyuu.rank, FavoriteSeiyuu.seiyuu_id)).label("position"))
+                .filter(FavoriteSeiyuu.user_id==user_id)
+                .subquery())
+    db.session.execute(
+        db.update(FavoriteSeiyuu)
+        .where(FavoriteSeiyuu.user_id==user_id)
+        .where(FavoriteSeiyuu.seiyuu_id==ordered.c.seiyuu_id)
+        .values(rank=ordered.c.position * RANK_GAP)
+        .execution_options(synchronize_session=False)
+    )
+
+def get_move_rank(lower, upper):
+    """A rank between lower and upper (None for the ends of the list), or None if there's no room"""
+    if lower is None and upper is None:
+        return RANK_GAP
+    if lower is None:
+        return upper - RANK_GAP
+    if upper is None:
+        return lower + RANK_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+@app.route("/rank/seiyuu/move", methods=["POST"])
+def move_seiyuu_rank():
+    """
+    Handle AJAX requests to move one favorite right before or after another,
+    {'seiyuu_id': id, 'before': id} or {'seiyuu_id': id, 'after': id}.
+    Only the moved favorite's rank changes unless its neighbours have to be spread out
+    """
+    if g.user:
+        try:
+            seiyuu_id = int(request.json['seiyuu_id'])
+            before = int(request.json['before']) if request.json.get('before') is not None else None
+            after = int(request.json['after']) if request.json.get('after') is not None else None
+        except (KeyError, TypeError, ValueError):
+            abort(400)
+        if (before is None) == (after is None) or seiyuu_id in (before, after):
+            abort(400)
+
+        def move():
+            neighbours = get_neighbour_ranks(g.user.id, seiyuu_id, before, after)
+            if neighbours is None:
+                abort(404)
+            rank = get_move_rank(*neighbours)
+            if rank is None:
+                rebalance_ranks(g.user.id)
+                rank = get_move_rank(*get_neighbour_ranks(g.user.id, seiyuu_id, before, after))
+
+            (db.session
+                .query(FavoriteSeiyuu)
+                .filter(FavoriteSeiyuu.user_id==g.user.id)
+                .filter(FavoriteSeiyuu.seiyuu_id==seiyuu_id)
+                .update({'rank': rank}, synchronize_session=False))
+            return rank
+
+        rank = commit_rank_change(updating_similarities(g.user.id, move))
+        return jsonify({
+            'message': 'success',
+            'rank': rank
+    })
     else:
         return jsonify({
             'error': 'Unauthorized User'
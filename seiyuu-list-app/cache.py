@@ -0,0 +1,249 @@
+"""Two tier cache for jikanapi responses"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
+
+from models import db, JikanResponse
+
+MEMORY_CACHE_SIZE = 512
+
+# How long (in seconds) a response is kept, the first pattern matching the url wins
+CACHE_TTLS = [
+    (re.compile(r"^/seasons/now"), 60 * 60),
+    (re.compile(r"^/people/\d+"), 60 * 60 * 24 * 3),
+    (re.compile(r"^/characters/\d+"), 60 * 60 * 24 * 3),
+    (re.compile(r"^/anime/\d+"), 60 * 60 * 24),
+]
+DEFAULT_TTL = 60 * 15
+
+# longest (in seconds) to wait on another worker fetching the same response
+FLIGHT_TIMEOUT = 15
+
+# share of set() calls that also delete the expired rows of the shared tier
+PURGE_FRACTION = 1 / 100
+
+
+class FlightTimeout(Exception):
+    """Raised when the fetch of a response another thread is making takes longer than the wait allows"""
+    pass
+
+
+def get_ttl(url):
+    """Find how many seconds the response for a url should be cached for"""
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.match(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def make_key(url, params=None):
+    """
+    Build the cache key for a request.
+    Params are sorted and empty ones dropped (requests drops them too) so
+    the same request always gets the same key
+    """
+    if not params:
+        return url
+    query = sorted((key, str(value)) for key, value in params.items() if value is not None)
+    if not query:
+        return url
+    return f"{url}?{urlencode(query)}"
+
+
+def get_lock_id(key):
+    """A 64 bit postgres advisory lock id for a cache key"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class LRUCache:
+    """Thread safe in-process cache that evicts the least recently used entry"""
+
+    def __init__(self, maxsize=MEMORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get an unexpired value or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        """Store a value until the expires_at timestamp"""
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ResponseCache:
+    """
+    Cache jikanapi responses keyed on (url, params).
+    Responses are first looked up in this process's LRU, then in the
+    jikan_responses table so every gunicorn worker benefits from the others' requests.
+    Cached responses are shared, callers must not modify them.
+    """
+
+    def __init__(self, maxsize=MEMORY_CACHE_SIZE, purge_fraction=PURGE_FRACTION, flight_timeout=FLIGHT_TIMEOUT):
+        self.memory = LRUCache(maxsize)
+        self.flight_timeout = flight_timeout
+        self.purge_fraction = purge_fraction
+        self.lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "purged": 0}
+        # requests being fetched by this worker, key -> Future
+        self.flights = {}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def lookup(self, key):
+        """Look a key up in both tiers, returns (data, tier name) with data None on a miss"""
+        data = self.memory.get(key)
+        if data is not None:
+            return data, "memory_hits"
+
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(JikanResponse.data, JikanResponse.expires_at)
+                .where(JikanResponse.key == key)
+                .where(JikanResponse.expires_at > datetime.utcnow())
+            ).first()
+        if row is None:
+            return None, "misses"
+
+        remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+        self.memory.set(key, row.data, time.time() + remaining)
+        return row.data, "db_hits"
+
+    def get(self, url, params=None):
+        """Get the cached response for a request or None"""
+        data, tier = self.lookup(make_key(url, params))
+        self.count(tier)
+        return data
+
+    def get_or_fetch(self, url, params, fetch):
+        """
+        Get the cached response for a request, calling fetch() to get and cache it on a miss.
+        Only one thread per worker fetches a key at a time, the others wait on its result
+        (or exception), and workers take turns through a postgres advisory lock so the ones
+        that waited find the response in the shared tier.
+        Raises FlightTimeout if the thread fetching it takes longer than flight_timeout
+        """
+        key = make_key(url, params)
+        data, tier = self.lookup(key)
+        self.count(tier)
+        if data is not None:
+            return data
+
+        with self.lock:
+            flight = self.flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.flights[key] = Future()
+
+        if not is_leader:
+            self.count("coalesced")
+            try:
+                return flight.result(timeout=self.flight_timeout)
+            except FutureTimeoutError as e:
+                raise FlightTimeout(f"Gave up waiting on {key} after {self.flight_timeout}s") from e
+
+        try:
+            data = self.fetch_once(key, url, params, fetch)
+            flight.set_result(data)
+            return data
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+    def fetch_once(self, key, url, params, fetch):
+        """Fetch a key while holding its advisory lock, unless another worker cached it while we waited"""
+        with db.engine.connect() as conn, conn.begin():
+            conn.execute(text(f"SET LOCAL lock_timeout = '{self.flight_timeout}s'"))
+            try:
+                with conn.begin_nested():
+                    conn.execute(db.select(db.func.pg_advisory_xact_lock(get_lock_id(key))))
+            except OperationalError:
+                # the other worker is taking too long, fetch it ourselves
+                pass
+
+            data, tier = self.lookup(key)
+            if data is not None:
+                self.count("coalesced")
+                return data
+
+            data = fetch()
+            self.set(url, params, data)
+            return data
+
+    def set(self, url, params, data):
+        """Store a response in both tiers"""
+        key = make_key(url, params)
+        ttl = get_ttl(url)
+        self.memory.set(key, data, time.time() + ttl)
+
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        stmt = insert(JikanResponse).values(key=key, data=data, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[JikanResponse.key],
+            set_={"data": stmt.excluded.data, "expires_at": stmt.excluded.expires_at},
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+
+        if random.random() < self.purge_fraction:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """Delete the expired responses from the shared tier, returns how many were deleted"""
+        with db.engine.begin() as conn:
+            deleted = conn.execute(
+                db.delete(JikanResponse).where(JikanResponse.expires_at <= datetime.utcnow())
+            ).rowcount
+        with self.lock:
+            self.counts["purged"] += deleted
+        return deleted
+
+    def stats(self):
+        """Hit/miss counts and the overall hit ratio"""
+        with self.lock:
+            stats = dict(self.counts)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_ratio"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        stats["memory_size"] = len(self.memory)
+        return stats
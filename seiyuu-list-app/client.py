@@ -0,0 +1,109 @@
+"""Pooled http client for jikanapi"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import RateLimitTimeout, get_retry_after
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when jikanapi couldn't be reached before the deadline or retries ran out"""
+    pass
+
+
+class JikanClient:
+    """
+    Keep-alive session for jikanapi shared by every thread of a worker.
+    Every attempt takes a token from `limiter`. Connection errors, timeouts, 429s and 5xxs are
+    retried with jittered exponential backoff (or the Retry-After the api asks for)
+    until `retries` or the caller's deadline runs out.
+    With `stream` the body is left unread for the caller, who has to read or close it
+    """
+
+    def __init__(self, base_url, limiter, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff=.5, max_backoff=8, stream=False):
+        self.base_url = base_url
+        self.stream = stream
+        self.limiter = limiter
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "retries": 0, "failures": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def get_backoff(self, attempt):
+        """Full jitter: a random wait up to the exponential backoff for this attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, params=None, timeout=10):
+        """
+        Request a jikanapi url and return the response, which may still be an error (e.g. a 404).
+        Raises UpstreamError if no usable response came back within timeout seconds
+        """
+        deadline = time.time() + timeout
+        attempt = 0
+        while True:
+            try:
+                self.limiter.acquire(timeout=deadline - time.time())
+            except RateLimitTimeout:
+                self.count("failures")
+                raise UpstreamError(f"Rate limited until the deadline for {url}")
+
+            self.count("requests")
+            try:
+                response = self.session.get(f"{self.base_url}{url}", params=params, timeout=self.timeout, stream=self.stream)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                # give the connection back to the pool
+                response.close()
+                error = f"{response.status_code} from {url}"
+                if response.status_code == 429:
+                    # every worker waits out the Retry-After
+                    self.limiter.pause(get_retry_after(response.headers))
+                    wait = 0
+                else:
+                    wait = self.get_backoff(attempt)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__} for {url}"
+                wait = self.get_backoff(attempt)
+
+            attempt += 1
+            if attempt > self.retries or time.time() + wait > deadline:
+                self.count("failures")
+                raise UpstreamError(error)
+            self.count("retries")
+            time.sleep(wait)
+
+    def stats(self):
+        """Request/retry/failure counts along with how the connection pool is being used"""
+        with self.lock:
+            stats = dict(self.counts)
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        pool_requests = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pool_requests += pool.num_requests
+        stats["connections_opened"] = connections
+        stats["connections_reused"] = max(0, pool_requests - connections)
+        stats["pool_size"] = self.adapter._pool_maxsize
+        return stats
@@ -0,0 +1,115 @@
+"""
+A graph of seiyuu who voiced in the same anime, in compressed sparse row (CSR) form.
+
+Every seiyuu is a row number. Their co-stars are neighbors[offsets[row]:offsets[row + 1]],
+most shared anime first, with the counts in the same slice of weights. Four flat
+arrays hold the whole graph, so tens of thousands of seiyuu and millions of co-star
+pairs fit in tens of MiB instead of a dict of dicts.
+
+Paths are found by breadth-first search from both ends at once, always growing the
+smaller frontier. Each side only has to reach halfway, which visits a small part of
+the graph compared to searching from one end.
+
+    python -m perf.bench_costar    # build and query times on a synthetic graph
+"""
+
+import bisect
+from array import array
+
+
+def order_edges(pairs):
+    """(person_id, person_id, shared anime) with each pair given once, as from_edges takes them"""
+    edges = [*pairs, *((b, a, count) for a, b, count in pairs)]
+    edges.sort(key=lambda edge: (edge[0], -edge[2], edge[1]))
+    return edges
+
+
+class CostarGraph:
+    """Seiyuu ids and who each co-starred with, how many anime they share"""
+
+    def __init__(self, ids, offsets, neighbors, weights):
+        # sorted person ids, a person's row is their index here
+        self.ids = ids
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        Build the graph from (person_id, co-star id, shared anime) with each pair given both ways
+        round, ordered by person id then by shared anime, most first (get_costar_edges sorts them in SQL)
+        """
+        ids, offsets, neighbors, weights = array("q"), array("q"), array("q"), array("q")
+        for person_id, costar_id, count in edges:
+            if not ids or ids[-1] != person_id:
+                ids.append(person_id)
+                offsets.append(len(neighbors))
+            neighbors.append(costar_id)
+            weights.append(count)
+        offsets.append(len(neighbors))
+
+        # neighbors hold person ids until every row is known
+        rows = {id: row for row, id in enumerate(ids)}
+        return cls(ids, offsets, array("q", map(rows.__getitem__, neighbors)), weights)
+
+    def row(self, person_id):
+        """The row of a person, None if they have no co-stars"""
+        row = bisect.bisect_left(self.ids, person_id)
+        if row < len(self.ids) and self.ids[row] == person_id:
+            return row
+        return None
+
+    def top_costars(self, person_id, limit):
+        """[(person_id, shared anime), ...] of who a person shares the most anime with"""
+        row = self.row(person_id)
+        if row is None:
+            return []
+        start = self.offsets[row]
+        end = min(self.offsets[row + 1], start + limit)
+        return [(self.ids[neighbor], weight)
+                for neighbor, weight in zip(self.neighbors[start:end], self.weights[start:end])]
+
+    def path(self, from_id, to_id):
+        """The person ids on a shortest co-star path from one person to another, None if there's none"""
+        source, target = self.row(from_id), self.row(to_id)
+        if source is None or target is None:
+            return [from_id] if from_id == to_id else None
+        if source == target:
+            return [from_id]
+
+        # row -> the row it was reached from, for each side
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other_seen = parents[side], parents[1 - side]
+            next_frontier = []
+            meeting = None
+            for row in frontiers[side]:
+                for neighbor in self.neighbors[self.offsets[row]:self.offsets[row + 1]]:
+                    if neighbor in seen:
+                        continue
+                    seen[neighbor] = row
+                    if neighbor in other_seen:
+                        meeting = neighbor
+                        break
+                    next_frontier.append(neighbor)
+                if meeting is not None:
+                    break
+            if meeting is not None:
+                return [self.ids[row] for row in self.walk(parents[0], meeting)[::-1] + self.walk(parents[1], meeting)[1:]]
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        return None
+
+    @staticmethod
+    def walk(parents, row):
+        """The rows from row back to the start of its search"""
+        rows = []
+        while row is not None:
+            rows.append(row)
+            row = parents[row]
+        return rows
+
+    def __len__(self):
+        return len(self.ids)
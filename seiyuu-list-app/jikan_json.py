@@ -0,0 +1,121 @@
+"""
+Decode jikanapi responses keeping only the fields the app reads.
+
+A /people/{id}/full for a prolific seiyuu is megabytes of JSON, most of it urls, webp
+images and counts nothing here looks at. Dropping those keys while decoding roughly
+halves what gets built, and what the response cache then holds in memory and postgres.
+
+With ijson installed the body can also be decoded as it's read off the socket, so the
+whole body is never held at once. Without it "stream" falls back to "pruned".
+
+    python -m perf.bench_decode    # time and memory of each mode
+"""
+
+import json
+
+from requests import RequestException
+from urllib3.exceptions import HTTPError
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+MODES = ("full", "pruned", "stream")
+
+# every key read from a jikanapi response, at any depth
+KEPT_FIELDS = frozenset([
+    "data", "pagination", "last_visible_page", "error",
+    "mal_id", "name", "title", "images", "jpg", "image_url",
+    "synopsis", "rating", "genres", "type", "role", "about",
+    "family_name", "given_name", "birthday", "website_url", "favorites",
+    "voices", "anime", "character", "voice_actors", "person", "language",
+])
+# so every decoded dict shares one string per key, like json's own decoder does
+KEY_STRINGS = {key: key for key in KEPT_FIELDS}
+
+
+class DecodeError(Exception):
+    """Raised when a response's body couldn't be read or isn't json"""
+    pass
+
+
+def prune(pairs):
+    return {key: value for key, value in pairs if key in KEPT_FIELDS}
+
+
+def loads(body):
+    """Decode a whole body (str or bytes), dropping every key not in KEPT_FIELDS"""
+    return json.loads(body, object_pairs_hook=prune)
+
+
+def skip_value(events):
+    """Consume the events of the value that's next"""
+    depth = 0
+    for event, _ in events:
+        if event == "start_map" or event == "start_array":
+            depth += 1
+        elif event == "end_map" or event == "end_array":
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def build(events):
+    """The pruned value out of ijson basic_parse events, values under dropped keys are never built"""
+    events = iter(events)
+    root = None
+    # open containers and, for maps, the key the next value goes under
+    containers = []
+    keys = []
+    for event, value in events:
+        if event == "map_key":
+            key = KEY_STRINGS.get(value)
+            if key is None:
+                skip_value(events)
+            else:
+                keys.append(key)
+            continue
+
+        if event == "end_map" or event == "end_array":
+            containers.pop()
+            continue
+        if event == "start_map":
+            value = {}
+        elif event == "start_array":
+            value = []
+
+        if not containers:
+            root = value
+        elif type(containers[-1]) is list:
+            containers[-1].append(value)
+        else:
+            containers[-1][keys.pop()] = value
+
+        if event == "start_map" or event == "start_array":
+            containers.append(value)
+    return root
+
+
+def load(file):
+    """Decode a file-like body as it's read, dropping every key not in KEPT_FIELDS. Needs ijson"""
+    return build(ijson.basic_parse(file, use_float=True))
+
+
+def decode_response(response, mode="pruned"):
+    """
+    A requests response's json decoded by mode, 'full' (everything), 'pruned' or 'stream'.
+    For 'stream' the response has to have been requested with stream=True.
+    Raises DecodeError if the body couldn't be read (e.g. a timeout while streaming it) or isn't json
+    """
+    errors = (ValueError, RequestException, HTTPError) + ((ijson.JSONError,) if ijson else ())
+    try:
+        if mode == "stream" and ijson is not None:
+            with response:
+                response.raw.decode_content = True
+                return load(response.raw)
+        if mode == "full":
+            return response.json()
+        return loads(response.content)
+    except errors as e:
+        raise DecodeError(f"Couldn't decode {response.url}: {e}") from e
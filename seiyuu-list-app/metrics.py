@@ -0,0 +1,307 @@
+"""Request metrics in the prometheus text format, shared by every gunicorn worker through files"""
+
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# seconds
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# the summed values of every worker that exited, kept so totals never go down
+ARCHIVE_NAME = "archived.json"
+
+
+def get_endpoint_template(url):
+    """Replace the ids in a jikanapi url so requests for different anime/people are grouped"""
+    return re.sub(r"/\d+", "/{id}", url)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with a value per set of labels"""
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def dump(self):
+        """The values as a json friendly list of [label values, value]"""
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Set the total, for counts that are kept somewhere else (e.g. the jikan cache's)"""
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, plus their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            # [count per bucket..., sum]
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-1] += value
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            yield f"{self.name}_bucket", key + (("le", format_value(bound)),), cumulative
+        yield f"{self.name}_sum", key, value[-1]
+        yield f"{self.name}_count", key, cumulative
+
+
+class Registry:
+    """
+    Every metric of one worker.
+    Each worker writes its values to its own file in `path` and the totals are the sum
+    over every live worker's file, so any worker can answer a scrape for all of them.
+    The files of workers that exited are folded into one archive file that counts towards the totals too
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.metrics = {}
+        # called before dumping, to copy in counts that are kept elsewhere
+        self.collectors = []
+        self.flushed_at = 0
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, function):
+        self.collectors.append(function)
+        return function
+
+    def get_file_name(self, pid=None):
+        return os.path.join(self.path, f"{pid or os.getpid()}.json")
+
+    def flush(self, interval=0):
+        """Write this worker's values, unless they were written less than `interval` seconds ago"""
+        with self.lock:
+            if time.time() - self.flushed_at < interval:
+                return
+            self.flushed_at = time.time()
+        for collect in self.collectors:
+            collect()
+        data = {name: metric.dump() for name, metric in self.metrics.items()}
+
+        os.makedirs(self.path, exist_ok=True)
+        self.write_dump(self.get_file_name(), data)
+
+    @staticmethod
+    def write_dump(file_name, data):
+        temp_name = f"{file_name}.{threading.get_ident()}.tmp"
+        with open(temp_name, "w") as file:
+            json.dump(data, file)
+        os.replace(temp_name, file_name)
+
+    @staticmethod
+    def read_dump(file_name):
+        """A dumped file's values, None if it's gone or only partly written"""
+        try:
+            with open(file_name) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_all(self):
+        """Every live worker's dumped values and the archive's, files left by workers that exited are archived"""
+        dumps = []
+        exited = []
+        for file_name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            pid = file_name[:-len(".json")]
+            if not file_name.endswith(".json") or not pid.isdigit():
+                continue
+            if not is_alive(int(pid)):
+                exited.append(os.path.join(self.path, file_name))
+                continue
+            dump = self.read_dump(os.path.join(self.path, file_name))
+            if dump is not None:
+                dumps.append(dump)
+        if exited:
+            self.archive(exited)
+        archived = self.read_dump(os.path.join(self.path, ARCHIVE_NAME))
+        if archived is not None:
+            dumps.append(archived)
+        return dumps
+
+    def archive(self, file_names):
+        """Add the values in files left by workers that exited to the archive, then remove the files"""
+        with self.lock, open(os.path.join(self.path, f"{ARCHIVE_NAME}.lock"), "w") as lock_file:
+            # one worker at a time, so no file is added twice
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            archive_name = os.path.join(self.path, ARCHIVE_NAME)
+            archived = self.read_dump(archive_name) or {}
+            totals = {name: {tuple(key): value for key, value in values} for name, values in archived.items()}
+            for file_name in file_names:
+                dump = self.read_dump(file_name)
+                if dump is not None:
+                    self.merge_dump(totals, dump)
+            self.write_dump(archive_name, {
+                name: [[list(key), value] for key, value in values.items()]
+                for name, values in totals.items()
+            })
+            for file_name in file_names:
+                try:
+                    os.remove(file_name)
+                except FileNotFoundError:
+                    pass
+
+    def merge_dump(self, totals, dump):
+        """Add a dump's values of the metrics this registry has into totals, {metric name: {label values: value}}"""
+        for name, values in dump.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            entries = totals.setdefault(name, {})
+            for key, value in values:
+                key = tuple(key)
+                entries[key] = metric.merge(entries.get(key), value)
+
+    def aggregate(self):
+        """{metric name: {label values: value summed over every worker}}"""
+        totals = {name: {} for name in self.metrics}
+        for dump in self.read_all():
+            self.merge_dump(totals, dump)
+        return totals
+
+    def render(self, totals=None):
+        """Every metric in the prometheus text format"""
+        totals = self.aggregate() if totals is None else totals
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key, value in sorted(totals[name].items()):
+                labels = tuple(zip(metric.labelnames, key))
+                for sample_name, sample_labels, sample_value in metric.samples(labels, value):
+                    lines.append(f"{sample_name}{format_labels(sample_labels)} {format_value(sample_value)}")
+        return "\n".join(lines) + "\n"
+
+
+def render_gauge(name, help, value):
+    """A single unlabelled gauge in the prometheus text format"""
+    return f"# HELP {name} {help}\n# TYPE {name} gauge\n{name} {format_value(value)}\n"
+
+
+def is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RequestStats:
+    """What one request (or background job) spent its time on"""
+
+    def __init__(self, route):
+        self.route = route
+        self.sql_queries = 0
+        self.sql_seconds = 0
+        self.upstream_requests = 0
+        self.lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self.lock:
+            self.sql_queries += 1
+            self.sql_seconds += seconds
+
+    def add_upstream_request(self):
+        with self.lock:
+            self.upstream_requests += 1
+
+
+current_stats = ContextVar("current_stats", default=None)
+
+
+@contextmanager
+def tracking(stats):
+    """Count what's done in this block towards `stats`, pass the same stats to threads doing work for it"""
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
@@ -1,5 +1,6 @@
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 bcrypt = Bcrypt()
 db = SQLAlchemy()
@@ -82,6 +83,11 @@ class FavoriteSeiyuu(db.Model):
     """User's favorited seiyuu (voice actor)"""
 
     __tablename__ = 'liked_seiyuu'
+    # also the index used to find a user's favorites in rank order. It's deferrable so
+    # rebalancing can pass through duplicates within one statement
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'rank', deferrable=True, initially='IMMEDIATE'),
+    )
 
     seiyuu_id = db.Column(
         db.Integer,
@@ -99,6 +105,288 @@ class FavoriteSeiyuu(db.Model):
     def __repr__(self):
         return f"<FavoriteSeiyuu user {self.user_id}, seiyuu {self.seiyuu_id}, rank {self.rank}>"
 
+class SeiyuuSimilarity(db.Model):
+    """
+    How alike two seiyuu are to the users who favorited both, one row each way round.
+    A sparse matrix kept up to date as favorites and ranks change
+    """
+
+    __tablename__ = 'seiyuu_similarities'
+    # a seiyuu's most similar first, without reading the rest of their row
+    __table_args__ = (
+        db.Index('seiyuu_similarities_score_idx', 'seiyuu_id', db.text('score DESC')),
+    )
+
+    seiyuu_id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    other_id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    # how many users favorited both, 0 once the last of them stops
+    co_favorites = db.Column(
+        db.Integer,
+        nullable=False
+    )
+    # the sum over those users of the product of both seiyuu's rank weights
+    score = db.Column(
+        db.Float,
+        nullable=False
+    )
+
+class Anime(db.Model):
+    """An anime from jikanapi"""
+
+    __tablename__ = 'anime'
+    __table_args__ = (
+        db.Index('anime_search_idx', 'search_vector', postgresql_using='gin'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=False
+    )
+    title = db.Column(
+        db.Text
+    )
+    image_url = db.Column(
+        db.Text
+    )
+    synopsis = db.Column(
+        db.Text
+    )
+    rating = db.Column(
+        db.Text
+    )
+    type = db.Column(
+        db.Text
+    )
+    genres = db.Column(
+        db.ARRAY(db.Text)
+    )
+    # how many MAL users favorited it, searches are ranked by this
+    favorites = db.Column(
+        db.Integer
+    )
+    search_vector = db.Column(
+        TSVECTOR,
+        db.Computed("to_tsvector('simple', coalesce(title, ''))", persisted=True)
+    )
+    # when the title/image were last stored
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+    # when the full information and characters were last stored
+    full_updated_at = db.Column(
+        db.DateTime
+    )
+    # when the synopsis was last stored, null while it's only been stored nested in another response
+    described_at = db.Column(
+        db.DateTime
+    )
+    def __repr__(self):
+        return f"<Anime #{self.id}: {self.title}>"
+
+class Character(db.Model):
+    """A character from jikanapi"""
+
+    __tablename__ = 'characters'
+    __table_args__ = (
+        db.Index('characters_search_idx', 'search_vector', postgresql_using='gin'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=False
+    )
+    name = db.Column(
+        db.Text
+    )
+    image_url = db.Column(
+        db.Text
+    )
+    about = db.Column(
+        db.Text
+    )
+    favorites = db.Column(
+        db.Integer
+    )
+    search_vector = db.Column(
+        TSVECTOR,
+        db.Computed("to_tsvector('simple', coalesce(name, ''))", persisted=True)
+    )
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+    # when the full information, voice actors and anime were last stored
+    full_updated_at = db.Column(
+        db.DateTime
+    )
+    # when the about was last stored, null while it's only been stored nested in another response
+    described_at = db.Column(
+        db.DateTime
+    )
+    def __repr__(self):
+        return f"<Character #{self.id}: {self.name}>"
+
+class Person(db.Model):
+    """A person (usually a seiyuu) from jikanapi"""
+
+    __tablename__ = 'people'
+    __table_args__ = (
+        db.Index('people_search_idx', 'search_vector', postgresql_using='gin'),
+    )
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=False
+    )
+    name = db.Column(
+        db.Text
+    )
+    jp_name = db.Column(
+        db.Text
+    )
+    image_url = db.Column(
+        db.Text
+    )
+    about = db.Column(
+        db.Text
+    )
+    birthday = db.Column(
+        db.Text
+    )
+    website_url = db.Column(
+        db.Text
+    )
+    favorites = db.Column(
+        db.Integer
+    )
+    # the romanized and japanese names
+    search_vector = db.Column(
+        TSVECTOR,
+        db.Computed("to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(jp_name, ''))", persisted=True)
+    )
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+    # when the full information and voice roles were last stored
+    full_updated_at = db.Column(
+        db.DateTime
+    )
+    # when the about was last stored, null while it's only been stored nested in another response
+    described_at = db.Column(
+        db.DateTime
+    )
+    def __repr__(self):
+        return f"<Person #{self.id}: {self.name}>"
+
+class AnimeRole(db.Model):
+    """A character's role ('Main' or 'Supporting') in an anime"""
+
+    __tablename__ = 'anime_roles'
+
+    anime_id = db.Column(
+        db.Integer,
+        db.ForeignKey('anime.id', ondelete='cascade'),
+        primary_key=True
+    )
+    character_id = db.Column(
+        db.Integer,
+        db.ForeignKey('characters.id', ondelete='cascade'),
+        primary_key=True,
+        index=True
+    )
+    role = db.Column(
+        db.Text
+    )
+    # order of the character in the anime's character list
+    position = db.Column(
+        db.Integer
+    )
+    def __repr__(self):
+        return f"<AnimeRole anime {self.anime_id}, character {self.character_id}, {self.role}>"
+
+class VoiceRole(db.Model):
+    """A person voicing a character in an anime"""
+
+    __tablename__ = 'voice_roles'
+
+    anime_id = db.Column(
+        db.Integer,
+        db.ForeignKey('anime.id', ondelete='cascade'),
+        primary_key=True
+    )
+    character_id = db.Column(
+        db.Integer,
+        db.ForeignKey('characters.id', ondelete='cascade'),
+        primary_key=True,
+        index=True
+    )
+    person_id = db.Column(
+        db.Integer,
+        db.ForeignKey('people.id', ondelete='cascade'),
+        primary_key=True,
+        index=True
+    )
+    # unknown when the role was stored from the person's side
+    language = db.Column(
+        db.Text
+    )
+    def __repr__(self):
+        return f"<VoiceRole anime {self.anime_id}, character {self.character_id}, person {self.person_id}, {self.language}>"
+
+class CharacterVoice(db.Model):
+    """A person voicing a character, as listed on the character's page which doesn't say in which anime"""
+
+    __tablename__ = 'character_voices'
+
+    character_id = db.Column(
+        db.Integer,
+        db.ForeignKey('characters.id', ondelete='cascade'),
+        primary_key=True
+    )
+    person_id = db.Column(
+        db.Integer,
+        db.ForeignKey('people.id', ondelete='cascade'),
+        primary_key=True,
+        index=True
+    )
+    language = db.Column(
+        db.Text
+    )
+    def __repr__(self):
+        return f"<CharacterVoice character {self.character_id}, person {self.person_id}, {self.language}>"
+
+class JikanResponse(db.Model):
+    """A cached response from jikanapi, shared by every worker"""
+
+    __tablename__ = 'jikan_responses'
+
+    key = db.Column(
+        db.Text,
+        primary_key=True
+    )
+    data = db.Column(
+        db.JSON,
+        nullable=False
+    )
+    expires_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        index=True
+    )
+    def __repr__(self):
+        return f"<JikanResponse {self.key}, expires {self.expires_at}>"
+
 def connect_db(app):
     """Connect this database to provided Flask app.
     You should call this in your Flask app.
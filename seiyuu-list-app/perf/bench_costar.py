@@ -0,0 +1,87 @@
+"""
+Time building the co-star graph in costar.py and querying it, on synthetic casts.
+
+Each anime gets a cast of 8 to 30 seiyuu, picked with a skew so that some seiyuu voice
+in far more anime than others, like real casts. Reported per graph size:
+  pairs          co-star pairs (edges)
+  MiB            memory held by the graph's arrays
+  build s        time to build the graph from the pairs, already sorted the way the
+                 app's SQL sorts them
+  top us         time to list someone's top 20 co-stars
+  path p50/p99   time for a shortest path between two random seiyuu, in ms
+
+    python -m perf.bench_costar
+    python -m perf.bench_costar --people 50000 --anime 20000
+"""
+
+import argparse
+import itertools
+import random
+import time
+from collections import Counter
+
+from costar import CostarGraph, order_edges
+
+SIZES = [(5000, 2000), (20000, 8000), (50000, 20000)]
+
+
+def make_edges(people, anime):
+    rng = random.Random(people)
+    # seiyuu with a lower id are cast more often
+    weights = [1 / (id + 10) for id in range(people)]
+    pairs = Counter()
+    for _ in range(anime):
+        cast = set(rng.choices(range(people), weights, k=rng.randint(8, 30)))
+        pairs.update(itertools.combinations(sorted(cast), 2))
+    return order_edges([(a, b, count) for (a, b), count in pairs.items()])
+
+
+def percentile(times, fraction):
+    return sorted(times)[min(len(times) - 1, int(len(times) * fraction))]
+
+
+def run(sizes, queries):
+    results = {}
+    for people, anime in sizes:
+        edges = make_edges(people, anime)
+        start = time.perf_counter()
+        graph = CostarGraph.from_edges(edges)
+        build = time.perf_counter() - start
+        del edges
+
+        rng = random.Random(0)
+        top, paths = [], []
+        for _ in range(queries):
+            start = time.perf_counter()
+            graph.top_costars(rng.choice(graph.ids), 20)
+            top.append(time.perf_counter() - start)
+
+            from_id, to_id = rng.choice(graph.ids), rng.choice(graph.ids)
+            start = time.perf_counter()
+            graph.path(from_id, to_id)
+            paths.append(time.perf_counter() - start)
+
+        arrays = (graph.ids, graph.offsets, graph.neighbors, graph.weights)
+        results[f"{people}/{anime}"] = {
+            "pairs": len(graph.neighbors) // 2,
+            "mib": sum(len(values) * values.itemsize for values in arrays) / 2 ** 20,
+            "build_s": build,
+            "top_us": sum(top) / len(top) * 1e6,
+            "path_p50_ms": percentile(paths, .5) * 1000,
+            "path_p99_ms": percentile(paths, .99) * 1000,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--people", type=int, help="seiyuu in the graph, with --anime")
+    parser.add_argument("--anime", type=int, help="anime cast, with --people")
+    parser.add_argument("--queries", type=int, default=500, help="queries timed per graph")
+    args = parser.parse_args()
+    sizes = [(args.people, args.anime)] if args.people and args.anime else SIZES
+
+    print(f"{'people/anime':<14}{'pairs':>10}{'MiB':>7}{'build s':>9}{'top us':>8}{'path p50':>10}{'path p99':>10}")
+    for case, r in run(sizes, args.queries).items():
+        print(f"{case:<14}{r['pairs']:>10}{r['mib']:>7.1f}{r['build_s']:>9.2f}{r['top_us']:>8.1f}"
+              f"{r['path_p50_ms']:>10.2f}{r['path_p99_ms']:>10.2f}")
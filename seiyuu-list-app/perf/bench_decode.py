@@ -0,0 +1,103 @@
+"""
+Benchmark decoding /people/{id}/full bodies with each mode in jikan_json.
+
+The body arrives in 64 KiB chunks the way it comes off the socket. "full" and "pruned"
+join the chunks into one body before decoding, like requests' response.content, while
+"stream" reads them one at a time. Reported per mode:
+  decode ms  time to turn the chunks into the response the app uses
+  peak MiB   most memory allocated at once while doing it, the body included
+  kept MiB   memory still held by the decoded response (what the cache keeps)
+  dump ms    time to serialize it again for the postgres cache tier
+
+    python -m perf.bench_decode
+    python -m perf.bench_decode --sizes 10000 --modes pruned stream
+"""
+
+import argparse
+import io
+import json
+import timeit
+import tracemalloc
+
+from perf import synthetic
+
+from jikan_json import MODES, ijson, load, loads
+
+SIZES = [10, 1000, 10000]
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkReader(io.RawIOBase):
+    """A file reading from a list of chunks without joining them"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            self.pending = next(self.chunks, b"")
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def decode(mode, chunks):
+    if mode == "stream":
+        return load(io.BufferedReader(ChunkReader(chunks), CHUNK_SIZE))
+    body = b"".join(chunks)
+    return json.loads(body) if mode == "full" else loads(body)
+
+
+def measure_memory(mode, chunks):
+    """(peak, kept) bytes"""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        data = decode(mode, chunks)
+        end, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del data
+    return peak - start, end - start
+
+
+def best_time(function, repeat):
+    number, _ = timeit.Timer(function).autorange()
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def run(sizes, modes, repeat=3):
+    results = {}
+    for size in sizes:
+        body = json.dumps({"data": synthetic.person(1, roles=size)}).encode()
+        chunks = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+        for mode in modes:
+            peak, kept = measure_memory(mode, chunks)
+            data = decode(mode, chunks)
+            results[f"{mode}/{size}"] = {
+                "body_mib": len(body) / 2 ** 20,
+                "decode_ms": best_time(lambda: decode(mode, chunks), repeat) * 1000,
+                "peak_mib": peak / 2 ** 20,
+                "kept_mib": kept / 2 ** 20,
+                "dump_ms": best_time(lambda: json.dumps(data), repeat) * 1000,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="roles per payload")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=[mode for mode in MODES if ijson or mode != "stream"])
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per case, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'case':<16}{'body MiB':>10}{'decode ms':>11}{'peak MiB':>10}{'kept MiB':>10}{'dump ms':>9}")
+    for key, r in run(args.sizes, args.modes, args.repeat).items():
+        print(f"{key:<16}{r['body_mib']:>10.2f}{r['decode_ms']:>11.2f}{r['peak_mib']:>10.2f}"
+              f"{r['kept_mib']:>10.2f}{r['dump_ms']:>9.2f}")
@@ -0,0 +1,180 @@
+"""
+Microbenchmarks for the jikanapi parsers.
+
+Runs each parser the way a page does on synthetic payloads with 10, 1k and 10k roles
+and measures the time per call and the memory allocated (tracemalloc) while it runs.
+Results are compared against perf/baselines/parsers.json, anything slower or
+allocating more than the tolerance is reported as a regression (exit status 1).
+
+    python -m perf.bench_parsers                  # compare against the baseline
+    python -m perf.bench_parsers --save           # record a new baseline
+    python -m perf.bench_parsers --sizes 10 1000 --only person_roles
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from perf import synthetic
+
+# the app reads its settings at import, none of them matter for parsing
+from app import get_info_by_role, get_info_from_character_data, get_info_from_person_data, partition_by_role
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines", "parsers.json")
+SIZES = [10, 1000, 10000]
+# how much slower (time) or bigger (memory) than the baseline counts as a regression
+TIME_TOLERANCE = .25
+MEMORY_TOLERANCE = .10
+# ignore memory changes smaller than this (KiB), tracemalloc's own bookkeeping moves a little
+MEMORY_SLACK = 4
+# roughly how long each timing run should take, in seconds
+TARGET_TIME = .2
+
+
+def parse_person_roles(person_data):
+    """The person page, every role parsed once and grouped by role"""
+    return partition_by_role(get_info_by_role(person_data.get("voices"), "character"))
+
+
+def parse_person_roles_all(person_data):
+    return get_info_by_role(person_data.get("voices"), "character")
+
+
+def parse_anime_characters(characters_data):
+    """The anime page, every character parsed once and grouped by role"""
+    return partition_by_role(get_info_by_role(characters_data, "character"))
+
+
+def parse_character_anime(character_data):
+    """The character page, the character and every anime they're in"""
+    return (
+        get_info_from_character_data(character_data),
+        get_info_by_role(character_data.get("anime"), "anime"),
+    )
+
+
+def parse_person(person_data):
+    return get_info_from_person_data(person_data)
+
+
+# name -> (parser, payload for a size), payloads are built once before timing
+CASES = {
+    "person_roles": (parse_person_roles, lambda size: synthetic.person(1, roles=size)),
+    "person_roles_all": (parse_person_roles_all, lambda size: synthetic.person(1, roles=size)),
+    "anime_characters": (parse_anime_characters, lambda size: synthetic.anime_characters(1, count=size)),
+    "character_anime": (parse_character_anime, lambda size: synthetic.character(1, roles=size)),
+    "person": (parse_person, lambda size: synthetic.person(1, roles=size)),
+}
+
+
+def time_call(parser, payload, repeat):
+    """Best seconds per call over `repeat` runs (the minimum is the least noisy)"""
+    timer = timeit.Timer(lambda: parser(payload))
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * TARGET_TIME / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def measure_memory(parser, payload):
+    """(peak bytes allocated during a call, bytes and blocks still held by its result)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        result = parser(payload)
+        end, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return peak - start, end - start, blocks
+
+
+def run(sizes, only=None, repeat=5):
+    """Benchmark every case at every size, returns {"case/size": measurements}"""
+    results = {}
+    for name, (parser, make_payload) in CASES.items():
+        if only and name not in only:
+            continue
+        for size in sizes:
+            payload = make_payload(size)
+            peak, retained, blocks = measure_memory(parser, payload)
+            results[f"{name}/{size}"] = {
+                "us_per_call": time_call(parser, payload, repeat) * 1e6,
+                "peak_kib": peak / 1024,
+                "retained_kib": retained / 1024,
+                "retained_blocks": blocks,
+            }
+    return results
+
+
+def compare(results, baseline):
+    """Regressions as (key, metric, baseline value, new value)"""
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if result["us_per_call"] > old["us_per_call"] * (1 + TIME_TOLERANCE):
+            regressions.append((key, "us_per_call", old["us_per_call"], result["us_per_call"]))
+        if result["peak_kib"] > max(old["peak_kib"] * (1 + MEMORY_TOLERANCE), old["peak_kib"] + MEMORY_SLACK):
+            regressions.append((key, "peak_kib", old["peak_kib"], result["peak_kib"]))
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'case':<26}{'us/call':>12}{'vs base':>9}{'peak KiB':>11}{'vs base':>9}{'kept KiB':>11}{'blocks':>9}")
+    for key, r in results.items():
+        old = baseline.get(key)
+        time_change = f"{r['us_per_call'] / old['us_per_call']:.2f}x" if old else "-"
+        memory_change = f"{r['peak_kib'] / old['peak_kib']:.2f}x" if old and old["peak_kib"] else "-"
+        print(f"{key:<26}{r['us_per_call']:>12.1f}{time_change:>9}{r['peak_kib']:>11.1f}{memory_change:>9}"
+              f"{r['retained_kib']:>11.1f}{r['retained_blocks']:>9}")
+
+
+def load_baseline(file_name):
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name) as file:
+        return json.load(file)["results"]
+
+
+def save_baseline(file_name, results):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, "w") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, file, indent=2)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="roles per payload")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="cases to run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case, the best is kept")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.only, args.repeat)
+    baseline = load_baseline(args.baseline)
+    print_results(results, baseline)
+
+    if args.save:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\nsaved baseline to {args.baseline}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline)
+    for key, metric, old, new in regressions:
+        print(f"REGRESSION {key} {metric}: {old:.1f} -> {new:.1f}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,57 @@
+"""
+Time intersecting seiyuu's anime ids with postings.intersect, next to intersecting
+Python sets of the same ids, and compare the memory each form takes.
+
+Each case intersects one small list of `small` ids with two lists of `large` ids drawn
+from 60k anime. The time for postings should follow `small`, while the memory of the
+lists follows `large`.
+
+    python -m perf.bench_postings
+    python -m perf.bench_postings --cases 10:100000
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from postings import intersect, to_postings
+
+CASES = ["10:1000", "10:10000", "1000:10000", "10000:10000"]
+ANIME = 60000
+
+
+def best_time(function, repeat=5):
+    number, _ = timeit.Timer(function).autorange()
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def set_size(ids):
+    return sys.getsizeof(ids) + sum(sys.getsizeof(id) for id in ids)
+
+
+def run(cases):
+    results = {}
+    for case in cases:
+        small, large = map(int, case.split(":"))
+        rng = random.Random(case)
+        lists = [rng.sample(range(ANIME), small)] + [rng.sample(range(ANIME), large) for _ in range(2)]
+        postings = [to_postings(ids) for ids in lists]
+        sets = [set(ids) for ids in lists]
+        results[case] = {
+            "postings_us": best_time(lambda: intersect(postings)) * 1e6,
+            "sets_us": best_time(lambda: set.intersection(*sorted(sets, key=len))) * 1e6,
+            "postings_kib": sum(sys.getsizeof(ids) for ids in postings) / 1024,
+            "sets_kib": sum(set_size(ids) for ids in sets) / 1024,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", default=CASES, help="small:large id counts")
+    args = parser.parse_args()
+
+    print(f"{'case':<14}{'postings us':>13}{'sets us':>10}{'postings KiB':>14}{'sets KiB':>10}")
+    for case, r in run(args.cases).items():
+        print(f"{case:<14}{r['postings_us']:>13.1f}{r['sets_us']:>10.1f}{r['postings_kib']:>14.1f}{r['sets_kib']:>10.1f}")
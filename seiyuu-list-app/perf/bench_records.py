@@ -0,0 +1,72 @@
+"""
+Memory per entity for the records in records.py, next to the plain dicts the parsers
+returned before (same keys, same values).
+
+Entities are parsed from synthetic payloads first, then copied as records and as
+dicts while tracemalloc runs. The copies share their values, so the difference is only
+what each container costs to hold them.
+
+    python -m perf.bench_records
+    python -m perf.bench_records --count 10000
+"""
+
+import argparse
+import tracemalloc
+
+from perf import synthetic
+
+from app import get_info_by_role, get_info_from_anime_data, get_info_from_person_data
+from records import RoleInfo
+
+
+def get_roles(count):
+    voices = synthetic.person(1, roles=count)["voices"]
+    return [
+        RoleInfo(**{name: info[name] for name in RoleInfo.__slots__ if name in info})
+        for info in get_info_by_role(voices, "character")
+    ]
+
+
+# name -> entities parsed the way the app does it
+KINDS = {
+    "anime": lambda count: [get_info_from_anime_data(synthetic.anime(id)) for id in range(1, count + 1)],
+    "character": lambda count: get_info_by_role(synthetic.anime_characters(1, count=count), "character"),
+    "person": lambda count: [get_info_from_person_data(synthetic.person(id, roles=0)) for id in range(1, count + 1)],
+    "role": get_roles,
+}
+
+
+def measure(copy, entities):
+    """Bytes held per entity by copy(entity)"""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        copies = [copy(entity) for entity in entities]
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the list holding the copies isn't part of any entity
+    list_size = copies.__sizeof__()
+    del copies
+    return (end - start - list_size) / len(entities)
+
+
+def run(count):
+    """{kind: (bytes per dict, bytes per record)}"""
+    results = {}
+    for kind, parse in KINDS.items():
+        entities = parse(count)
+        as_dict = measure(lambda entity: dict(entity.items()), entities)
+        as_record = measure(lambda entity: type(entity)(**dict(entity.items())), entities)
+        results[kind] = (as_dict, as_record)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="entities of each kind")
+    args = parser.parse_args()
+
+    print(f"{'entity':<12}{'dict B':>10}{'record B':>10}{'saved':>9}")
+    for kind, (as_dict, as_record) in run(args.count).items():
+        print(f"{kind:<12}{as_dict:>10.0f}{as_record:>10.0f}{1 - as_record / as_dict:>9.0%}")
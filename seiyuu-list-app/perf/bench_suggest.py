@@ -0,0 +1,90 @@
+"""
+Time /search/suggest lookups in the prefix index from suggest.py.
+
+The index holds `count` synthetic people (romanized and Japanese-style names, random
+favorites). Lookups use prefixes of 1 to 4 characters cut from names in the index, and
+are timed twice: right after the index was built, when no results are kept yet, and
+again once they are. Synthetic names share few syllables, so their prefixes match far
+more names than real ones do. Reported per index size:
+  build ms   time to add every entry at once, like a worker's first sync
+  add us     time to add one entry to the full index, like storing a new person
+  pN us      lookup time percentiles
+
+    python -m perf.bench_suggest
+    python -m perf.bench_suggest --counts 100000 --lookups 5000
+"""
+
+import argparse
+import random
+import time
+
+from perf import synthetic
+
+from suggest import PrefixIndex
+
+COUNTS = [1000, 10000, 100000]
+
+
+def make_entries(count):
+    rng = random.Random(count)
+    entries = []
+    for id in range(1, count + 1):
+        name = synthetic.person_entry(id)["name"]
+        entries.append((id, [name, name.replace(", ", " ").upper()], rng.randint(0, 100000)))
+    return entries
+
+
+def percentile(times, fraction):
+    return sorted(times)[min(len(times) - 1, int(len(times) * fraction))]
+
+
+def run(counts, lookups):
+    results = {}
+    for count in counts:
+        entries = make_entries(count)
+        index = PrefixIndex()
+        start = time.perf_counter()
+        index.update(entries)
+        build = time.perf_counter() - start
+
+        rng = random.Random(0)
+        prefixes = []
+        for _ in range(lookups):
+            _, names, _ = rng.choice(entries)
+            prefixes.append(rng.choice(names[0].lower().split(", "))[:rng.randint(1, 4)])
+
+        times = {"first": [], "kept": []}
+        for case, case_times in times.items():
+            for prefix in prefixes:
+                start = time.perf_counter()
+                index.search(prefix)
+                case_times.append(time.perf_counter() - start)
+
+        # with results kept, each add also merges into them
+        adds = []
+        for id in range(count + 1, count + 101):
+            start = time.perf_counter()
+            index.add(id, [synthetic.person_entry(id)["name"]], rng.randint(0, 100000))
+            adds.append(time.perf_counter() - start)
+
+        results[count] = {
+            "build_ms": build * 1000,
+            "add_us": sum(adds) / len(adds) * 1e6,
+            **{f"{case}_{name}": percentile(case_times, fraction) * 1e6
+               for case, case_times in times.items()
+               for name, fraction in (("p50", .5), ("p99", .99))},
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=COUNTS, help="entries in the index")
+    parser.add_argument("--lookups", type=int, default=2000, help="lookups timed per index size")
+    args = parser.parse_args()
+
+    print(f"{'entries':<10}{'build ms':>10}{'add us':>8}"
+          f"{'first p50':>11}{'first p99':>11}{'kept p50':>10}{'kept p99':>10}")
+    for count, r in run(args.counts, args.lookups).items():
+        print(f"{count:<10}{r['build_ms']:>10.1f}{r['add_us']:>8.1f}{r['first_p50']:>11.1f}{r['first_p99']:>11.1f}"
+              f"{r['kept_p50']:>10.1f}{r['kept_p99']:>10.1f}")
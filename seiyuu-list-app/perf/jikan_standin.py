@@ -0,0 +1,123 @@
+"""
+Offline stand-in for jikanapi.
+
+Serves the endpoints the app uses from recorded fixtures when there is one
+(perf/fixtures/<path>.json, e.g. fixtures/people/513/full.json for /v4/people/513/full)
+and from perf/synthetic.py otherwise. Latency and 429s can be injected to see how the
+app behaves against a slow or overloaded api.
+
+    python -m perf.jikan_standin --port 5001 --latency 300 --jitter 100 --rate-429 .05
+    JIKAN_BASE_URL=http://localhost:5001/v4 JIKAN_RATE=1000 flask run
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from flask import Flask, jsonify, request
+
+from perf import synthetic
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def create_app(fixtures_dir=FIXTURES_DIR, latency=0, jitter=0, rate_429=0, retry_after=1, person_roles=None):
+    """
+    Build the stand-in. latency/jitter are in milliseconds, rate_429 is the fraction
+    of requests answered with a 429 and `Retry-After: retry_after`.
+    person_roles fixes how many voice roles synthetic people have
+    """
+    app = Flask(__name__)
+    app.config["JSON_SORT_KEYS"] = False
+
+    def load_fixture(path):
+        file_path = os.path.join(fixtures_dir, f"{path.strip('/')}.json")
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path) as file:
+            return json.load(file)
+
+    @app.before_request
+    def slow_down():
+        delay = latency + random.uniform(-jitter, jitter)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if rate_429 and random.random() < rate_429:
+            response = jsonify({
+                "status": 429,
+                "type": "RateLimitException",
+                "message": "You are being rate-limited.",
+                "error": None,
+            })
+            response.status_code = 429
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+
+    def respond(path, make_data):
+        recorded = load_fixture(path)
+        if recorded is not None:
+            return jsonify(recorded)
+        return jsonify({"data": make_data()})
+
+    @app.route("/v4/seasons/now")
+    def season():
+        page = request.args.get("page", 1, type=int)
+        return jsonify(load_fixture(f"seasons/now/{page}") or synthetic.season(page))
+
+    @app.route("/v4/anime/<int:id>/full")
+    def anime(id):
+        return respond(f"anime/{id}/full", lambda: synthetic.anime(id))
+
+    @app.route("/v4/anime/<int:id>/characters")
+    def anime_characters(id):
+        return respond(f"anime/{id}/characters", lambda: synthetic.anime_characters(id))
+
+    @app.route("/v4/characters/<int:id>/full")
+    def character(id):
+        return respond(f"characters/{id}/full", lambda: synthetic.character(id))
+
+    @app.route("/v4/people/<int:id>/full")
+    def person(id):
+        return respond(f"people/{id}/full", lambda: synthetic.person(id, person_roles))
+
+    @app.route("/v4/people/<int:id>")
+    def person_basic(id):
+        recorded = load_fixture(f"people/{id}") or load_fixture(f"people/{id}/full")
+        if recorded is not None:
+            for key in ("anime", "manga", "voices"):
+                recorded["data"].pop(key, None)
+            return jsonify(recorded)
+        return jsonify({"data": synthetic.person_basic(id)})
+
+    @app.route("/v4/<any(anime, people, characters):type>/")
+    def search(type):
+        page = request.args.get("page", 1, type=int)
+        return jsonify(synthetic.search(type, request.args.get("q", ""), page))
+
+    @app.errorhandler(404)
+    def not_found(e):
+        response = jsonify({"status": 404, "type": "BadResponseException", "message": "Resource does not exist",
+                            "error": "404 on " + request.path})
+        response.status_code = 404
+        return response
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of recorded responses")
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="+/- milliseconds of random latency")
+    parser.add_argument("--rate-429", type=float, default=0, help="fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--person-roles", type=int, default=None, help="voice roles per synthetic person")
+    args = parser.parse_args()
+
+    create_app(
+        args.fixtures, args.latency, args.jitter, args.rate_429, args.retry_after, args.person_roles
+    ).run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,179 @@
+"""
+Load test driver for the app.
+
+Replays traffic against a running app with a pool of concurrent clients and reports
+latency percentiles and throughput per route. Traffic comes from a file of paths
+(one per line, e.g. pulled out of an access log) or, by default, from a weighted mix
+of the app's pages where ids are picked from a zipf-like distribution so a few
+popular pages get most of the hits.
+
+    python -m perf.loadtest --url http://localhost:5000 --duration 30 --concurrency 8
+    python -m perf.loadtest --paths access-paths.txt --json results.json
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# (route, weight, path template), {id} is filled with a popular-ish id
+TRAFFIC_MIX = [
+    ("root", 15, "/"),
+    ("person_info", 30, "/person/{id}"),
+    ("anime_info", 25, "/anime/{id}"),
+    ("character_info", 15, "/character/{id}"),
+    ("search", 10, "/search/?type={type}&q={query}"),
+    ("show_user", 3, "/users/{user_id}/"),
+    ("show_user_ranking", 2, "/users/{user_id}/rank"),
+]
+SEARCH_TYPES = ["anime", "people", "characters"]
+SEARCH_QUERIES = ["naruto", "saori", "mob", "kaguya", "spy", "gojou", "hayami", "frieren", "bocchi", "one piece"]
+
+# for naming the routes of replayed paths
+ROUTE_PATTERNS = [
+    ("root", re.compile(r"^/$")),
+    ("person_info", re.compile(r"^/person/\d+")),
+    ("anime_info", re.compile(r"^/anime/\d+")),
+    ("character_info", re.compile(r"^/character/\d+")),
+    ("search", re.compile(r"^/search")),
+    ("show_user_ranking", re.compile(r"^/users/\d+/rank")),
+    ("show_user", re.compile(r"^/users/\d+")),
+]
+
+
+def get_route(path):
+    for route, pattern in ROUTE_PATTERNS:
+        if pattern.match(path):
+            return route
+    return path.split("?")[0]
+
+
+def zipf_id(rng, ids, skew=1.2):
+    """Pick an id where the n-th most popular one is picked ~1/n^skew as often as the first"""
+    rank = min(len(ids), int(rng.paretovariate(skew)))
+    return ids[rank - 1]
+
+
+def generate_paths(rng, ids, user_ids):
+    """Endless (route, path) pairs following TRAFFIC_MIX"""
+    mix = [entry for entry in TRAFFIC_MIX if user_ids or "{user_id}" not in entry[2]]
+    weights = [weight for _, weight, _ in mix]
+    while True:
+        route, _, template = rng.choices(mix, weights)[0]
+        yield route, template.format(
+            id=zipf_id(rng, ids),
+            type=rng.choice(SEARCH_TYPES),
+            query=rng.choice(SEARCH_QUERIES),
+            user_id=rng.choice(user_ids) if user_ids else "",
+        )
+
+
+def replay_paths(file_name):
+    """Endless (route, path) pairs cycling through a file of paths"""
+    with open(file_name) as file:
+        paths = [line.strip() for line in file if line.strip()]
+    while True:
+        for path in paths:
+            yield get_route(path), path
+
+
+def percentile(sorted_values, fraction):
+    """Nearest rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run(url, traffic, duration, concurrency, timeout=60):
+    """Send requests from `traffic` for `duration` seconds and collect latencies per route"""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        session = requests.Session()
+        while time.time() < deadline:
+            with lock:
+                route, path = next(traffic)
+            start = time.perf_counter()
+            try:
+                response = session.get(f"{url}{path}", timeout=timeout)
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[route].append(elapsed)
+                if failed:
+                    errors[route] += 1
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.time() - start
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies, errors, elapsed):
+    results = {}
+    all_latencies = []
+    for route, values in latencies.items():
+        all_latencies.extend(values)
+        results[route] = summarize_route(sorted(values), errors[route], elapsed)
+    results["all"] = summarize_route(sorted(all_latencies), sum(errors.values()), elapsed)
+    return results
+
+
+def summarize_route(values, errors, elapsed):
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": len(values) / elapsed if elapsed else 0,
+        "p50_ms": percentile(values, .5) * 1000,
+        "p95_ms": percentile(values, .95) * 1000,
+        "p99_ms": percentile(values, .99) * 1000,
+        "max_ms": (values[-1] if values else 0) * 1000,
+    }
+
+
+def print_results(results):
+    print(f"{'route':<20}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route in sorted(results, key=lambda route: (route == "all", route)):
+        r = results[route]
+        print(f"{route:<20}{r['requests']:>10}{r['errors']:>8}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000", help="where the app is running")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run for")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending requests at once")
+    parser.add_argument("--paths", help="file of paths to replay instead of the generated mix")
+    parser.add_argument("--ids", type=int, default=500, help="how many distinct anime/person/character ids to use")
+    parser.add_argument("--user-ids", type=int, nargs="*", default=[], help="existing users to view")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.paths:
+        traffic = replay_paths(args.paths)
+    else:
+        ids = rng.sample(range(1, 60000), args.ids)
+        traffic = generate_paths(rng, ids, args.user_ids)
+
+    results = run(args.url.rstrip("/"), traffic, args.duration, args.concurrency)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
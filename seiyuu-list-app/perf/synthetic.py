@@ -0,0 +1,227 @@
+"""
+Synthetic jikanapi responses.
+Everything is generated deterministically from the requested id so the same url always
+gets the same response. The shapes (including fields the app never reads) follow
+jikanapi v4 so parsing and decoding costs are realistic, but the ids don't have to agree
+across endpoints (a person's roles won't show up on the anime's character list).
+"""
+
+import random
+
+IMAGE_HOST = "https://cdn.myanimelist.net/images"
+SYLLABLES = ["ka", "ki", "ko", "sa", "shi", "su", "ta", "chi", "na", "ni", "ha", "hi", "ma",
+             "mi", "ya", "yu", "ra", "ri", "ro", "wa", "n", "to", "mo", "ai", "ei"]
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi", "Slice of Life",
+          "Sports", "Supernatural", "Mystery", "Suspense"]
+LANGUAGES = ["English", "Korean", "German", "French", "Spanish", "Portuguese (BR)", "Italian"]
+PER_PAGE = 25
+
+
+def make_rng(*seed):
+    return random.Random(":".join(str(part) for part in seed))
+
+
+def make_word(rng, syllables=3):
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def make_images(kind, id):
+    url = f"{IMAGE_HOST}/{kind}/{id % 13}/{id}"
+    return {
+        "jpg": {"image_url": f"{url}.jpg", "small_image_url": f"{url}t.jpg", "large_image_url": f"{url}l.jpg"},
+        "webp": {"image_url": f"{url}.webp", "small_image_url": f"{url}t.webp", "large_image_url": f"{url}l.webp"},
+    }
+
+
+def make_text(rng, sentences):
+    return " ".join(
+        " ".join(make_word(rng, rng.randint(1, 4)).lower() for _ in range(rng.randint(6, 16))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def anime_entry(id):
+    """An anime as it's nested in other responses"""
+    rng = make_rng("anime", id)
+    return {
+        "mal_id": id,
+        "url": f"https://myanimelist.net/anime/{id}",
+        "images": make_images("anime", id),
+        "title": f"{make_word(rng)} {make_word(rng, 2)}",
+    }
+
+
+def character_entry(id):
+    """A character as it's nested in other responses"""
+    rng = make_rng("character", id)
+    return {
+        "mal_id": id,
+        "url": f"https://myanimelist.net/character/{id}",
+        "images": make_images("characters", id),
+        "name": f"{make_word(rng)}, {make_word(rng, 2)}",
+    }
+
+
+def person_entry(id):
+    """A person as it's nested in other responses"""
+    rng = make_rng("person", id)
+    return {
+        "mal_id": id,
+        "url": f"https://myanimelist.net/people/{id}",
+        "images": {"jpg": make_images("voiceactors", id)["jpg"]},
+        "name": f"{make_word(rng)}, {make_word(rng, 2)}",
+    }
+
+
+def anime(id):
+    """/anime/{id}/full"""
+    rng = make_rng("anime", id)
+    entry = anime_entry(id)
+    year = rng.randint(1990, 2024)
+    return {
+        **entry,
+        "trailer": {"youtube_id": None, "url": None, "embed_url": None},
+        "approved": True,
+        "titles": [{"type": "Default", "title": entry["title"]}, {"type": "Japanese", "title": make_word(rng, 4)}],
+        "title_english": entry["title"],
+        "title_japanese": make_word(rng, 4),
+        "title_synonyms": [],
+        "type": rng.choice(["TV", "Movie", "OVA", "ONA"]),
+        "source": rng.choice(["Manga", "Light novel", "Original"]),
+        "episodes": rng.randint(1, 26),
+        "status": "Finished Airing",
+        "airing": False,
+        "aired": {"from": f"{year}-04-01T00:00:00+00:00", "to": None, "string": f"Apr {year}"},
+        "duration": "24 min per ep",
+        "rating": rng.choice(["G - All Ages", "PG-13 - Teens 13 or older", "R - 17+ (violence & profanity)"]),
+        "score": round(rng.uniform(5, 9), 2),
+        "scored_by": rng.randint(1000, 2000000),
+        "rank": rng.randint(1, 20000),
+        "popularity": rng.randint(1, 20000),
+        "members": rng.randint(1000, 3000000),
+        "favorites": rng.randint(0, 200000),
+        "synopsis": make_text(rng, rng.randint(3, 8)),
+        "background": None,
+        "season": "spring",
+        "year": year,
+        "broadcast": {"day": "Sundays", "time": "00:00", "timezone": "Asia/Tokyo", "string": "Sundays at 00:00 (JST)"},
+        "producers": [{"mal_id": rng.randint(1, 2000), "type": "anime", "name": make_word(rng), "url": ""}],
+        "licensors": [],
+        "studios": [{"mal_id": rng.randint(1, 2000), "type": "anime", "name": make_word(rng), "url": ""}],
+        "genres": [
+            {"mal_id": GENRES.index(genre) + 1, "type": "anime", "name": genre, "url": ""}
+            for genre in rng.sample(GENRES, rng.randint(1, 4))
+        ],
+        "explicit_genres": [],
+        "themes": [],
+        "demographics": [],
+    }
+
+
+def voice_actors(character_id, japanese=True):
+    rng = make_rng("voice_actors", character_id)
+    languages = (["Japanese"] if japanese else []) + rng.sample(LANGUAGES, rng.randint(0, 3))
+    return [
+        {"person": person_entry(rng.randint(1, 80000)), "language": language}
+        for language in languages
+    ]
+
+
+def anime_characters(id, count=None):
+    """/anime/{id}/characters"""
+    rng = make_rng("anime_characters", id)
+    count = rng.randint(4, 60) if count is None else count
+    characters = []
+    for i in range(count):
+        character_id = rng.randint(1, 300000)
+        characters.append({
+            "character": character_entry(character_id),
+            "role": "Main" if i < max(1, count // 8) else "Supporting",
+            "favorites": rng.randint(0, 50000),
+            # background characters often have no voice actor
+            "voice_actors": voice_actors(character_id) if rng.random() < .9 else [],
+        })
+    return characters
+
+
+def character(id, roles=None):
+    """/characters/{id}/full, in `roles` anime (random when None)"""
+    rng = make_rng("character", id)
+    entry = character_entry(id)
+    return {
+        **entry,
+        "name_kanji": make_word(rng, 4),
+        "nicknames": [],
+        "favorites": rng.randint(0, 100000),
+        "about": make_text(rng, rng.randint(2, 10)),
+        "anime": [
+            {"role": rng.choice(["Main", "Supporting"]), "anime": anime_entry(rng.randint(1, 60000))}
+            for _ in range(rng.randint(1, 6) if roles is None else roles)
+        ],
+        "manga": [],
+        "voices": voice_actors(id),
+    }
+
+
+def person(id, roles=None):
+    """/people/{id}/full, `roles` voice roles (random when None)"""
+    rng = make_rng("person", id)
+    entry = person_entry(id)
+    family_name, given_name = entry["name"].split(", ")
+    roles = rng.choice([0, 5, 20, 80, 300]) if roles is None else roles
+    return {
+        **entry,
+        "website_url": None,
+        "given_name": given_name,
+        "family_name": family_name,
+        "alternate_names": [],
+        "birthday": f"{rng.randint(1960, 2000)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T00:00:00+00:00",
+        "favorites": rng.randint(0, 100000),
+        "about": make_text(rng, rng.randint(2, 12)),
+        "anime": [],
+        "manga": [],
+        "voices": [
+            {
+                "role": "Main" if rng.random() < .3 else "Supporting",
+                "anime": anime_entry(rng.randint(1, 60000)),
+                "character": character_entry(rng.randint(1, 300000)),
+            }
+            for _ in range(roles)
+        ],
+    }
+
+
+def person_basic(id):
+    """/people/{id}"""
+    data = person(id, roles=0)
+    for key in ("anime", "manga", "voices"):
+        del data[key]
+    return data
+
+
+def pagination(page, last_page, total):
+    return {
+        "last_visible_page": last_page,
+        "has_next_page": page < last_page,
+        "current_page": page,
+        "items": {"count": PER_PAGE if page < last_page else total - PER_PAGE * (last_page - 1),
+                  "total": total, "per_page": PER_PAGE},
+    }
+
+
+def season(page, total=70):
+    """/seasons/now?page={page}"""
+    last_page = (total + PER_PAGE - 1) // PER_PAGE
+    first = PER_PAGE * (page - 1)
+    ids = [50000 + i for i in range(first, min(first + PER_PAGE, total))] if page <= last_page else []
+    return {"pagination": pagination(page, last_page, total), "data": [anime(id) for id in ids]}
+
+
+def search(type, query, page, total=60):
+    """/{type}/?q={query}&page={page}"""
+    rng = make_rng("search", type, query)
+    total = rng.randint(0, total)
+    last_page = max(1, (total + PER_PAGE - 1) // PER_PAGE)
+    ids = [rng.randint(1, 60000) for _ in range(total)][PER_PAGE * (page - 1):PER_PAGE * page]
+    make = {"anime": anime, "people": person_basic, "characters": character}[type]
+    return {"pagination": pagination(page, last_page, total), "data": [make(id) for id in ids]}
@@ -0,0 +1,122 @@
+"""
+Sampling profiler for single requests.
+
+While a request is profiled a background thread looks at the request thread's stack
+every `interval` seconds and counts each stack it sees. Wall clock time is sampled, so
+time spent waiting on jikanapi or postgres shows up next to time spent parsing or
+rendering. Profiles are written as collapsed stacks (`frame;frame;frame count` per
+line) which flamegraph.pl, speedscope and inferno read directly.
+
+Print a token for the signed profiling header with
+    SECRET_KEY=... python profiler.py --ttl 600
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def sign(secret, expires):
+    return hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def make_token(secret, ttl=300):
+    """A token that asks for requests to be profiled for the next `ttl` seconds"""
+    expires = int(time.time() + ttl)
+    return f"{expires}.{sign(secret, expires)}"
+
+
+def check_token(secret, token):
+    """Whether a token was made with `secret` and hasn't expired"""
+    expires, _, signature = (token or "").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(secret, int(expires)))
+
+
+def get_frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """A frame's stack from the outermost call in, joined with ';'"""
+    names = []
+    while frame is not None:
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    """The stacks sampled from one thread while it handled one request"""
+
+    def __init__(self, name, thread_id=None):
+        self.name = name
+        self.thread_id = thread_id or threading.get_ident()
+        self.started = time.time()
+        self.samples = Counter()
+
+    def get_file_name(self, path):
+        return os.path.join(path, f"{self.name}-{int(self.started * 1000)}-{os.getpid()}-{self.thread_id}.collapsed")
+
+    def write(self, path):
+        """Write the collapsed stacks to a new file in `path`, returns the file name"""
+        os.makedirs(path, exist_ok=True)
+        file_name = self.get_file_name(path)
+        with open(file_name, "w") as file:
+            for stack, count in self.samples.most_common():
+                # the request's name is the root so profiles of different routes can be merged
+                file.write(f"{self.name};{stack} {count}\n")
+        return file_name
+
+
+class Sampler:
+    """One thread sampling the stacks of every thread being profiled"""
+
+    def __init__(self, interval=.005):
+        self.interval = interval
+        # thread id -> Profile
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, profile):
+        with self.lock:
+            self.profiles[profile.thread_id] = profile
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return profile
+
+    def stop(self, profile):
+        with self.lock:
+            self.profiles.pop(profile.thread_id, None)
+        return profile
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            # sampling under the lock means a stopped profile is never written to
+            with self.lock:
+                if not self.profiles:
+                    self.thread = None
+                    return
+                frames = sys._current_frames()
+                for profile in self.profiles.values():
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None:
+                        profile.samples[collapse_stack(frame)] += 1
+                del frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ttl", type=int, default=300, help="seconds the token is good for")
+    args = parser.parse_args()
+    print(make_token(os.environ.get("SECRET_KEY", "qwerty"), args.ttl))
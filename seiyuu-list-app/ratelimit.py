@@ -0,0 +1,136 @@
+"""Rate limiting for jikanapi requests"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a token couldn't be taken before the caller's deadline"""
+    pass
+
+
+def get_retry_after(headers, default=1):
+    """Seconds to wait according to a Retry-After header (either seconds or a http date)"""
+    value = headers.get("Retry-After")
+    if value is None:
+        return default
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket.
+    Tokens refill at `rate` per second up to `burst`, every request takes one token
+    and callers block until one is available or their deadline passes.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.bucket = self.new_state()
+
+    def new_state(self):
+        return {"tokens": self.burst, "updated_at": time.time(), "paused_until": 0}
+
+    @contextmanager
+    def state(self):
+        """Yield the bucket's state, changes are kept once the block exits"""
+        with self.lock:
+            yield self.bucket
+
+    def take(self, reserve=0):
+        """
+        Try to take a token, returns 0 on success or how long to wait before trying again.
+        Only takes one when `reserve` tokens would still be left
+        """
+        now = time.time()
+        with self.state() as bucket:
+            if bucket["paused_until"] > now:
+                return bucket["paused_until"] - now
+            elapsed = max(0, now - bucket["updated_at"])
+            bucket["tokens"] = min(self.burst, bucket["tokens"] + elapsed * self.rate)
+            bucket["updated_at"] = now
+            if bucket["tokens"] >= 1 + reserve:
+                bucket["tokens"] -= 1
+                return 0
+            return (1 + reserve - bucket["tokens"]) / self.rate
+
+    def acquire(self, timeout=None, reserve=0):
+        """
+        Block until a token is available (with `reserve` more left over) and take it.
+        Raises RateLimitTimeout if that would take longer than timeout seconds
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self.take(reserve)
+            if wait == 0:
+                return
+            if deadline is not None and time.time() + wait > deadline:
+                raise RateLimitTimeout
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while, e.g. when the api asks us to Retry-After"""
+        with self.state() as bucket:
+            bucket["paused_until"] = max(bucket["paused_until"], time.time() + seconds)
+            bucket["tokens"] = 0
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket kept in a locked file so every worker process on the machine
+    draws from the same bucket
+    """
+
+    def __init__(self, path, rate, burst=1):
+        self.path = path
+        super().__init__(rate, burst)
+
+    @contextmanager
+    def state(self):
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                with os.fdopen(os.dup(fd), "r+") as file:
+                    try:
+                        bucket = json.loads(file.read())
+                    except ValueError:
+                        bucket = self.new_state()
+                    yield bucket
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(bucket))
+            finally:
+                os.close(fd)
+
+
+class LowPriorityLimiter:
+    """
+    Background requests' view of a bucket. A token is only taken when `reserve` more are left,
+    so requests for users going through the bucket itself always get served first
+    """
+
+    def __init__(self, bucket, reserve):
+        self.bucket = bucket
+        # a reserve of burst or more would never be met
+        self.reserve = min(reserve, bucket.burst - 1)
+
+    def acquire(self, timeout=None):
+        self.bucket.acquire(timeout, self.reserve)
+
+    def pause(self, seconds):
+        self.bucket.pause(seconds)
@@ -0,0 +1,136 @@
+"""
+Compact records for the information parsed out of jikanapi responses and stored rows.
+
+Each entity used to be a plain dict, so every cached anime, character or role carried
+its own hash table of repeated string keys. Records keep their fields in __slots__
+instead. They still act like those dicts where the app relies on it (info["title"],
+info.get("role"), {**info}, "seiyuu_id" in info), and templates read them the same
+way ({{ info.title }}). A field that was never set is missing, just like a key that
+was never added to the dict.
+
+    python -m perf.bench_records    # memory per entity, as records and as dicts
+"""
+
+
+class Record:
+    """
+    Fields in __slots__ that can also be read and set like a dict's keys.
+    Subclasses set the fields they always have in their own __init__, which is a few
+    times faster than the setattr() loop here, and pass the rest on
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        # anything besides a slot (methods included) can't be set
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __contains__(self, name):
+        return name in self.__slots__ and hasattr(self, name)
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.keys()]
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class AnimeInfo(Record):
+    """An anime, role is set when it's listed under a character"""
+
+    __slots__ = ("id", "image_url", "title", "synopsis", "rating", "genres", "type", "favorites", "role")
+
+    def __init__(self, id, image_url, title, synopsis, rating, genres, type, favorites, **extra):
+        self.id = id
+        self.image_url = image_url
+        self.title = title
+        self.synopsis = synopsis
+        self.rating = rating
+        self.genres = genres
+        self.type = type
+        self.favorites = favorites
+        if extra:
+            super().__init__(**extra)
+
+
+class CharacterInfo(Record):
+    """A character, with their voice actor's fields when they have one"""
+
+    __slots__ = (
+        "character_id", "character_name", "character_image_url", "role", "about",
+        "seiyuu_id", "seiyuu_name", "seiyuu_image_url", "title", "anime_id",
+    )
+
+    def __init__(self, character_id, character_name, character_image_url, role, about, **extra):
+        self.character_id = character_id
+        self.character_name = character_name
+        self.character_image_url = character_image_url
+        self.role = role
+        self.about = about
+        if extra:
+            super().__init__(**extra)
+
+
+class PersonInfo(Record):
+    """A person"""
+
+    __slots__ = ("id", "name", "jp_name", "image_url", "about", "birthday", "website_url", "favorites")
+
+    def __init__(self, id, name, jp_name, image_url, about, birthday, website_url, favorites):
+        self.id = id
+        self.name = name
+        self.jp_name = jp_name
+        self.image_url = image_url
+        self.about = about
+        self.birthday = birthday
+        self.website_url = website_url
+        self.favorites = favorites
+
+
+class RoleInfo(Record):
+    """A character a person voiced and the anime they voiced them in"""
+
+    __slots__ = ("character_id", "character_name", "character_image_url", "role", "title", "anime_id")
+
+    def __init__(self, character_id, character_name, character_image_url, role, title, anime_id):
+        self.character_id = character_id
+        self.character_name = character_name
+        self.character_image_url = character_image_url
+        self.role = role
+        self.title = title
+        self.anime_id = anime_id
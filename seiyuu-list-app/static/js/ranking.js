@@ -9,26 +9,38 @@ function enableSorting(evt) {
   evt.preventDefault();
   $("#editButton").text('Save your ranking');
   $("#editButton").attr('id', 'saveButton');
-  $("#seiyuuHolder").sortable();
+  $("#seiyuuHolder").sortable({ update: moveSeiyuu });
   return;
 }
 
-async function saveRanking(evt) {
+// every drop is saved as it happens, only the moved seiyuu's rank changes
+async function moveSeiyuu(evt, ui) {
+  console.debug("moveSeiyuu", evt);
+  const $seiyuu = ui.item;
+  const $prev = $seiyuu.prev('.seiyuu');
+  const $next = $seiyuu.next('.seiyuu');
+  var moveObj = { seiyuu_id: $seiyuu.data('id') };
+  if ($prev.length) {
+    moveObj.after = $prev.data('id');
+  } else if ($next.length) {
+    moveObj.before = $next.data('id');
+  } else {
+    return;
+  }
+  await axios({
+    url: `${BASE_URL}rank/seiyuu/move`,
+    method: "POST",
+    data: moveObj
+  });
+  return;
+}
+
+function saveRanking(evt) {
   console.debug("saveRanking", evt);
   evt.preventDefault();
   $("#seiyuuHolder").sortable("destroy");
   $("#saveButton").text('Edit seiyuu ranking');
   $("#saveButton").attr('id', 'editButton');
-  var rankObj = {};
-  $('.seiyuu').each(function (index) {
-    rankObj[$(this).data('id')] = index + 1;
-  }).toArray();
-  console.log(rankObj);
-  await axios({
-    url: `${BASE_URL}rank/seiyuu`,
-    method: "POST",
-    data: rankObj
-  });
   return;
 }
 
@@ -0,0 +1,24 @@
+"use strict";
+
+// fill the search box's datalist with /search/suggest's names as the user types
+const $search = document.getElementById("search");
+const $suggestions = document.getElementById("suggestions");
+let suggestRequest = null;
+
+async function updateSuggestions() {
+  const type = document.querySelector("input[name=type]:checked").value;
+  const params = new URLSearchParams({ type: type, q: $search.value });
+  // only the latest request's suggestions are shown
+  const request = suggestRequest = fetch(`/search/suggest?${params}`).then(resp => resp.json());
+  const data = await request;
+  if (request !== suggestRequest) {
+    return;
+  }
+  $suggestions.replaceChildren(...data.suggestions.map(suggestion => {
+    const $option = document.createElement("option");
+    $option.value = suggestion.names[0];
+    return $option;
+  }));
+}
+
+$search.addEventListener("input", updateSuggestions);
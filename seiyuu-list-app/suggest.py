@@ -0,0 +1,152 @@
+"""
+In-memory prefix index of names and titles for typeahead suggestions.
+
+Every name is stored as one sorted key per word it has, running from that word to the
+end ("hanazawa kana" and "kana" for "Hanazawa, Kana"). The keys starting with a prefix
+are one contiguous run of the sorted list, found with two bisects. The most popular
+entries in the run are the suggestions.
+
+Scanning a run costs as much as it is long, so for prefixes with more than
+CACHED_RUN_LENGTH keys the results are kept after the first lookup. Adding an entry
+merges it into the kept results for each prefix of its keys. Results are only worked
+out again when an entry in them loses popularity or a name.
+
+    python -m perf.bench_suggest    # lookup time against the index size
+"""
+
+import bisect
+import heapq
+import re
+import threading
+
+SUGGEST_LIMIT = 10
+CACHED_RUN_LENGTH = 128
+# past this share of the index changing at once, re-sorting everything beats inserting each key
+REBUILD_FRACTION = 1 / 64
+# sorts after every character, so (prefix + LAST_CHARACTER,) sorts after every key starting with prefix
+LAST_CHARACTER = "\U0010ffff"
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces, 'Hanazawa, Kana' -> 'hanazawa kana'"""
+    return " ".join(re.findall(r"\w+", (text or "").casefold()))
+
+
+def get_keys(names):
+    """The keys an entry is found by, one per word of each name"""
+    keys = set()
+    for name in names:
+        words = normalize(name).split(" ")
+        for i in range(len(words)):
+            if words[i]:
+                keys.add(" ".join(words[i:]))
+    return keys
+
+
+class PrefixIndex:
+    """
+    Thread safe index of entries by name prefix, the most popular first.
+    Ids only have to be orderable, entries without a popularity come last
+    """
+
+    def __init__(self, limit=SUGGEST_LIMIT, cached_run_length=CACHED_RUN_LENGTH):
+        self.limit = limit
+        self.cached_run_length = cached_run_length
+        # sorted (key, id)
+        self.keys = []
+        # id -> (names, popularity)
+        self.entries = {}
+        # prefix with a long run -> the ids search(prefix) finds
+        self.top = {}
+        self.lock = threading.Lock()
+
+    def add(self, id, names, popularity=None):
+        """Add an entry, replacing the names and popularity it had"""
+        self.update([(id, names, popularity)])
+
+    def update(self, entries):
+        """Add many (id, names, popularity) entries at once"""
+        with self.lock:
+            changed = {}
+            for id, names, popularity in entries:
+                entry = (tuple(name for name in names if name), popularity)
+                if self.entries.get(id) != entry:
+                    changed[id] = entry
+            if not changed:
+                return
+
+            if len(changed) > len(self.keys) * REBUILD_FRACTION:
+                self.keys = [(key, id) for key, id in self.keys if id not in changed]
+                for id, (names, _) in changed.items():
+                    self.keys.extend((key, id) for key in get_keys(names))
+                self.keys.sort()
+                self.entries.update(changed)
+                self.top.clear()
+                return
+
+            for id, (names, popularity) in changed.items():
+                old = self.entries.get(id)
+                old_keys = get_keys(old[0]) if old is not None else set()
+                new_keys = get_keys(names)
+                for key in old_keys - new_keys:
+                    del self.keys[bisect.bisect_left(self.keys, (key, id))]
+                for key in new_keys - old_keys:
+                    bisect.insort(self.keys, (key, id))
+                self.entries[id] = (names, popularity)
+                self.update_top(id, old, old_keys, new_keys)
+
+    def update_top(self, id, old, old_keys, new_keys):
+        """Bring the kept results for the prefixes of an entry's old and new keys up to date with it"""
+        new_prefixes = {key[:length] for key in new_keys for length in range(1, len(key) + 1)}
+        lost_popularity = old is not None and self.popularity_order(id) > (
+            (1, id) if old[1] is None else (-old[1], id)
+        )
+        for key in old_keys:
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                ids = self.top.get(prefix)
+                if ids is not None and id in ids and (prefix not in new_prefixes or lost_popularity):
+                    # something that wasn't kept could be ahead of it now
+                    del self.top[prefix]
+
+        for prefix in new_prefixes:
+            ids = self.top.get(prefix)
+            if ids is None:
+                continue
+            if id in ids:
+                ids.remove(id)
+            bisect.insort(ids, id, key=self.popularity_order)
+            del ids[self.limit:]
+
+    def popularity_order(self, id):
+        popularity = self.entries[id][1]
+        return (1, id) if popularity is None else (-popularity, id)
+
+    def search(self, prefix, limit=None):
+        """[(id, names), ...] of up to limit entries with a key starting with prefix, most popular first"""
+        limit = self.limit if limit is None else min(limit, self.limit)
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            ids = self.top.get(prefix)
+            if ids is None:
+                lo = bisect.bisect_left(self.keys, (prefix,))
+                hi = bisect.bisect_left(self.keys, (prefix + LAST_CHARACTER,), lo)
+                matches = {id for _, id in self.keys[lo:hi]}
+                ids = heapq.nsmallest(self.limit, matches, key=self.popularity_order)
+                if hi - lo > self.cached_run_length:
+                    self.top[prefix] = ids
+            return [(id, self.entries[id][0]) for id in ids[:limit]]
+
+    def clear(self):
+        with self.lock:
+            self.keys = []
+            self.entries.clear()
+            self.top.clear()
+
+    def __contains__(self, id):
+        return id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,13 @@
+"""Minimal jikanapi payloads for the tests to store"""
+
+def images(url):
+    return {"jpg": {"image_url": url}}
+
+def anime_data(id, **extra):
+    return {"mal_id": id, "title": f"Anime {id}", "images": images(f"a{id}.jpg"), **extra}
+
+def character_data(id, **extra):
+    return {"mal_id": id, "name": f"Character {id}", "images": images(f"c{id}.jpg"), **extra}
+
+def person_data(id, **extra):
+    return {"mal_id": id, "name": f"Person {id}", "images": images(f"p{id}.jpg"), **extra}
@@ -0,0 +1,189 @@
+"""Test the jikanapi response cache"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock
+
+from models import db, JikanResponse
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import app, ApiError
+from cache import ResponseCache, LRUCache, FlightTimeout, make_key, get_ttl, DEFAULT_TTL
+
+db.create_all()
+
+class CacheTestCase(TestCase):
+    """Test the LRU tier, the database tier and the key/ttl helpers"""
+
+    def setUp(self):
+        """Start every test with empty tiers"""
+        db.drop_all()
+        db.create_all()
+
+        self.cache = ResponseCache(maxsize=2)
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def test_make_key(self):
+        """Test params are ordered and empty ones are dropped"""
+        self.assertEqual(make_key("/people/1"), "/people/1")
+        self.assertEqual(make_key("/anime/", {'q': None}), "/anime/")
+        self.assertEqual(
+            make_key("/anime/", {'q': 'mob', 'page': 2, 'sort': None}),
+            make_key("/anime/", {'page': '2', 'q': 'mob'})
+        )
+
+    def test_get_ttl(self):
+        """Test ttls are picked per endpoint"""
+        self.assertEqual(get_ttl("/seasons/now"), 60 * 60)
+        self.assertGreater(get_ttl("/people/513/full"), get_ttl("/seasons/now"))
+        self.assertEqual(get_ttl("/characters/"), DEFAULT_TTL)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is dropped first"""
+        lru = LRUCache(maxsize=2)
+        expires_at = time.time() + 60
+        lru.set('a', 1, expires_at)
+        lru.set('b', 2, expires_at)
+        lru.get('a')
+        lru.set('c', 3, expires_at)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_lru_expiry(self):
+        """Test expired entries are not returned"""
+        lru = LRUCache()
+        lru.set('a', 1, time.time() - 1)
+
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+    def test_miss_then_hit(self):
+        """Test a stored response is returned from memory"""
+        self.assertIsNone(self.cache.get("/people/1", {'page': 1}))
+        self.cache.set("/people/1", {'page': 1}, {'data': {'mal_id': 1}})
+
+        self.assertEqual(self.cache.get("/people/1", {'page': 1}), {'data': {'mal_id': 1}})
+        stats = self.cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['hit_ratio'], .5)
+
+    def test_shared_tier(self):
+        """Test a response stored by another worker is read from the database"""
+        other_worker = ResponseCache()
+        other_worker.set("/anime/1/full", None, {'data': {'mal_id': 1}})
+
+        self.assertEqual(self.cache.get("/anime/1/full"), {'data': {'mal_id': 1}})
+        self.assertEqual(self.cache.stats()['db_hits'], 1)
+        self.assertEqual(JikanResponse.query.count(), 1)
+
+        self.cache.get("/anime/1/full")
+        self.assertEqual(self.cache.stats()['memory_hits'], 1)
+
+    def test_purge_expired(self):
+        """Test expired responses are deleted from the shared tier when a set() is sampled"""
+        self.cache.set("/anime/", {'q': 'mob'}, {'data': []})
+        self.cache.set("/anime/", {'q': 'psycho'}, {'data': []})
+        JikanResponse.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+
+        never = ResponseCache(purge_fraction=0)
+        never.set("/anime/", {'q': 'other'}, {'data': []})
+        self.assertEqual(JikanResponse.query.count(), 3)
+
+        always = ResponseCache(purge_fraction=1)
+        always.set("/anime/1/full", None, {'data': {'mal_id': 1}})
+        self.assertEqual(
+            sorted(response.key for response in JikanResponse.query.all()),
+            ["/anime/1/full", "/anime/?q=other"]
+        )
+        self.assertEqual(always.stats()['purged'], 2)
+
+    def test_single_flight(self):
+        """Test concurrent misses for the same request share one fetch"""
+        calls = []
+        def fetch():
+            calls.append(1)
+            time.sleep(.2)
+            return {'data': {'mal_id': 1}}
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(
+                lambda _: self.cache.get_or_fetch("/people/1/full", None, fetch), range(5)
+            ))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result == {'data': {'mal_id': 1}} for result in results))
+        self.assertEqual(self.cache.stats()['coalesced'], 4)
+
+    def test_single_flight_across_workers(self):
+        """Test a worker waiting on another's fetch finds the response in the database"""
+        calls = []
+        def fetch():
+            calls.append(1)
+            time.sleep(.2)
+            return {'data': {'mal_id': 1}}
+
+        workers = [ResponseCache(), ResponseCache()]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(
+                lambda worker: worker.get_or_fetch("/people/1/full", None, fetch), workers
+            ))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0], results[1])
+
+    def test_single_flight_slow_leader(self):
+        """Test requests waiting on a fetch that runs past flight_timeout give up with FlightTimeout"""
+        cache = ResponseCache(flight_timeout=.1)
+        def fetch():
+            time.sleep(.5)
+            return {'data': {'mal_id': 1}}
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(cache.get_or_fetch, "/people/1/full", None, fetch)
+            time.sleep(.1)
+            follower = pool.submit(cache.get_or_fetch, "/people/1/full", None, fetch)
+            with self.assertRaises(FlightTimeout):
+                follower.result()
+            self.assertEqual(leader.result(), {'data': {'mal_id': 1}})
+
+    def test_slow_leader_api_error(self):
+        """Test a request that gave up waiting on another's fetch is an ApiError, not a 500"""
+        def fetch_jikan_request(url, params=None, background=False):
+            time.sleep(.5)
+            return {'data': {'mal_id': 1}}
+
+        with mock.patch.object(app_module, "jikan_cache", ResponseCache(flight_timeout=.1)), \
+                mock.patch.object(app_module, "fetch_jikan_request", fetch_jikan_request):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                leader = pool.submit(app_module.get_jikan_request, "/people/1/full")
+                time.sleep(.1)
+                follower = pool.submit(app_module.get_jikan_request, "/people/1/full")
+                with self.assertRaises(ApiError):
+                    follower.result()
+                leader.result()
+
+    def test_single_flight_error(self):
+        """Test waiting requests get the fetch's exception and errors aren't cached"""
+        def fetch():
+            time.sleep(.1)
+            raise ValueError
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(self.cache.get_or_fetch, "/people/1/full", None, fetch) for _ in range(3)]
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertIsNone(self.cache.get("/people/1/full"))
@@ -0,0 +1,77 @@
+"""Test the jikanapi http client's retries"""
+
+from unittest import TestCase
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from client import JikanClient, UpstreamError
+from ratelimit import TokenBucket
+
+class FakeAdapter(HTTPAdapter):
+    """Answers requests with the queued (status, headers) pairs instead of going over the network"""
+
+    def __init__(self, answers):
+        super().__init__()
+        self.answers = list(answers)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = b'{"data": {}}'
+        response.request = request
+        return response
+
+class JikanClientTestCase(TestCase):
+    """Test which responses are retried and when the client gives up"""
+
+    def make_client(self, answers, retries=3):
+        client = JikanClient("https://jikan.test/v4", TokenBucket(rate=1000, burst=10),
+                             retries=retries, backoff=.01)
+        self.adapter = FakeAdapter(answers)
+        client.session.mount("https://", self.adapter)
+        return client
+
+    def test_success(self):
+        """Test a good response is returned as is"""
+        client = self.make_client([(200, {})])
+        self.assertEqual(client.get("/people/1").status_code, 200)
+        self.assertEqual(client.stats()["requests"], 1)
+
+    def test_not_found_not_retried(self):
+        """Test a 404 is returned to the caller without retrying"""
+        client = self.make_client([(404, {})])
+        self.assertEqual(client.get("/people/1").status_code, 404)
+        self.assertEqual(self.adapter.sent, 1)
+
+    def test_retry_server_error(self):
+        """Test 5xxs and connection errors are retried"""
+        client = self.make_client([(503, {}), requests.ConnectionError(), (200, {})])
+        self.assertEqual(client.get("/people/1").status_code, 200)
+        self.assertEqual(client.stats()["retries"], 2)
+
+    def test_retry_after(self):
+        """Test a 429 pauses the limiter for the Retry-After"""
+        client = self.make_client([(429, {"Retry-After": ".2"}), (200, {})])
+        self.assertEqual(client.get("/people/1").status_code, 200)
+        self.assertEqual(self.adapter.sent, 2)
+
+    def test_give_up(self):
+        """Test UpstreamError is raised once retries run out"""
+        client = self.make_client([(500, {})] * 3, retries=2)
+        with self.assertRaises(UpstreamError):
+            client.get("/people/1")
+        self.assertEqual(client.stats()["failures"], 1)
+
+    def test_deadline(self):
+        """Test UpstreamError is raised when the Retry-After is past the deadline"""
+        client = self.make_client([(429, {"Retry-After": "30"})])
+        with self.assertRaises(UpstreamError):
+            client.get("/people/1", timeout=1)
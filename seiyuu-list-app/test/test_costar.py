@@ -0,0 +1,125 @@
+"""Test the co-star graph and its routes"""
+
+import os
+import random
+from collections import deque
+from unittest import TestCase
+
+from models import db
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+from app import app, costar_snapshot, save_anime, save_person
+from costar import CostarGraph, order_edges
+
+from test.fixtures import anime_data, character_data, person_data
+
+db.create_all()
+
+def cast(character_id, *people, language="Japanese"):
+    return {
+        "role": "Main",
+        "character": character_data(character_id),
+        "voice_actors": [{"language": language, "person": person_data(id)} for id in people],
+    }
+
+def shortest_length(edges, from_id, to_id):
+    """Path length by a plain one-sided search, None if there's no path"""
+    neighbors = {}
+    for a, b, _ in edges:
+        neighbors.setdefault(a, set()).add(b)
+        neighbors.setdefault(b, set()).add(a)
+    depths = {from_id: 0}
+    queue = deque([from_id])
+    while queue:
+        id = queue.popleft()
+        for neighbor in neighbors.get(id, ()):
+            if neighbor not in depths:
+                depths[neighbor] = depths[id] + 1
+                queue.append(neighbor)
+    return depths.get(to_id)
+
+class CostarGraphTestCase(TestCase):
+    """Test the graph's arrays, top co-stars and shortest paths"""
+
+    def setUp(self):
+        self.graph = CostarGraph.from_edges(order_edges([(10, 20, 1), (10, 30, 5), (20, 30, 2), (30, 40, 1), (50, 60, 3)]))
+
+    def test_arrays(self):
+        self.assertEqual(list(self.graph.ids), [10, 20, 30, 40, 50, 60])
+        self.assertEqual(list(self.graph.offsets), [0, 2, 4, 7, 8, 9, 10])
+        self.assertEqual(len(self.graph.neighbors), 10)
+
+    def test_top_costars(self):
+        self.assertEqual(self.graph.top_costars(30, 10), [(10, 5), (20, 2), (40, 1)])
+        self.assertEqual(self.graph.top_costars(30, 1), [(10, 5)])
+        self.assertEqual(self.graph.top_costars(99, 10), [])
+
+    def test_path(self):
+        self.assertEqual(self.graph.path(10, 40), [10, 30, 40])
+        self.assertEqual(self.graph.path(40, 20), [40, 30, 20])
+        self.assertEqual(self.graph.path(10, 10), [10])
+        self.assertEqual(self.graph.path(99, 99), [99])
+        self.assertIsNone(self.graph.path(10, 60))
+        self.assertIsNone(self.graph.path(10, 99))
+
+    def test_random_paths(self):
+        """Test paths are as short as a one-sided search finds and only use edges"""
+        rng = random.Random(0)
+        pairs = {tuple(sorted(rng.sample(range(300), 2))) for _ in range(500)}
+        edges = [(a, b, rng.randint(1, 5)) for a, b in pairs]
+        graph = CostarGraph.from_edges(order_edges(edges))
+        for _ in range(100):
+            from_id, to_id = rng.choice(graph.ids), rng.choice(graph.ids)
+            path = graph.path(from_id, to_id)
+            length = shortest_length(edges, from_id, to_id)
+            if length is None:
+                self.assertIsNone(path)
+                continue
+            self.assertEqual(len(path) - 1, length)
+            self.assertEqual((path[0], path[-1]), (from_id, to_id))
+            for a, b in zip(path, path[1:]):
+                self.assertIn(tuple(sorted((a, b))), pairs)
+
+class CostarViewsTestCase(TestCase):
+    """Test the graph is built from the stored roles"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        costar_snapshot.graph = None
+        self.client = app.test_client()
+
+        save_anime(anime_data(1), [cast(100, 1), cast(101, 2), cast(102, 9, language="English")])
+        save_anime(anime_data(2), [cast(103, 1), cast(104, 2, 3)])
+        save_person(person_data(4, voices=[
+            {"role": "Main", "anime": anime_data(3), "character": character_data(105)},
+        ]))
+        # a person's roles are all of theirs, the ones their anime listed too
+        save_person(person_data(3, voices=[
+            {"role": "Main", "anime": anime_data(2), "character": character_data(104)},
+            {"role": "Main", "anime": anime_data(3), "character": character_data(106)},
+        ]))
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def test_costars(self):
+        resp = self.client.get('/person/1/costars')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json, {"costars": [
+            {"id": 2, "name": "Person 2", "image_url": "p2.jpg", "shared_anime": 2},
+            {"id": 3, "name": "Person 3", "image_url": "p3.jpg", "shared_anime": 1},
+        ]})
+        self.assertEqual(len(self.client.get('/person/1/costars?limit=1').json["costars"]), 1)
+        # the English dub's cast isn't linked in
+        self.assertEqual(self.client.get('/person/9/costars').json, {"costars": []})
+
+    def test_path(self):
+        resp = self.client.get('/person/1/path/4')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([person["id"] for person in resp.json["path"]], [1, 3, 4])
+        self.assertEqual(resp.json["path"][1]["name"], "Person 3")
+        self.assertEqual(self.client.get('/person/1/path/9').status_code, 404)
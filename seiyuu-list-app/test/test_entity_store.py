@@ -0,0 +1,196 @@
+"""Test storing and loading anime/characters/people"""
+
+import os
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from models import db, Anime, Person, VoiceRole
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+from app import (app, save_anime, save_character, save_person, save_people,
+    load_anime, load_character, load_person, load_people, partition_by_role, ROLES_PER_PAGE)
+
+from test.fixtures import anime_data, character_data, person_data
+
+db.create_all()
+
+class EntityStoreTestCase(TestCase):
+    """Test jikanapi responses are stored and read back in the parsers' format"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def test_missing(self):
+        """Test nothing is loaded before being stored"""
+        self.assertIsNone(load_person(1))
+        self.assertIsNone(load_anime(1))
+        self.assertIsNone(load_character(1))
+        self.assertEqual(load_people([1]), {})
+
+    def test_person(self):
+        """Test a person is loaded with their roles split by role"""
+        save_person(person_data(1, family_name="Family", given_name="Given", about="about", voices=[
+            {"role": "Main", "anime": anime_data(10), "character": character_data(100)},
+            {"role": "Supporting", "anime": anime_data(11), "character": character_data(101)},
+        ]))
+
+        info, roles, roles_pages = load_person(1)
+        main_roles, sup_roles = roles["main"], roles["supporting"]
+        self.assertEqual(roles_pages, 1)
+        self.assertEqual(info["name"], "Person 1")
+        self.assertEqual(info["jp_name"], "Family Given")
+        self.assertEqual(info["about"], "about")
+        self.assertEqual(len(main_roles), 1)
+        self.assertEqual(main_roles[0]["character_name"], "Character 100")
+        self.assertEqual(main_roles[0]["title"], "Anime 10")
+        self.assertEqual(main_roles[0]["anime_id"], 10)
+        self.assertEqual(sup_roles[0]["character_id"], 101)
+
+    def test_anime(self):
+        """Test an anime is loaded with its characters in order and their Japanese voice actors"""
+        save_anime(anime_data(10, synopsis="synopsis", genres=[{"name": "Action"}]), [
+            {"role": "Main", "character": character_data(101), "voice_actors": [
+                {"language": "English", "person": person_data(2)},
+                {"language": "Japanese", "person": person_data(1)},
+            ]},
+            {"role": "Main", "character": character_data(100), "voice_actors": []},
+            {"role": "Supporting", "character": character_data(102), "voice_actors": [
+                {"language": "English", "person": person_data(2)},
+            ]},
+        ])
+
+        info, characters, roles_pages = load_anime(10)
+        main_characters, sup_characters = characters["main"], characters["supporting"]
+        self.assertEqual(info["title"], "Anime 10")
+        self.assertEqual(info["genres"], ["Action"])
+        self.assertEqual([c["character_id"] for c in main_characters], [101, 100])
+        self.assertEqual(main_characters[0]["seiyuu_id"], 1)
+        self.assertNotIn("seiyuu_id", main_characters[1])
+        self.assertEqual(sup_characters[0]["seiyuu_name"], "Person 2")
+
+    def test_character(self):
+        """Test a character is loaded with their voice actor and anime split by role"""
+        save_character(character_data(100, about="about", anime=[
+            {"role": "Main", "anime": anime_data(10)},
+            {"role": "Supporting", "anime": anime_data(11)},
+        ], voices=[
+            {"language": "Japanese", "person": person_data(1)},
+        ]))
+
+        character_info, anime, roles_pages = load_character(100)
+        main_anime, sup_anime = anime["main"], anime["supporting"]
+        self.assertEqual(character_info["about"], "about")
+        self.assertEqual(character_info["seiyuu_name"], "Person 1")
+        self.assertEqual(main_anime[0]["title"], "Anime 10")
+        self.assertEqual(sup_anime[0]["id"], 11)
+
+    def test_person_keeps_language(self):
+        """Test storing a person doesn't forget the language of their roles"""
+        save_anime(anime_data(10), [
+            {"role": "Main", "character": character_data(100), "voice_actors": [
+                {"language": "Japanese", "person": person_data(1)},
+            ]},
+        ])
+        save_person(person_data(1, voices=[
+            {"role": "Main", "anime": anime_data(10), "character": character_data(100)},
+        ]))
+
+        self.assertEqual(VoiceRole.query.get((10, 100, 1)).language, "Japanese")
+
+    def test_person_replaces_roles(self):
+        """Test storing a person again drops the roles their new list doesn't have"""
+        save_person(person_data(1, voices=[
+            {"role": "Main", "anime": anime_data(10), "character": character_data(100)},
+            {"role": "Main", "anime": anime_data(11), "character": character_data(101)},
+        ]))
+        save_person(person_data(1, voices=[
+            {"role": "Main", "anime": anime_data(11), "character": character_data(101)},
+        ]))
+
+        info, roles, roles_pages = load_person(1)
+        self.assertEqual([role["anime_id"] for role in roles["main"]], [11])
+        self.assertEqual(VoiceRole.query.filter_by(person_id=1).count(), 1)
+
+    def test_recast(self):
+        """Test a character recast in a sequel is only listed under who voiced them in each anime"""
+        save_anime(anime_data(10), [
+            {"role": "Main", "character": character_data(100), "voice_actors": [
+                {"language": "Japanese", "person": person_data(1)},
+            ]},
+        ])
+        save_anime(anime_data(11), [
+            {"role": "Main", "character": character_data(100), "voice_actors": [
+                {"language": "Japanese", "person": person_data(2)},
+            ]},
+        ])
+        save_person(person_data(2, voices=[
+            {"role": "Main", "anime": anime_data(11), "character": character_data(100)},
+        ]))
+        save_character(character_data(100, anime=[
+            {"role": "Main", "anime": anime_data(10)},
+            {"role": "Main", "anime": anime_data(11)},
+        ], voices=[
+            {"language": "Japanese", "person": person_data(2)},
+            {"language": "Japanese", "person": person_data(1)},
+        ]))
+
+        info, roles, roles_pages = load_person(2)
+        self.assertEqual([role["anime_id"] for role in roles["main"]], [11])
+        self.assertEqual(load_anime(10)[1]["main"][0]["seiyuu_id"], 1)
+        self.assertEqual(load_anime(11)[1]["main"][0]["seiyuu_id"], 2)
+        self.assertEqual(load_character(100)[0]["seiyuu_id"], 1)
+
+    def test_stale(self):
+        """Test stale entries aren't loaded"""
+        save_anime(anime_data(10), [])
+        save_people([person_data(1)])
+        long_ago = datetime.utcnow() - timedelta(days=365)
+        Anime.query.get(10).full_updated_at = long_ago
+        Person.query.get(1).updated_at = long_ago
+        db.session.commit()
+
+        self.assertIsNone(load_anime(10))
+        self.assertEqual(load_people([1]), {})
+
+    def test_people(self):
+        """Test people stored without roles can be loaded but not as a full person"""
+        save_people([person_data(1), person_data(2)])
+
+        self.assertEqual(set(load_people([1, 2, 3])), {1, 2})
+        self.assertIsNone(load_person(1))
+
+    def test_partition_by_role(self):
+        """Test infos are grouped by their lowercased role in one pass"""
+        roles = partition_by_role([{"role": "Main"}, {"role": "supporting"}, {"role": "MAIN"}, {"role": None}])
+
+        self.assertEqual(len(roles["main"]), 2)
+        self.assertEqual(len(roles["supporting"]), 1)
+        self.assertEqual(len(roles[""]), 1)
+        self.assertEqual(partition_by_role([]), {"main": [], "supporting": []})
+
+    def test_roles_page(self):
+        """Test roles are loaded a page at a time, main roles first"""
+        count = ROLES_PER_PAGE + 5
+        save_person(person_data(1, voices=[
+            {"role": "Supporting" if i % 2 else "Main", "anime": anime_data(10 + i), "character": character_data(1000 + i)}
+            for i in range(count)
+        ]))
+
+        info, roles, roles_pages = load_person(1)
+        self.assertEqual(roles_pages, 2)
+        self.assertEqual(len(roles["main"]), (count + 1) // 2)
+        self.assertEqual(len(roles["main"]) + len(roles["supporting"]), ROLES_PER_PAGE)
+
+        info, roles, roles_pages = load_person(1, roles_page=2)
+        self.assertEqual(roles["main"], [])
+        self.assertEqual(len(roles["supporting"]), 5)
+
+        info, roles, roles_pages = load_person(1, roles_page=3)
+        self.assertEqual(roles, {"main": [], "supporting": []})
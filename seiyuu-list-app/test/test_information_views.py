@@ -13,7 +13,7 @@ TEST_ANIME_ID = 50602
 TEST_NONSEIYUU_ID = 52015
 TEST_CHARACTER_ID = 109929
 
-from app import app, CURR_USER_KEY
+from app import app, CURR_USER_KEY, TEMPLATE_VERSION, page_cache, fragment_cache
 
 db.create_all()
 
@@ -43,6 +43,9 @@ class InformationViewsTestCase(TestCase):
         self.u1 = u1
         self.u1_id = u1_id
 
+        page_cache.clear()
+        fragment_cache.clear()
+
         self.client = app.test_client()
   
     def tearDown(self):
@@ -123,4 +126,69 @@ class InformationViewsTestCase(TestCase):
             with c.session_transaction() as sess:
                 sess[CURR_USER_KEY] = self.u1_id
             resp = c.get(f'/person/{TEST_NONSEIYUU_ID}')
-            self.assertIn("No voice acting roles!", str(resp.data))
\ No newline at end of file
+            self.assertIn("No voice acting roles!", str(resp.data))
+
+    def test_cached_page(self):
+        """Test a page is rendered once and served from the cache after"""
+        with self.client as c:
+            resp = c.get(f'/anime/{TEST_ANIME_ID}')
+            self.assertIsNone(page_cache.get(("anime", TEST_ANIME_ID, 1, TEMPLATE_VERSION)))
+            resp.get_data()
+            page = page_cache.get(("anime", TEST_ANIME_ID, 1, TEMPLATE_VERSION))
+            self.assertIsNotNone(page)
+
+            resp = c.get(f'/anime/{TEST_ANIME_ID}')
+            self.assertIn("Eguchi, Takuya as Forger, Loid", str(resp.data))
+            self.assertIs(page_cache.get(("anime", TEST_ANIME_ID, 1, TEMPLATE_VERSION)), page)
+
+    def test_cached_page_per_user(self):
+        """Test the nav and favorite checkbox are filled in per user on a page cached by someone else"""
+        with self.client as c:
+            resp = c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}')
+            self.assertIn("Register", str(resp.data))
+            self.assertNotIn("Favorite", str(resp.data))
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+            resp = c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}')
+            self.assertIn("Logout", str(resp.data))
+            self.assertNotIn("Register", str(resp.data))
+            self.assertIn('class="mr-2"  checked  />', str(resp.data))
+            self.assertNotIn("seiyuulist:", str(resp.data))
+
+            db.session.delete(FavoriteSeiyuu.query.filter_by(user_id=self.u1_id).one())
+            db.session.commit()
+            resp = c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}')
+            self.assertIn("Favorite", str(resp.data))
+            self.assertNotIn('class="mr-2"  checked  />', str(resp.data))
+
+    def test_streamed_page(self):
+        """Test the header and bio are sent before the role lists are rendered"""
+        with self.client as c:
+            resp = c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}', buffered=False)
+            chunks = iter(resp.response)
+            first = next(chunks).decode()
+            self.assertIn("Yuuichi Nakamura", first)
+            self.assertNotIn("Main Roles:", first)
+            self.assertIn("Gojou, Satoru", b"".join(chunks).decode())
+            resp.close()
+
+    def test_flash_on_streamed_page(self):
+        """Test a flashed message shows once on a streamed page"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess['_flashes'] = [('message', 'Hello from the test')]
+            resp = c.get(f'/character/{TEST_CHARACTER_ID}')
+            self.assertIn("Hello from the test", str(resp.data))
+            resp = c.get(f'/character/{TEST_CHARACTER_ID}')
+            self.assertNotIn("Hello from the test", str(resp.data))
+
+    def test_roles_page(self):
+        """Test only pages of roles that exist can be viewed"""
+        with self.client as c:
+            resp = c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}?roles_page=1')
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Gojou, Satoru", str(resp.data))
+
+            self.assertEqual(c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}?roles_page=0').status_code, 404)
+            self.assertEqual(c.get(f'/person/{TEST_FAVORITE_SEIYUU_ID}?roles_page=9999').status_code, 404)
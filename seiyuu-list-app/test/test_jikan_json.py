@@ -0,0 +1,78 @@
+"""Test decoding only the fields the app reads out of jikanapi responses"""
+
+import io
+import json
+import os
+from unittest import TestCase, skipUnless
+
+import requests
+from urllib3 import HTTPResponse
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+from app import (get_info_by_role, get_info_from_anime_data, get_info_from_character_data,
+    get_info_from_person_data)
+from jikan_json import DecodeError, decode_response, ijson, load, loads
+from perf import synthetic
+
+def make_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = "https://jikan.test/v4/people/1/full"
+    response.raw = HTTPResponse(io.BytesIO(body), preload_content=False)
+    return response
+
+def parse_all(person, anime, characters, character):
+    """Everything the app reads from each kind of response"""
+    return (
+        get_info_from_person_data(person),
+        get_info_by_role(person["voices"], "character"),
+        get_info_from_anime_data(anime),
+        get_info_by_role(characters, "character"),
+        get_info_from_character_data(character),
+        get_info_by_role(character["anime"], "anime"),
+    )
+
+class JikanJsonTestCase(TestCase):
+    """Test pruned and streamed decoding keep what the parsers read"""
+
+    def setUp(self):
+        self.payloads = [
+            {"data": synthetic.person(1, roles=50)},
+            {"data": synthetic.anime(1)},
+            {"data": synthetic.anime_characters(1, count=50)},
+            {"data": synthetic.character(1, roles=10)},
+        ]
+        self.bodies = [json.dumps(payload).encode() for payload in self.payloads]
+
+    def test_prune(self):
+        """Test keys the app doesn't read are dropped at every depth"""
+        data = loads(json.dumps({"data": {"mal_id": 1, "url": "x", "images": {
+            "jpg": {"image_url": "a.jpg", "small_image_url": "b.jpg"}, "webp": {"image_url": "a.webp"}
+        }}, "links": {"next": None}}))
+
+        self.assertEqual(data, {"data": {"mal_id": 1, "images": {"jpg": {"image_url": "a.jpg"}}}})
+
+    def test_parsers_unchanged(self):
+        """Test the parsers get the same information out of pruned responses"""
+        pruned = [loads(body)["data"] for body in self.bodies]
+        full = [payload["data"] for payload in self.payloads]
+
+        self.assertEqual(parse_all(*pruned), parse_all(*full))
+
+    def test_errors_kept(self):
+        """Test error responses can still be told apart"""
+        self.assertIn("error", loads(b'{"status": 404, "type": "BadResponseException", "error": null}'))
+
+    def test_bad_body(self):
+        """Test a body that isn't json raises DecodeError"""
+        for mode in ["full", "pruned", "stream"]:
+            with self.assertRaises(DecodeError):
+                decode_response(make_response(self.bodies[0][:-10]), mode)
+
+    @skipUnless(ijson, "needs ijson")
+    def test_stream(self):
+        """Test streaming builds the same pruned responses"""
+        for body in self.bodies:
+            self.assertEqual(load(io.BytesIO(body)), loads(body))
+            self.assertEqual(decode_response(make_response(body), "stream"), loads(body))
@@ -0,0 +1,107 @@
+"""Test the metrics registry and /metrics"""
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+from app import app
+from metrics import Registry, RequestStats, get_endpoint_template, tracking, current_stats
+
+class MetricsTestCase(TestCase):
+    """Test metrics are counted, summed over workers and rendered"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.registry = Registry(self.dir.name)
+        self.counter = self.registry.counter("test_total", "A counter", ["route"])
+        self.histogram = self.registry.histogram("test_seconds", "A histogram", ["route"], buckets=(.1, 1))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_worker(self, pid, data):
+        with open(self.registry.get_file_name(pid), "w") as file:
+            json.dump(data, file)
+
+    def test_get_endpoint_template(self):
+        """Test ids are replaced so urls are grouped"""
+        self.assertEqual(get_endpoint_template("/people/513/full"), "/people/{id}/full")
+        self.assertEqual(get_endpoint_template("/anime/"), "/anime/")
+
+    def test_render(self):
+        """Test counters and cumulative histogram buckets are rendered"""
+        self.counter.inc(route="root")
+        self.counter.inc(2, route="root")
+        self.histogram.observe(.05, route="root")
+        self.histogram.observe(.5, route="root")
+        self.histogram.observe(5, route="root")
+        self.registry.flush()
+        text = self.registry.render()
+
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn('test_total{route="root"} 3', text)
+        self.assertIn('test_seconds_bucket{route="root",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="root",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{route="root",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{route="root"} 3', text)
+        self.assertIn('test_seconds_sum{route="root"} 5.55', text)
+
+    def test_wrong_labels(self):
+        """Test a metric can't be given labels it doesn't have"""
+        with self.assertRaises(ValueError):
+            self.counter.inc(template="home.html")
+
+    def test_aggregate_workers(self):
+        """Test every live worker's values are summed"""
+        self.counter.inc(route="root")
+        self.histogram.observe(.05, route="root")
+        self.registry.flush()
+        # the parent process stands in for another live worker
+        self.write_worker(os.getppid(), {
+            "test_total": [[["root"], 2], [["search"], 1]],
+            "test_seconds": [[["root"], [0, 1, 0, .5]]],
+        })
+        totals = self.registry.aggregate()
+
+        self.assertEqual(totals["test_total"], {("root",): 3, ("search",): 1})
+        self.assertEqual(totals["test_seconds"][("root",)], [1, 1, 0, .55])
+
+    def test_dead_worker(self):
+        """Test the values of workers that exited are archived, so totals don't go down"""
+        self.counter.inc(route="root")
+        self.registry.flush()
+        for dead_pid in (2 ** 22 + 1, 2 ** 22 + 2):
+            self.write_worker(dead_pid, {
+                "test_total": [[["root"], 5]],
+                "test_seconds": [[["root"], [1, 0, 0, .05]]],
+            })
+            totals = self.registry.aggregate()
+            self.assertFalse(os.path.exists(self.registry.get_file_name(dead_pid)))
+
+        self.assertEqual(totals["test_total"], {("root",): 11})
+        self.assertEqual(totals["test_seconds"][("root",)], [2, 0, 0, .1])
+        # archived values are only counted once
+        self.assertEqual(self.registry.aggregate(), totals)
+
+    def test_tracking(self):
+        """Test stats are only current inside the tracking block"""
+        stats = RequestStats("root")
+        with tracking(stats):
+            self.assertIs(current_stats.get(), stats)
+        self.assertIsNone(current_stats.get())
+
+    def test_metrics_view(self):
+        """Test requests, templates and cache lookups show up on /metrics"""
+        with app.test_client() as client:
+            client.get("/login/")
+            resp = client.get("/metrics")
+            text = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("text/plain", resp.content_type)
+            self.assertIn('seiyuulist_request_duration_seconds_count{route="login",status="200"}', text)
+            self.assertIn('seiyuulist_template_render_duration_seconds_count{template="users/login.html"}', text)
+            self.assertIn("seiyuulist_jikan_cache_hit_ratio", text)
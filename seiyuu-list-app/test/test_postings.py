@@ -0,0 +1,93 @@
+"""Test intersecting seiyuu's anime and filtering anime by seiyuu"""
+
+import os
+import random
+from unittest import TestCase, mock
+
+from models import db
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import app, save_person, seiyuu_index
+from postings import intersect, intersect_pair, to_postings
+
+from test.fixtures import anime_data, character_data, person_data
+
+db.create_all()
+
+def voice(role, anime_id, character_id):
+    return {"role": role, "anime": anime_data(anime_id), "character": character_data(character_id)}
+
+class PostingsTestCase(TestCase):
+    """Test sorted id arrays are intersected correctly"""
+
+    def test_intersect_pair(self):
+        """Test both ways of intersecting two arrays agree"""
+        small = to_postings([5, 50, 500, 5000])
+        large = to_postings(range(0, 1000, 5))
+        self.assertEqual(list(intersect_pair(small, large)), [5, 50, 500])
+        with mock.patch("postings.SCAN_RATIO", 0):
+            self.assertEqual(list(intersect_pair(small, large)), [5, 50, 500])
+
+    def test_intersect(self):
+        self.assertEqual(list(to_postings([3, 1, 3, 2])), [1, 2, 3])
+        self.assertEqual(list(intersect([])), [])
+        self.assertEqual(list(intersect([to_postings([1, 2])])), [1, 2])
+        self.assertEqual(list(intersect([to_postings(range(100)), to_postings([5, 50, 500]), to_postings([50, 5])])), [5, 50])
+        self.assertEqual(list(intersect([to_postings([1, 2]), to_postings([])])), [])
+
+    def test_intersect_random(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            sets = [set(rng.sample(range(200), rng.randint(0, 150))) for _ in range(rng.randint(1, 4))]
+            self.assertEqual(list(intersect([to_postings(ids) for ids in sets])), sorted(set.intersection(*sets)))
+
+class FilterAnimeTestCase(TestCase):
+    """Test /anime/filter finds what every seiyuu voiced in"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        seiyuu_index.clear()
+        self.client = app.test_client()
+
+        save_person(person_data(1, voices=[voice("Main", 10, 100), voice("Main", 11, 101), voice("Supporting", 12, 102)]))
+        save_person(person_data(2, voices=[voice("Supporting", 11, 103), voice("Main", 12, 102), voice("Main", 13, 104)]))
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def test_filter(self):
+        resp = self.client.get('/anime/filter?seiyuu=1&seiyuu=2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([anime["id"] for anime in resp.json["anime"]], [11, 12])
+        self.assertEqual(resp.json["anime"][0]["title"], "Anime 11")
+        self.assertEqual([character["id"] for character in resp.json["characters"]], [102])
+
+        resp = self.client.get('/anime/filter?seiyuu=2')
+        self.assertEqual([anime["id"] for anime in resp.json["anime"]], [11, 12, 13])
+
+    def test_filter_restored(self):
+        """Test a seiyuu's kept ids are replaced once their roles are stored again"""
+        self.client.get('/anime/filter?seiyuu=1&seiyuu=2')
+        save_person(person_data(1, voices=[voice("Main", 13, 105)]))
+        resp = self.client.get('/anime/filter?seiyuu=1&seiyuu=2')
+        self.assertEqual([anime["id"] for anime in resp.json["anime"]], [13])
+
+    def test_filter_fetches_missing(self):
+        """Test seiyuu whose roles aren't stored are requested and stored"""
+        with mock.patch.object(app_module, "get_jikan_request", return_value={
+            "data": person_data(3, voices=[voice("Main", 12, 106)])
+        }) as get_jikan_request:
+            resp = self.client.get('/anime/filter?seiyuu=1&seiyuu=3')
+        get_jikan_request.assert_called_once_with("/people/3/full", None)
+        self.assertEqual([anime["id"] for anime in resp.json["anime"]], [12])
+
+    def test_filter_args(self):
+        self.assertEqual(self.client.get('/anime/filter').status_code, 400)
+        self.assertEqual(self.client.get('/anime/filter?seiyuu=x').status_code, 400)
+        query = "&".join(f"seiyuu={id}" for id in range(app_module.SEIYUU_FILTER_MAX + 1))
+        self.assertEqual(self.client.get(f'/anime/filter?{query}').status_code, 400)
@@ -0,0 +1,102 @@
+"""Test the request profiler"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import app, PROFILE_HEADER
+from profiler import Profile, Sampler, make_token, check_token, collapse_stack
+
+def wait_a_bit(seconds):
+    time.sleep(seconds)
+
+class ProfilerTestCase(TestCase):
+    """Test tokens, stack sampling and profiling requests"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_token(self):
+        """Test only unexpired tokens signed with the secret are accepted"""
+        self.assertTrue(check_token("secret", make_token("secret")))
+        self.assertFalse(check_token("other secret", make_token("secret")))
+        self.assertFalse(check_token("secret", make_token("secret", ttl=-10)))
+        self.assertFalse(check_token("secret", "not a token"))
+        self.assertFalse(check_token("secret", None))
+
+        expires, signature = make_token("secret").split(".")
+        self.assertFalse(check_token("secret", f"{int(expires) + 1000}.{signature}"))
+
+    def test_collapse_stack(self):
+        """Test stacks are listed outermost call first"""
+        stack = collapse_stack(sys._getframe()).split(";")
+
+        self.assertTrue(stack[-1].startswith("test_collapse_stack (test_profiler.py:"))
+
+    def test_sampler(self):
+        """Test a thread's stack is sampled while it's profiled and written as collapsed stacks"""
+        sampler = Sampler(interval=.001)
+        profile = None
+        def run():
+            nonlocal profile
+            profile = sampler.start(Profile("test"))
+            wait_a_bit(.1)
+            sampler.stop(profile)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertGreater(sum(profile.samples.values()), 10)
+        file_name = profile.write(self.dir.name)
+        with open(file_name) as file:
+            lines = file.read().splitlines()
+        self.assertTrue(any("wait_a_bit (test_profiler.py:" in line for line in lines))
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("test;"))
+            self.assertTrue(count.isdigit())
+
+    def test_signed_request(self):
+        """Test a request with a valid token is profiled and one with a bad token isn't"""
+        with mock.patch.object(app_module, "PROFILING", True), \
+                mock.patch.object(app_module, "PROFILE_DIR", self.dir.name), \
+                app.test_client() as client:
+            resp = client.get("/login/", headers={PROFILE_HEADER: "1.bad"})
+            self.assertNotIn("X-Profile-File", resp.headers)
+            self.assertEqual(os.listdir(self.dir.name), [])
+
+            resp = client.get("/login/", headers={PROFILE_HEADER: make_token(app.config["SECRET_KEY"])})
+            self.assertIn(resp.headers["X-Profile-File"], os.listdir(self.dir.name))
+            self.assertTrue(resp.headers["X-Profile-File"].startswith("login-"))
+
+    def test_route_allowlist(self):
+        """Test every request to an allowed route is profiled"""
+        with mock.patch.object(app_module, "PROFILING", True), \
+                mock.patch.object(app_module, "PROFILE_ROUTES", {"register"}), \
+                mock.patch.object(app_module, "PROFILE_DIR", self.dir.name), \
+                app.test_client() as client:
+            client.get("/login/")
+            client.get("/register/")
+
+            files = os.listdir(self.dir.name)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].startswith("register-"))
+
+    def test_off_by_default(self):
+        """Test nothing is profiled unless profiling is turned on"""
+        with mock.patch.object(app_module, "PROFILE_SAMPLE_RATE", 1), \
+                mock.patch.object(app_module, "PROFILE_DIR", self.dir.name), \
+                app.test_client() as client:
+            client.get("/login/", headers={PROFILE_HEADER: make_token(app.config["SECRET_KEY"])})
+
+            self.assertFalse(os.path.exists(self.dir.name) and os.listdir(self.dir.name))
@@ -1,6 +1,7 @@
 """Test post requests to api to edit ranking/favoriting"""
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
 from models import db, User, FavoriteSeiyuu
@@ -11,7 +12,7 @@ TEST_RANK1_SEIYUU_ID = 11661
 TEST_RANK2_SEIYUU_ID = 55082
 TEST_RANK3_SEIYUU_ID = 23997
 
-from app import app, CURR_USER_KEY
+from app import app, CURR_USER_KEY, RANK_GAP
 
 db.create_all()
 
@@ -151,3 +152,140 @@ class RankingApiTestCase(TestCase):
             self.assertEqual(TEST_RANK1_SEIYUU_ID, query[1].seiyuu_id)
             self.assertEqual(TEST_RANK3_SEIYUU_ID, query[2].seiyuu_id)
     
+
+    def test_update_rank_not_favorite(self):
+        """Test ranking a seiyuu that isn't a favorite changes nothing"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+            resp = c.post("/rank/seiyuu", json={TEST_RANK2_SEIYUU_ID: 5, 123: 6})
+
+            self.assertEqual(resp.status_code, 404)
+            self.assertEqual(
+                [TEST_RANK1_SEIYUU_ID, TEST_RANK2_SEIYUU_ID, TEST_RANK3_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+    def get_ranking(self, user_id):
+        return [seiyuu_id for (seiyuu_id,) in (db.session
+                    .query(FavoriteSeiyuu.seiyuu_id)
+                    .filter(FavoriteSeiyuu.user_id==user_id)
+                    .order_by(FavoriteSeiyuu.rank.asc())
+                    .all())]
+
+    def test_move_unauthorized(self):
+        """Test moving a seiyuu when not logged in"""
+        with self.client as c:
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'before': TEST_RANK1_SEIYUU_ID})
+
+            self.assertEqual(resp.status_code, 401)
+            self.assertIn("Unauthorized User", str(resp.data))
+
+    def test_move(self):
+        """Test moving seiyuu before and after others"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'before': TEST_RANK1_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(
+                [TEST_RANK3_SEIYUU_ID, TEST_RANK1_SEIYUU_ID, TEST_RANK2_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'after': TEST_RANK1_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(
+                [TEST_RANK1_SEIYUU_ID, TEST_RANK3_SEIYUU_ID, TEST_RANK2_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK1_SEIYUU_ID, 'after': TEST_RANK2_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(
+                [TEST_RANK3_SEIYUU_ID, TEST_RANK2_SEIYUU_ID, TEST_RANK1_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+    def test_move_rebalance(self):
+        """Test ranks that are too close together are spread out and only the moved seiyuu's changes otherwise"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+
+            # the test data's ranks are 1, 2, 3 so there's no room between them
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'after': TEST_RANK1_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 200)
+            ranks = dict(db.session
+                        .query(FavoriteSeiyuu.seiyuu_id, FavoriteSeiyuu.rank)
+                        .filter(FavoriteSeiyuu.user_id==self.u1_id)
+                        .all())
+            self.assertEqual(ranks[TEST_RANK1_SEIYUU_ID], RANK_GAP)
+            self.assertEqual(ranks[TEST_RANK2_SEIYUU_ID], RANK_GAP * 2)
+            self.assertEqual(resp.json['rank'], ranks[TEST_RANK3_SEIYUU_ID])
+            self.assertEqual(
+                [TEST_RANK1_SEIYUU_ID, TEST_RANK3_SEIYUU_ID, TEST_RANK2_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+            db.session.rollback()
+            c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK2_SEIYUU_ID, 'before': TEST_RANK1_SEIYUU_ID})
+            new_ranks = dict(db.session
+                        .query(FavoriteSeiyuu.seiyuu_id, FavoriteSeiyuu.rank)
+                        .filter(FavoriteSeiyuu.user_id==self.u1_id)
+                        .all())
+            self.assertEqual(new_ranks[TEST_RANK1_SEIYUU_ID], ranks[TEST_RANK1_SEIYUU_ID])
+            self.assertEqual(new_ranks[TEST_RANK3_SEIYUU_ID], ranks[TEST_RANK3_SEIYUU_ID])
+
+    def test_move_bad_requests(self):
+        """Test moves that aren't between the user's favorites are rejected"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': 123, 'before': TEST_RANK1_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 404)
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'after': 123})
+            self.assertEqual(resp.status_code, 404)
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 400)
+            resp = c.post("/rank/seiyuu/move", json={'seiyuu_id': TEST_RANK3_SEIYUU_ID, 'before': TEST_RANK3_SEIYUU_ID})
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(
+                [TEST_RANK1_SEIYUU_ID, TEST_RANK2_SEIYUU_ID, TEST_RANK3_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+    def test_update_rank_duplicate(self):
+        """Test two favorites can't be given the same rank"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+            resp = c.post("/rank/seiyuu", json={TEST_RANK2_SEIYUU_ID: 1})
+
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(
+                [TEST_RANK1_SEIYUU_ID, TEST_RANK2_SEIYUU_ID, TEST_RANK3_SEIYUU_ID],
+                self.get_ranking(self.u1_id)
+            )
+
+    def test_toggle_concurrently(self):
+        """Test favorites added at the same time get their own ranks"""
+        seiyuu_ids = list(range(100, 110))
+        def favorite(seiyuu_id):
+            with app.test_client() as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.u2_id
+                return c.post("/favorite/seiyuu", json={'seiyuu_id': seiyuu_id}).status_code
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            statuses = list(pool.map(favorite, seiyuu_ids))
+
+        self.assertEqual(statuses, [200] * len(seiyuu_ids))
+        ranks = [rank for (rank,) in (db.session
+                    .query(FavoriteSeiyuu.rank)
+                    .filter(FavoriteSeiyuu.user_id==self.u2_id)
+                    .all())]
+        self.assertEqual(len(ranks), len(seiyuu_ids))
+        self.assertEqual(len(set(ranks)), len(seiyuu_ids))
@@ -0,0 +1,88 @@
+"""Test the jikanapi rate limiter"""
+
+import os
+import tempfile
+import time
+from email.utils import formatdate
+from unittest import TestCase
+
+from ratelimit import TokenBucket, SharedTokenBucket, LowPriorityLimiter, RateLimitTimeout, get_retry_after
+
+class TokenBucketTestCase(TestCase):
+    """Test tokens are handed out at the configured rate"""
+
+    def test_burst(self):
+        """Test a full bucket hands out burst tokens without waiting"""
+        bucket = TokenBucket(rate=1, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, .1)
+
+    def test_rate(self):
+        """Test callers wait for tokens once the bucket is empty"""
+        bucket = TokenBucket(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 4 / 20 - .01)
+
+    def test_timeout(self):
+        """Test callers give up instead of waiting past their deadline"""
+        bucket = TokenBucket(rate=.1, burst=1)
+        bucket.acquire()
+        with self.assertRaises(RateLimitTimeout):
+            bucket.acquire(timeout=.5)
+
+    def test_pause(self):
+        """Test no tokens are handed out while paused"""
+        bucket = TokenBucket(rate=100, burst=5)
+        bucket.pause(5)
+        with self.assertRaises(RateLimitTimeout):
+            bucket.acquire(timeout=1)
+
+    def test_low_priority(self):
+        """Test background requests only take a token when the reserve is left for everyone else"""
+        bucket = TokenBucket(rate=.1, burst=3)
+        background = LowPriorityLimiter(bucket, reserve=2)
+        background.acquire(timeout=0)
+        with self.assertRaises(RateLimitTimeout):
+            background.acquire(timeout=1)
+        # requests through the bucket itself still get the reserve
+        bucket.acquire(timeout=0)
+        bucket.acquire(timeout=0)
+        self.assertEqual(LowPriorityLimiter(TokenBucket(rate=1, burst=1), reserve=2).reserve, 0)
+
+    def test_retry_after(self):
+        """Test Retry-After is read as seconds or as a date"""
+        self.assertEqual(get_retry_after({'Retry-After': '3'}), 3)
+        self.assertEqual(get_retry_after({}, default=2), 2)
+        in_a_minute = formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(get_retry_after({'Retry-After': in_a_minute}), 60, delta=2)
+
+class SharedTokenBucketTestCase(TestCase):
+    """Test the bucket is shared through its file"""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_shared_tokens(self):
+        """Test two workers draw from the same tokens"""
+        worker1 = SharedTokenBucket(self.path, rate=.1, burst=2)
+        worker2 = SharedTokenBucket(self.path, rate=.1, burst=2)
+        worker1.acquire(timeout=0)
+        worker2.acquire(timeout=0)
+        with self.assertRaises(RateLimitTimeout):
+            worker1.acquire(timeout=0)
+
+    def test_shared_pause(self):
+        """Test a Retry-After seen by one worker pauses the others"""
+        worker1 = SharedTokenBucket(self.path, rate=100, burst=5)
+        worker2 = SharedTokenBucket(self.path, rate=100, burst=5)
+        worker1.pause(5)
+        with self.assertRaises(RateLimitTimeout):
+            worker2.acquire(timeout=1)
@@ -0,0 +1,191 @@
+"""Test the seiyuu similarities behind recommendations"""
+
+import os
+from unittest import TestCase, mock
+
+from sqlalchemy import event
+
+from models import db, User, FavoriteSeiyuu, SeiyuuSimilarity, Person
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import (app, CURR_USER_KEY, get_rank_weight, get_similarity_changes, get_similar_seiyuu,
+    get_user_recommendations, page_cache, fragment_cache, rebuild_similarities, save_people, save_person,
+    RECOMMEND_FROM, RANK_GAP)
+
+from test.fixtures import person_data
+
+db.create_all()
+
+def get_similarities():
+    """{(seiyuu_id, other_id): (co_favorites, score)} of the pairs someone favorited both of"""
+    rows = SeiyuuSimilarity.query.filter(SeiyuuSimilarity.co_favorites > 0).all()
+    return {(row.seiyuu_id, row.other_id): (row.co_favorites, round(row.score, 9)) for row in rows}
+
+class RecommendationsTestCase(TestCase):
+    """Test similarities are kept up to date as favorites change, and what's recommended from them"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        page_cache.clear()
+        fragment_cache.clear()
+
+        favorites = {11111: [1, 2, 3], 22222: [2, 1, 4], 33333: [5]}
+        for user_id in favorites:
+            user = User.signup(f"user{user_id}", f"user{user_id}@test.com", "password", None)
+            user.id = user_id
+        db.session.commit()
+        for user_id, seiyuu_ids in favorites.items():
+            for position, seiyuu_id in enumerate(seiyuu_ids):
+                db.session.add(FavoriteSeiyuu(seiyuu_id=seiyuu_id, user_id=user_id, rank=(position + 1) * 1024))
+        db.session.commit()
+        rebuild_similarities()
+        save_people([person_data(id) for id in range(1, 7)])
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def login(self, c, user_id=11111):
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user_id
+
+    def test_rebuild(self):
+        similarities = get_similarities()
+        # 1 and 2 are 1st and 2nd for user 11111, 2nd and 1st for user 22222
+        self.assertEqual(similarities[(1, 2)], (2, round(2 * get_rank_weight(0) * get_rank_weight(1), 9)))
+        self.assertEqual(similarities[(2, 1)], similarities[(1, 2)])
+        self.assertNotIn((3, 4), similarities)
+        self.assertNotIn((5, 1), similarities)
+
+    def test_changes(self):
+        """Test only pairs whose weights change are touched"""
+        self.assertEqual(get_similarity_changes([1, 2], [1, 2]), {})
+        changes = get_similarity_changes([1, 2], [1, 2, 3])
+        self.assertEqual(set(changes), {(1, 3), (3, 1), (2, 3), (3, 2)})
+        self.assertEqual(changes[(1, 3)], (1, get_rank_weight(0) * get_rank_weight(2)))
+
+    def test_kept_up_to_date(self):
+        """Test toggling, ranking and moving favorites leaves the same similarities as a rebuild"""
+        with self.client as c:
+            self.login(c)
+            c.post("/favorite/seiyuu", json={"seiyuu_id": 4})
+            c.post("/favorite/seiyuu", json={"seiyuu_id": 1})
+            c.post("/rank/seiyuu", json={"3": 5000, "2": 6000})
+            c.post("/rank/seiyuu/move", json={"seiyuu_id": 4, "before": 3})
+            self.login(c, 33333)
+            c.post("/favorite/seiyuu", json={"seiyuu_id": 2})
+
+        self.assertEqual(FavoriteSeiyuu.query.filter_by(user_id=11111).count(), 3)
+        similarities = get_similarities()
+        rebuild_similarities()
+        self.assertEqual(similarities, get_similarities())
+
+    def count_similarity_writes(self, make_requests):
+        """How many similarity rows make_requests() inserts or updates"""
+        written = []
+        def save_rowcount(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO seiyuu_similarities"):
+                written.append(cursor.rowcount)
+
+        event.listen(db.engine, "after_cursor_execute", save_rowcount)
+        try:
+            make_requests()
+        finally:
+            event.remove(db.engine, "after_cursor_execute", save_rowcount)
+        return sum(written)
+
+    def test_writes_bounded(self):
+        """Test a change to a long favorites list only rewrites the similarities of its top RECOMMEND_FROM"""
+        user = User.signup("user44444", "user44444@test.com", "password", None)
+        user.id = 44444
+        db.session.commit()
+        count = RECOMMEND_FROM + 30
+        seiyuu_ids = list(range(1000, 1000 + count))
+        for position, seiyuu_id in enumerate(seiyuu_ids):
+            db.session.add(FavoriteSeiyuu(seiyuu_id=seiyuu_id, user_id=44444, rank=(position + 1) * RANK_GAP))
+        db.session.commit()
+        rebuild_similarities()
+        # every pair within the top before the change and within the top after it, both ways round
+        most_writes = 2 * RECOMMEND_FROM * (RECOMMEND_FROM - 1)
+
+        with self.client as c:
+            self.login(c, 44444)
+            # below the top RECOMMEND_FROM nothing is rewritten
+            self.assertEqual(self.count_similarity_writes(lambda: c.post("/favorite/seiyuu", json={"seiyuu_id": 1})), 0)
+            self.assertEqual(self.count_similarity_writes(lambda: c.post(
+                "/rank/seiyuu/move", json={"seiyuu_id": seiyuu_ids[-10], "before": seiyuu_ids[-20]}
+            )), 0)
+
+            # changes at the very top rewrite the pairs in it, not the whole list's
+            writes = self.count_similarity_writes(lambda: c.post("/favorite/seiyuu", json={"seiyuu_id": seiyuu_ids[0]}))
+            self.assertGreater(writes, 0)
+            self.assertLessEqual(writes, most_writes)
+            writes = self.count_similarity_writes(lambda: c.post(
+                "/rank/seiyuu/move", json={"seiyuu_id": seiyuu_ids[-1], "before": seiyuu_ids[1]}
+            ))
+            self.assertGreater(writes, 0)
+            self.assertLessEqual(writes, most_writes)
+
+        similarities = get_similarities()
+        rebuild_similarities()
+        self.assertEqual(similarities, get_similarities())
+
+    def test_similar_seiyuu(self):
+        self.assertEqual(get_similar_seiyuu(1), [2, 3, 4])
+        self.assertEqual(get_similar_seiyuu(1, limit=1), [2])
+        self.assertEqual(get_similar_seiyuu(5), [])
+
+    def test_user_recommendations(self):
+        """Test a user is recommended what fans of their favorites favorited, and nothing they favorited"""
+        self.assertEqual(get_user_recommendations(11111), [4])
+        self.assertEqual(get_user_recommendations(22222), [3])
+        self.assertEqual(get_user_recommendations(33333), [])
+
+    def test_person_page(self):
+        """Test a person's page shows the current recommendations, cached or not"""
+        save_person(person_data(1, voices=[]))
+        with self.client as c:
+            html = c.get("/person/1").get_data(as_text=True)
+            self.assertIn("Fans also favorited:", html)
+            self.assertLess(html.index("Person 2"), html.index("Person 4"))
+            self.assertNotIn("Person 5", html)
+
+            self.login(c, 33333)
+            c.post("/favorite/seiyuu", json={"seiyuu_id": 1})
+            html = c.get("/person/1").get_data(as_text=True)
+            self.assertIn("Person 5", html)
+
+    def test_only_stored(self):
+        """Test recommendations are only looked up, seiyuu that aren't stored are left out instead of requested"""
+        save_person(person_data(1, voices=[]))
+        Person.query.filter_by(id=3).delete()
+        db.session.commit()
+
+        with self.client as c, \
+                mock.patch.object(app_module, "get_jikan_request", side_effect=AssertionError("asked jikanapi")):
+            html = c.get("/person/1").get_data(as_text=True)
+            self.assertIn("Fans also favorited:", html)
+            self.assertLess(html.index("Person 2"), html.index("Person 4"))
+            self.assertNotIn("Person 3", html)
+
+            # user 22222's only recommendation is 3
+            self.login(c, 22222)
+            resp = c.get("/users/22222/")
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn("might also like", resp.get_data(as_text=True))
+
+    def test_profile(self):
+        with self.client as c:
+            self.login(c)
+            html = c.get("/users/11111/").get_data(as_text=True)
+            self.assertIn("You might also like:", html)
+            self.assertIn("Person 4", html)
+
+            html = c.get("/users/22222/").get_data(as_text=True)
+            self.assertIn("user22222 might also like:", html)
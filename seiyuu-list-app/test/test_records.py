@@ -0,0 +1,63 @@
+"""Test the slotted records parsed entities are kept in"""
+
+from unittest import TestCase
+
+from jinja2 import Environment
+
+from records import AnimeInfo, CharacterInfo
+
+def make_character(**extra):
+    return CharacterInfo(character_id=1, character_name="Name", character_image_url="c1.jpg",
+        role="Main", about=None, **extra)
+
+class RecordsTestCase(TestCase):
+    """Test records act like the dicts they replaced"""
+
+    def test_dict_access(self):
+        """Test fields can be read and set like keys"""
+        character = make_character()
+        character["seiyuu_id"] = 5
+
+        self.assertEqual(character["character_name"], "Name")
+        self.assertEqual(character.get("seiyuu_id"), 5)
+        self.assertEqual({**character}["seiyuu_id"], 5)
+        self.assertEqual(character, {**character})
+
+    def test_missing_fields(self):
+        """Test fields that were never set are missing like absent keys"""
+        character = make_character()
+
+        self.assertNotIn("seiyuu_id", character)
+        self.assertIsNone(character.get("seiyuu_id"))
+        self.assertEqual(character.get("title", "none"), "none")
+        with self.assertRaises(KeyError):
+            character["seiyuu_id"]
+        self.assertNotIn("seiyuu_id", character.keys())
+
+    def test_not_fields(self):
+        """Test methods and unknown names aren't treated as fields"""
+        character = make_character()
+
+        self.assertNotIn("get", character)
+        self.assertIsNone(character.get("keys"))
+        with self.assertRaises(KeyError):
+            character["keys"]
+        with self.assertRaises(KeyError):
+            character["get"] = 1
+        with self.assertRaises(KeyError):
+            character["unknown"] = 1
+
+    def test_no_dict(self):
+        """Test records don't carry a __dict__"""
+        anime = AnimeInfo(id=1, image_url="a1.jpg", title="Anime", synopsis=None, rating=None, genres=[], type="TV", favorites=None)
+
+        self.assertFalse(hasattr(anime, "__dict__"))
+        with self.assertRaises(AttributeError):
+            anime.unknown = 1
+
+    def test_template(self):
+        """Test templates read records like they read dicts"""
+        template = Environment().from_string("{{ c.character_name }} {% if c.seiyuu_id %}voiced{% else %}unvoiced{% endif %}")
+
+        self.assertEqual(template.render(c=make_character()), "Name unvoiced")
+        self.assertEqual(template.render(c=make_character(seiyuu_id=5)), "Name voiced")
@@ -0,0 +1,151 @@
+"""Test searching the stored anime/characters/people"""
+
+import os
+from datetime import datetime
+from unittest import TestCase, mock
+
+from models import db, Person
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import (app, get_person_row, get_search_query, save_anime, save_people, search_local, suggest_indexes,
+    suggest_synced_at, upsert, SEARCH_MIN_RESULTS)
+
+from test.fixtures import anime_data, character_data, person_data
+
+db.create_all()
+
+class SearchTestCase(TestCase):
+    """Test /search answers from the local index and falls back to jikanapi"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        suggest_synced_at.clear()
+        for index in suggest_indexes.values():
+            index.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def test_search_query(self):
+        """Test every word is matched as a prefix"""
+        self.assertEqual(get_search_query("Hanazawa ka"), "hanazawa:* & ka:*")
+        self.assertEqual(get_search_query("Gojou, Satoru!"), "gojou:* & satoru:*")
+        self.assertIsNone(get_search_query(" ,. "))
+        self.assertIsNone(get_search_query(None))
+
+    def test_search_local(self):
+        """Test matches are ordered by favorites, with the Japanese name searched too"""
+        save_people([
+            person_data(1, name="Hanazawa, Kana", favorites=100, family_name="花澤", given_name="香菜"),
+            person_data(2, name="Hanazawa, Kazuki", favorites=300),
+            person_data(3, name="Kanemoto, Hisako"),
+            person_data(4, name="Tomatsu, Haruka", favorites=500),
+        ])
+
+        results, total = search_local("people", "hanazawa", 1)
+        self.assertEqual(total, 2)
+        self.assertEqual([info["id"] for info in results], [2, 1])
+        self.assertEqual(results[0]["favorites"], 300)
+
+        results, total = search_local("people", "Ka hana", 1)
+        self.assertEqual([info["id"] for info in results], [2, 1])
+
+        results, total = search_local("people", "花澤", 1)
+        self.assertEqual([info["id"] for info in results], [1])
+
+        # people without a favorites count come last
+        results, total = search_local("people", "h", 1)
+        self.assertEqual([info["id"] for info in results], [4, 2, 1, 3])
+
+    def test_search_leaves_out_nested(self):
+        """Test entities only stored nested in another response aren't results until they're described"""
+        save_anime(anime_data(10, synopsis="synopsis"), [
+            {"role": "Main", "character": character_data(100, name="Hanazawa Character"), "voice_actors": [
+                {"language": "Japanese", "person": person_data(1, name="Hanazawa, Kana")},
+            ]},
+        ])
+
+        self.assertEqual(search_local("people", "hanazawa", 1), ([], 0))
+        self.assertEqual(search_local("characters", "hanazawa", 1), ([], 0))
+        self.assertEqual([info["id"] for info in search_local("anime", "anime", 1)[0]], [10])
+
+        save_people([person_data(1, name="Hanazawa, Kana", about="about")])
+        results, total = search_local("people", "hanazawa", 1)
+        self.assertEqual(total, 1)
+        self.assertEqual(results[0]["about"], "about")
+
+    def test_search_without_jikan(self):
+        """Test a search enough stored people match is answered without jikanapi"""
+        save_people([person_data(id, name=f"Seiyuu, Number{id}", favorites=id) for id in range(1, SEARCH_MIN_RESULTS + 1)])
+
+        with mock.patch.object(app_module, "get_jikan_request", side_effect=AssertionError("asked jikanapi")):
+            resp = self.client.get('/search/?type=people&q=seiyuu')
+        self.assertEqual(resp.status_code, 200)
+        html = resp.get_data(as_text=True)
+        self.assertIn(f"Seiyuu, Number{SEARCH_MIN_RESULTS}", html)
+        self.assertLess(html.index(f"Number{SEARCH_MIN_RESULTS}"), html.index("Number1<"))
+
+    def test_search_fallback(self):
+        """Test a search few stored people match asks jikanapi and stores what it returns"""
+        save_people([person_data(1, name="Seiyuu, One")])
+
+        with mock.patch.object(app_module, "get_jikan_request", return_value={
+            "pagination": {"last_visible_page": 1},
+            "data": [person_data(id, name=f"Seiyuu, Number{id}", favorites=id) for id in range(2, 5)],
+        }) as get_jikan_request:
+            resp = self.client.get('/search/?type=people&q=seiyuu')
+        self.assertEqual(resp.status_code, 200)
+        get_jikan_request.assert_called_once()
+        self.assertIn("Seiyuu, Number4", resp.get_data(as_text=True))
+
+        results, total = search_local("people", "seiyuu", 1)
+        self.assertEqual(total, 4)
+        self.assertEqual([info["id"] for info in results], [4, 3, 2, 1])
+        self.assertEqual(Person.query.get(4).favorites, 4)
+
+    def test_suggest(self):
+        """Test suggestions come from what's stored, including what's stored after the index was read"""
+        save_people([
+            person_data(1, name="Hanazawa, Kana", favorites=100, family_name="花澤", given_name="香菜"),
+            person_data(2, name="Hanazawa, Kazuki", favorites=300),
+        ])
+
+        resp = self.client.get('/search/suggest?type=people&q=hanaz')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json, {"suggestions": [
+            {"id": 2, "names": ["Hanazawa, Kazuki"], "url": "/person/2"},
+            {"id": 1, "names": ["Hanazawa, Kana", "花澤 香菜"], "url": "/person/1"},
+        ]})
+
+        save_people([person_data(3, name="Hanazawa, Someone", favorites=1000)])
+        resp = self.client.get('/search/suggest?type=people&q=hanaz&limit=1')
+        self.assertEqual(resp.json["suggestions"][0]["id"], 3)
+
+        resp = self.client.get('/search/suggest?type=people&q=花')
+        self.assertEqual([s["id"] for s in resp.json["suggestions"]], [1])
+
+    def test_suggest_rolled_back(self):
+        """Test names are only suggested once the transaction storing them commits"""
+        save_people([person_data(1, name="Hanazawa, Kana", favorites=100)])
+        self.client.get('/search/suggest?type=people&q=hanaz')
+
+        upsert(Person, [get_person_row(person_data(2, name="Hanazawa, Kazuki", favorites=300), datetime.utcnow())])
+        self.assertEqual(len(suggest_indexes["people"]), 1)
+        db.session.rollback()
+        resp = self.client.get('/search/suggest?type=people&q=hanaz')
+        self.assertEqual([s["id"] for s in resp.json["suggestions"]], [1])
+
+        upsert(Person, [get_person_row(person_data(2, name="Hanazawa, Kazuki", favorites=300), datetime.utcnow())])
+        db.session.commit()
+        resp = self.client.get('/search/suggest?type=people&q=hanaz')
+        self.assertEqual([s["id"] for s in resp.json["suggestions"]], [2, 1])
+
+    def test_suggest_type(self):
+        self.assertEqual(self.client.get('/search/suggest?q=a').json, {"suggestions": []})
+        self.assertEqual(self.client.get('/search/suggest?type=manga&q=a').status_code, 400)
@@ -0,0 +1,101 @@
+"""Test the homepage's seasonal snapshot"""
+
+import os
+from unittest import TestCase, mock
+
+from models import db, Anime
+
+os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
+
+import app as app_module
+from app import app, ApiError, SeasonalSnapshot, BACKGROUND_RATE_TIMEOUT, fetch_jikan_request
+from client import UpstreamError
+
+from test.fixtures import anime_data, character_data, person_data
+
+db.create_all()
+
+def cast(character_id, role="Main"):
+    return {"role": role, "character": character_data(character_id), "voice_actors": [
+        {"language": "Japanese", "person": person_data(character_id)},
+    ]}
+
+class SeasonalSnapshotTestCase(TestCase):
+    """Test the snapshot's requests are background ones and only what the homepage shows"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        self.requests = []
+        self.failing = set()
+        # the top shows the snapshot had when each page after the first was requested
+        self.top_shows_seen = []
+
+    def tearDown(self):
+        res = super().tearDown()
+        db.session.rollback()
+        return res
+
+    def get_jikan_request(self, url, params=None, background=False):
+        self.requests.append((url, background))
+        if url in self.failing:
+            raise ApiError
+        if url == "/seasons/now":
+            if params["page"] > 1:
+                self.top_shows_seen.append([anime_info["id"] for anime_info, _ in self.snapshot.top_shows])
+            shows = {1: [anime_data(1), anime_data(2)], 2: [anime_data(2), anime_data(3)]}[params["page"]]
+            return {"pagination": {"last_visible_page": 2}, "data": shows}
+        anime_id = int(url.split("/")[2])
+        return {"data": [cast(anime_id * 100), cast(anime_id * 100 + 1, "Supporting")]}
+
+    def refresh(self, snapshot=None):
+        self.snapshot = snapshot or SeasonalSnapshot(60)
+        with mock.patch.object(app_module, "get_jikan_request", self.get_jikan_request), \
+                mock.patch.object(app_module, "jikan_pool") as jikan_pool:
+            self.snapshot.refresh()
+        jikan_pool.map.assert_not_called()
+        jikan_pool.submit.assert_not_called()
+        return self.snapshot
+
+    def test_refresh(self):
+        """Test every page of shows is listed and only the top shows' characters are requested"""
+        snapshot = self.refresh()
+
+        self.assertEqual([show["id"] for show in snapshot.all_seasonals], [1, 2, 3])
+        self.assertEqual([anime_info["id"] for anime_info, _ in snapshot.top_shows], [1, 2])
+        self.assertEqual([[c["character_id"] for c in characters] for _, characters in snapshot.top_shows], [[100], [200]])
+        self.assertEqual(
+            [url for url, _ in self.requests if url.endswith("/characters")],
+            ["/anime/1/characters", "/anime/2/characters"],
+        )
+        self.assertEqual(sorted(anime.id for anime in Anime.query.all()), [1, 2])
+
+    def test_first_page(self):
+        """Test the first snapshot's first page is requested like a user's and shown before the rest load"""
+        snapshot = self.refresh()
+        self.assertEqual(self.requests[0], ("/seasons/now", False))
+        self.assertTrue(all(background for _, background in self.requests[1:]))
+        self.assertEqual(self.top_shows_seen, [[1, 2]])
+
+        # later snapshots only make background requests
+        self.requests = []
+        self.refresh(snapshot)
+        self.assertTrue(all(background for _, background in self.requests))
+
+    def test_refresh_error(self):
+        """Test a show whose characters couldn't be requested is left for the homepage to request"""
+        self.failing.add("/anime/1/characters")
+        snapshot = self.refresh()
+
+        self.assertIsNone(snapshot.top_shows[0][1])
+        self.assertEqual(len(snapshot.top_shows[1][1]), 1)
+
+    def test_background_client(self):
+        """Test background requests go through the low priority client"""
+        with mock.patch.object(app_module, "jikan_client") as jikan_client, \
+                mock.patch.object(app_module, "background_client") as background_client:
+            background_client.get.side_effect = UpstreamError
+            with self.assertRaises(ApiError):
+                fetch_jikan_request("/seasons/now", {"page": 1}, background=True)
+        background_client.get.assert_called_once_with("/seasons/now", {"page": 1}, timeout=BACKGROUND_RATE_TIMEOUT)
+        jikan_client.get.assert_not_called()
@@ -0,0 +1,74 @@
+"""Test the prefix index behind search suggestions"""
+
+from unittest import TestCase
+
+from suggest import PrefixIndex, get_keys, normalize
+
+
+class PrefixIndexTestCase(TestCase):
+    """Test entries are found by the start of any word of their names, most popular first"""
+
+    def setUp(self):
+        # every prefix's results are kept, so updates have to keep them right
+        self.index = PrefixIndex(limit=3, cached_run_length=0)
+        self.index.update([
+            (1, ["Hanazawa, Kana", "花澤 香菜"], 100),
+            (2, ["Hanazawa, Kazuki", None], 300),
+            (3, ["Kanemoto, Hisako"], None),
+            (4, ["Tomatsu, Haruka"], 500),
+        ])
+
+    def test_keys(self):
+        self.assertEqual(normalize(" Hanazawa,  KANA! "), "hanazawa kana")
+        self.assertEqual(get_keys(["Hanazawa, Kana", None]), {"hanazawa kana", "kana"})
+
+    def test_search(self):
+        self.assertEqual([id for id, _ in self.index.search("hanazawa")], [2, 1])
+        self.assertEqual([id for id, _ in self.index.search("Hanazawa, Ka")], [2, 1])
+        self.assertEqual([id for id, _ in self.index.search("kan")], [1, 3])
+        self.assertEqual(self.index.search("香"), [(1, ("Hanazawa, Kana", "花澤 香菜"))])
+        self.assertEqual(self.index.search("zzz"), [])
+        self.assertEqual(self.index.search(" , "), [])
+
+    def test_limit(self):
+        """Test only the most popular are given, entries without a popularity last"""
+        self.assertEqual([id for id, _ in self.index.search("h")], [4, 2, 1])
+        self.assertEqual([id for id, _ in self.index.search("h", limit=1)], [4])
+        self.assertEqual([id for id, _ in self.index.search("h", limit=10)], [4, 2, 1])
+
+    def test_update(self):
+        """Test kept results for short prefixes change with the entries under them"""
+        self.assertEqual([id for id, _ in self.index.search("k")], [2, 1, 3])
+
+        self.index.add(3, ["Kanemoto, Hisako"], 1000)
+        self.assertEqual([id for id, _ in self.index.search("k")], [3, 2, 1])
+
+        self.index.add(2, ["Renamed, Person"], 300)
+        self.assertEqual([id for id, _ in self.index.search("k")], [3, 1])
+        self.assertEqual([id for id, _ in self.index.search("ren")], [2])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(len(self.index.keys), 10)
+
+        # the kept results can't tell what replaces an entry that drops out
+        self.index.add(5, ["Kaji, Yuki"], 200)
+        self.assertEqual([id for id, _ in self.index.search("k")], [3, 5, 1])
+        self.index.add(3, ["Kanemoto, Hisako"], 1)
+        self.assertEqual([id for id, _ in self.index.search("k")], [5, 1, 3])
+
+    def test_kept_only_for_long_runs(self):
+        index = PrefixIndex(limit=3, cached_run_length=2)
+        index.update([(1, ["Hanazawa, Kana"], 1), (2, ["Hanazawa, Kazuki"], 2), (3, ["Kaji, Yuki"], 3)])
+        index.search("ka")
+        index.search("kaz")
+        self.assertEqual(list(index.top), ["ka"])
+
+    def test_rebuild(self):
+        """Test updating many entries at once gives the same index as one at a time"""
+        one_at_a_time = PrefixIndex(limit=3)
+        for id in range(200):
+            one_at_a_time.add(id, [f"Name {id}"], id)
+        at_once = PrefixIndex(limit=3)
+        at_once.update((id, [f"Name {id}"], id) for id in range(200))
+
+        self.assertEqual(at_once.keys, one_at_a_time.keys)
+        self.assertEqual(at_once.search("name"), [(199, ("Name 199",)), (198, ("Name 198",)), (197, ("Name 197",))])
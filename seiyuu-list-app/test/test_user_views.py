@@ -3,6 +3,8 @@
 import os
 from unittest import TestCase
 
+from sqlalchemy import event
+
 from models import db, User, FavoriteSeiyuu
 
 os.environ['DATABASE_URL'] = "postgresql:///seiyuulist-test"
@@ -12,7 +14,7 @@ TEST_RANK1_SEIYUU_NAME = 'Tomoyo Kurosawa'
 TEST_RANK2_SEIYUU_ID = 55082
 TEST_RANK2_SEIYUU_NAME = 'Tasuku Kaito'
 
-from app import app, CURR_USER_KEY
+from app import app, CURR_USER_KEY, user_cache
 
 db.create_all()
 
@@ -91,4 +93,65 @@ class UserViewsTestCase(TestCase):
             resp = c.get('/users/11111/rank', follow_redirects=True)
             self.assertIn("user1\\\'s Favorites Ranking", str(resp.data))
             self.assertIn(TEST_RANK1_SEIYUU_NAME, str(resp.data))
-            self.assertIn('Edit seiyuu ranking', str(resp.data))
\ No newline at end of file
+            self.assertIn('Edit seiyuu ranking', str(resp.data))
+
+    def count_user_queries(self, make_requests):
+        """How many queries on the users table make_requests() runs"""
+        statements = []
+        def save_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", save_statement)
+        try:
+            make_requests()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", save_statement)
+        return len([statement for statement in statements if "FROM users" in statement])
+
+    def test_curr_user_cached(self):
+        """Test a logged in user is only read from the database once"""
+        user_cache.clear()
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+
+            self.assertEqual(self.count_user_queries(lambda: c.get('/login/')), 1)
+            self.assertEqual(self.count_user_queries(lambda: c.get('/login/')), 0)
+            resp = c.get('/login/', follow_redirects=True)
+            self.assertIn("Already Logged In!", str(resp.data))
+            self.assertIn('/users/11111', str(resp.data))
+
+    def test_curr_user_unused(self):
+        """Test requests that never use g.user don't look the user up"""
+        user_cache.clear()
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1_id
+
+            self.assertEqual(self.count_user_queries(lambda: c.get('/logout/')), 0)
+
+    def test_edit_user_clears_cache(self):
+        """Test editing a profile drops the cached user"""
+        user_cache.clear()
+        app.config['WTF_CSRF_ENABLED'] = False
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.u1_id
+                c.get('/login/')
+                self.assertEqual(user_cache.get(self.u1_id).username, "user1")
+
+                resp = c.post('/users/edit/', data={
+                    'username': 'user1',
+                    'email': 'new@test.com',
+                    'image_url': '',
+                    'bio': 'new bio',
+                    'password': 'password1',
+                })
+                self.assertEqual(resp.status_code, 302)
+                self.assertIsNone(user_cache.get(self.u1_id))
+
+                c.get('/login/')
+                self.assertEqual(user_cache.get(self.u1_id).email, "new@test.com")
+        finally:
+            app.config['WTF_CSRF_ENABLED'] = True